@@ -1,46 +1,95 @@
 # app/__init__.py
-from flask import Flask
+from flask import Flask, current_app, jsonify
 from flask_jwt_extended import JWTManager
 from flask_mail import Mail
 from flask_cors import CORS
 
 from app.models import db
-from app.routes.auth import auth_bp
+from app.routes.auth import auth_bp, refresh_bp
 from app.routes.referrals import referrals_bp
+from app.routes.admin import admin_bp
+from app.routes.availability import availability_bp
+from app.routes.metrics import metrics_bp
+from app.cli import register_commands
 from app.config import Config
+from app.schema import bootstrap_schema
+from app.services.availability_service import availability
+from app.services.cache import cache
+from app.services.email_queue import email_queue
+from app.services.leaderboard_service import leaderboard
+from app.services.metrics import metrics
+from app.services.password_service import PasswordHasherBusy
+from app.services.reward_service import rewards
+from app.services.sweeper import sweeper
+from app.services.token_service import token_versions
+from app.utils.replicas import replicas
 
 from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
+from app.utils.rate_limit import rate_limit_key  # also registers the sqlite:// and resp:// limiter storages
 
 mail = Mail()
 jwt = JWTManager()
 
+#rate limiting to protect against brute force attacks; storage comes from RATELIMIT_STORAGE_URL
+limiter = Limiter(key_func=rate_limit_key, default_limits=["200 per day", "50 per hour"])
+
+# Apply specific limits to auth routes
+limiter.limit("5 per minute")(auth_bp)
+
+# Refreshing takes a single-use 256-bit token, not a password, and clients sharing an IP refresh
+# routinely, so it gets its own, looser limit in place of the login limit and the defaults
+limiter.limit(lambda: current_app.config['REFRESH_RATE_LIMIT'])(refresh_bp)
+
+# The availability check fires per keystroke, so it gets its own, looser limit
+limiter.limit(lambda: current_app.config['AVAILABILITY_RATE_LIMIT'])(availability_bp)
+
+# Scrapers poll every few seconds
+limiter.exempt(metrics_bp)
+
+@jwt.token_in_blocklist_loader
+def check_token_revoked(jwt_header, jwt_payload):
+    return token_versions.is_revoked(jwt_payload)
+
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
     # Initialize extensions
     db.init_app(app)
+    replicas.init_app(app)
     mail.init_app(app)
+    email_queue.init_app(app)
+    cache.init_app(app)
+    leaderboard.init_app(app)
+    sweeper.init_app(app)
+    rewards.init_app(app)
+    availability.init_app(app)
+    token_versions.init_app(app)
     jwt.init_app(app)
+    metrics.init_app(app)
+    limiter.init_app(app)
+    app.before_request(metrics.after_rate_limit)  # Runs right after the limiter's check to time it
     CORS(app)
     
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/api')
+    app.register_blueprint(refresh_bp, url_prefix='/api')
     app.register_blueprint(referrals_bp, url_prefix='/api')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    app.register_blueprint(availability_bp, url_prefix='/api')
+    app.register_blueprint(metrics_bp)
+    register_commands(app)
+    
+    @app.errorhandler(PasswordHasherBusy)
+    def handle_hasher_busy(e):
+        return jsonify({'success': False, 'message': 'Server is busy, please try again'}), 503, {'Retry-After': '1'}
     
-    # Create database tables
-    with app.app_context():
-        db.create_all()
-
-    #rate limiting to protect against brute force attacks
-    limiter = Limiter(
-    app,
-    key_func=get_remote_address,
-    default_limits=["200 per day", "50 per hour"]
-    )
-
-    # Apply specific limits to auth routes
-    limiter.limit("5 per minute")(auth_bp)
+    # One version query on an up-to-date database; DDL only when the models changed
+    bootstrap = app.config.get('SCHEMA_BOOTSTRAP', 'auto')
+    if bootstrap == 'auto':
+        with app.app_context():
+            bootstrap_schema()
+    elif bootstrap != 'off':
+        raise ValueError(f"Unknown SCHEMA_BOOTSTRAP {bootstrap!r}")
     
     return app
\ No newline at end of file
@@ -0,0 +1,135 @@
+# app/cli.py
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app.schema import upgrade_schema
+from app.services.availability_service import availability
+from app.services.import_service import import_users
+from app.services.leaderboard_service import rebuild_leaderboard
+from app.services.referral_service import reconcile_referral_counters
+from app.services.referral_tree_service import rebuild_referral_tree
+from app.services.reward_service import rewards
+from app.services.rollup_service import backfill_referral_rollups, compact_referral_rollups
+from app.services.sweeper import sweeper
+
+
+def register_commands(app):
+    """Attach the maintenance commands to the flask CLI"""
+    app.cli.add_command(upgrade_db_command)
+    app.cli.add_command(import_users_command)
+    app.cli.add_command(reconcile_counters_command)
+    app.cli.add_command(rebuild_tree_command)
+    app.cli.add_command(rebuild_leaderboard_command)
+    app.cli.add_command(rebuild_availability_filter_command)
+    app.cli.add_command(purge_expired_tokens_command)
+    app.cli.add_command(apply_rewards_command)
+    app.cli.add_command(backfill_rollups_command)
+    app.cli.add_command(compact_rollups_command)
+
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db_command():
+    """Create missing tables and indexes on an existing database and record the schema fingerprint."""
+    created = upgrade_schema()
+    click.echo(f"Created {len(created)} indexes" + (f": {', '.join(created)}" if created else ""))
+
+
+@click.command('import-users')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(['ndjson', 'csv']),
+              help='Input format (defaults to the file extension, else ndjson).')
+@click.option('--chunk-size', default=1000, show_default=True, help='Rows per bulk insert and commit.')
+@with_appcontext
+def import_users_command(source, fmt, chunk_size):
+    """Bulk import users from an NDJSON or CSV file ('-' for stdin)."""
+    fmt = fmt or ('csv' if source.name.endswith('.csv') else 'ndjson')
+
+    def report(result):
+        click.echo(f"  {result.rows} rows read, {result.users_created} users created", err=True)
+
+    result = import_users(source, fmt=fmt, chunk_size=chunk_size, on_chunk=report)
+
+    click.echo(
+        f"Imported {result.users_created} users and {result.referrals_created} referrals "
+        f"from {result.rows} rows in {result.elapsed:.2f}s ({result.rows_per_sec:.0f} rows/sec)"
+    )
+    if result.skipped:
+        click.echo(f"Skipped {result.skipped} rows:", err=True)
+        for error in result.errors:
+            click.echo(f"  line {error['line']}: {error['error']}", err=True)
+
+
+@click.command('reconcile-referral-counters')
+@with_appcontext
+def reconcile_counters_command():
+    """Rebuild referral counters from the referral and reward tables."""
+    users = reconcile_referral_counters()
+    click.echo(f"Rebuilt referral counters for {users} users")
+
+
+@click.command('rebuild-referral-tree')
+@with_appcontext
+def rebuild_tree_command():
+    """Rebuild the referral closure table from users.referred_by_id."""
+    paths = rebuild_referral_tree()
+    click.echo(f"Rebuilt referral tree with {paths} ancestor/descendant pairs")
+
+
+@click.command('rebuild-leaderboard')
+@with_appcontext
+def rebuild_leaderboard_command():
+    """Recompute the leaderboards from raw referrals (run as a scheduled job)."""
+    entries = rebuild_leaderboard()
+    click.echo(f"Rebuilt leaderboards with {entries} entries")
+
+
+@click.command('rebuild-availability-filter')
+@click.option('--output', type=click.Path(dir_okay=False),
+              help='Snapshot file to write (defaults to AVAILABILITY_FILTER_PATH).')
+@with_appcontext
+def rebuild_availability_filter_command(output):
+    """Rebuild the username/email Bloom filter and write its snapshot."""
+    path = output or current_app.config.get('AVAILABILITY_FILTER_PATH')
+    bloom = availability.rebuild(path)
+    click.echo(
+        f"Built availability filter with {bloom.count} entries in {bloom.memory_bytes / 1024:.0f} KiB, "
+        f"{bloom.num_hashes} hashes, estimated false-positive rate {bloom.estimated_error_rate():.4%}"
+    )
+    if path:
+        click.echo(f"Wrote snapshot to {path}")
+    else:
+        click.echo("No AVAILABILITY_FILTER_PATH set; workers build the filter from the users table", err=True)
+
+
+@click.command('purge-expired-tokens')
+@with_appcontext
+def purge_expired_tokens_command():
+    """Delete expired password reset and refresh tokens in batches."""
+    removed = sweeper.run_once()
+    click.echo(", ".join(f"Purged {count} expired {name.replace('_', ' ')}" for name, count in removed.items()))
+
+
+@click.command('apply-rewards')
+@with_appcontext
+def apply_rewards_command():
+    """Apply every due referral reward in the outbox now."""
+    applied = rewards.run_until_empty()
+    click.echo(f"Applied rewards for {applied} referrals")
+
+
+@click.command('backfill-referral-rollups')
+@with_appcontext
+def backfill_rollups_command():
+    """Rebuild the referral rollups from the raw referrals."""
+    buckets = backfill_referral_rollups()
+    click.echo(f"Rebuilt referral rollups with {buckets} buckets")
+
+
+@click.command('compact-referral-rollups')
+@with_appcontext
+def compact_rollups_command():
+    """Fold daily referral rollups past the retention into weekly and monthly ones (run as a scheduled job)."""
+    days = compact_referral_rollups()
+    click.echo(f"Compacted {days} daily buckets")
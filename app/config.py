@@ -9,10 +9,40 @@ class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY") or "your-secret-key"
     SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL") or "sqlite:///app.db"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # "auto": one query at startup checks the stored schema fingerprint and upgrades only on a mismatch;
+    # "off": never touch the schema at startup (run `flask upgrade-db` when deploying)
+    SCHEMA_BOOTSTRAP = os.environ.get("SCHEMA_BOOTSTRAP") or "auto"
+    # SQLite only: "tuned" (WAL, busy timeout, mmap, pooled connections) or "default" (driver defaults)
+    SQLITE_PROFILE = os.environ.get("SQLITE_PROFILE") or "tuned"
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS") or 5000)
+    SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE") or 268435456)
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB") or 20000)
+    SQLITE_POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE") or 5)
+    WEB_THREADS = int(os.environ.get("WEB_THREADS") or 64)  # gunicorn threads per worker; the SQLite pool overflows up to it
+    # Read replicas (comma-separated URLs) for the GET-only service reads; empty reads from the primary
+    SQLALCHEMY_REPLICA_URIS = [u.strip() for u in (os.environ.get("DATABASE_REPLICA_URLS") or "").split(",") if u.strip()]
+    SQLALCHEMY_REPLICA_RETRY_SECONDS = float(os.environ.get("DATABASE_REPLICA_RETRY_SECONDS") or 30)
+    SQLALCHEMY_REPLICA_CACHE_TTL = int(os.environ.get("DATABASE_REPLICA_CACHE_TTL") or 5)  # cap for values read from a replica
     
     # JWT settings
     JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY") or "jwt-secret-key"
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
+    # Opaque, rotating refresh tokens for /api/refresh (one per device)
+    REFRESH_TOKEN_EXPIRES = timedelta(days=int(os.environ.get("REFRESH_TOKEN_DAYS") or 30))
+    REFRESH_TOKENS_PER_USER = int(os.environ.get("REFRESH_TOKENS_PER_USER") or 10)
+
+    # Password reset tokens (stored hashed)
+    PASSWORD_RESET_EXPIRES = timedelta(hours=int(os.environ.get("PASSWORD_RESET_HOURS") or 24))
+    PASSWORD_RESET_MAX_ACTIVE = int(os.environ.get("PASSWORD_RESET_MAX_ACTIVE") or 3)
+
+    # Background purge of expired reset and refresh tokens (0 disables the thread)
+    SWEEP_INTERVAL = float(os.environ.get("SWEEP_INTERVAL") or 300)
+    SWEEP_BATCH_SIZE = int(os.environ.get("SWEEP_BATCH_SIZE") or 500)
+
+    # Embed username, email and referral code in access tokens so /api/me skips the database
+    JWT_PROFILE_CLAIMS = (os.environ.get("JWT_PROFILE_CLAIMS") or "True") == "True"
+    JWT_VERSION_TTL = float(os.environ.get("JWT_VERSION_TTL") or 30)  # seconds a worker trusts its token stamps
+    JWT_VERSION_MAP_SIZE = int(os.environ.get("JWT_VERSION_MAP_SIZE") or 100000)
     
     # Mail settings for local SMTP server
     MAIL_SERVER = os.environ.get("MAIL_SERVER") or "localhost"
@@ -23,4 +53,80 @@ class Config:
     MAIL_PASSWORD = os.environ.get("MAIL_PASSWORD") or None
     MAIL_DEFAULT_SENDER = os.environ.get("MAIL_DEFAULT_SENDER") or "test@example.com"
 
+    # Background email delivery ("background" or "sync")
+    MAIL_DELIVERY_MODE = os.environ.get("MAIL_DELIVERY_MODE") or "background"
+    MAIL_QUEUE_WORKERS = int(os.environ.get("MAIL_QUEUE_WORKERS") or 2)
+    MAIL_BATCH_SIZE = int(os.environ.get("MAIL_BATCH_SIZE") or 20)
+    MAIL_MAX_RETRIES = int(os.environ.get("MAIL_MAX_RETRIES") or 5)
+    MAIL_RETRY_BACKOFF = float(os.environ.get("MAIL_RETRY_BACKOFF") or 2.0)
+    MAIL_CONNECTION_IDLE_TIMEOUT = float(os.environ.get("MAIL_CONNECTION_IDLE_TIMEOUT") or 30)
+
+    # Password hashing pool
+    BCRYPT_LOG_ROUNDS = int(os.environ.get("BCRYPT_LOG_ROUNDS") or 12)
+    BCRYPT_POOL_TYPE = os.environ.get("BCRYPT_POOL_TYPE") or "thread"  # or "process"
+    BCRYPT_POOL_SIZE = int(os.environ.get("BCRYPT_POOL_SIZE") or os.cpu_count() or 2)
+    BCRYPT_MAX_PENDING = int(os.environ.get("BCRYPT_MAX_PENDING") or 32)
+    BCRYPT_ADMISSION_TIMEOUT = float(os.environ.get("BCRYPT_ADMISSION_TIMEOUT") or 0.05)
+
+    # Key for the id -> referral code permutation; never change it once users exist
+    REFERRAL_CODE_SECRET = os.environ.get("REFERRAL_CODE_SECRET") or None
+
+    # Referral rewards, applied from the outbox by a worker thread ("background" or "sync")
+    REWARD_PROCESSING_MODE = os.environ.get("REWARD_PROCESSING_MODE") or "background"
+    REWARD_RULES = os.environ.get("REWARD_RULES") or "flat"  # comma-separated: flat, tiered, upline
+    REFERRAL_REWARD_AMOUNT = float(os.environ.get("REFERRAL_REWARD_AMOUNT") or 10.0)  # flat rule
+    REWARD_TIERS = os.environ.get("REWARD_TIERS") or "1:10"  # tiered rule: "<nth referral>:<amount>,..."
+    REWARD_UPLINE_AMOUNTS = os.environ.get("REWARD_UPLINE_AMOUNTS") or ""  # upline rule: "<to referrer's referrer>,..."
+    REWARD_BATCH_SIZE = int(os.environ.get("REWARD_BATCH_SIZE") or 100)
+    REWARD_POLL_INTERVAL = float(os.environ.get("REWARD_POLL_INTERVAL") or 5)
+    REWARD_RETRY_BACKOFF = float(os.environ.get("REWARD_RETRY_BACKOFF") or 2.0)
+
+    # Keyset pagination for /api/referrals
+    REFERRALS_PAGE_SIZE = int(os.environ.get("REFERRALS_PAGE_SIZE") or 50)
+    REFERRALS_MAX_PAGE_SIZE = int(os.environ.get("REFERRALS_MAX_PAGE_SIZE") or 100)
+
+    # Referral leaderboard
+    LEADERBOARD_SIZE = int(os.environ.get("LEADERBOARD_SIZE") or 100)
+    LEADERBOARD_WINDOWS = [w.strip() for w in (os.environ.get("LEADERBOARD_WINDOWS") or "7d,30d").split(",") if w.strip()]
+    LEADERBOARD_REFRESH_SECONDS = float(os.environ.get("LEADERBOARD_REFRESH_SECONDS") or 30)
+
+    # Referral rollups behind the timeseries endpoints; older days are compacted into weeks and months
+    ROLLUP_DAILY_RETENTION_DAYS = int(os.environ.get("ROLLUP_DAILY_RETENTION_DAYS") or 90)
+    ROLLUP_MAX_BUCKETS = int(os.environ.get("ROLLUP_MAX_BUCKETS") or 366)
+    ROLLUP_COMPACT_BATCH_SIZE = int(os.environ.get("ROLLUP_COMPACT_BATCH_SIZE") or 1000)
+    ROLLUP_PLATFORM_SHARDS = int(os.environ.get("ROLLUP_PLATFORM_SHARDS") or 16)  # rows per platform bucket, so signups don't queue on one row lock
+
+    # Read-through cache: "null" (off), "memory" (single worker only) or "redis" (shared)
+    CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL") or "redis://localhost:6379/0"
+    CACHE_BACKEND = os.environ.get("CACHE_BACKEND") or ("redis" if os.environ.get("CACHE_REDIS_URL") else "null")
+    CACHE_DEFAULT_TTL = int(os.environ.get("CACHE_DEFAULT_TTL") or 300)
+    CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES") or 10000)
+    CACHE_KEY_PREFIX = os.environ.get("CACHE_KEY_PREFIX") or "vomychat:"
+
+    # Bloom filter behind /api/check-availability (entries = 2 per user; ~9.6 bits each at 1%)
+    AVAILABILITY_FILTER_CAPACITY = int(os.environ.get("AVAILABILITY_FILTER_CAPACITY") or 2000000)
+    AVAILABILITY_FILTER_ERROR_RATE = float(os.environ.get("AVAILABILITY_FILTER_ERROR_RATE") or 0.01)
+    AVAILABILITY_FILTER_REFRESH_SECONDS = float(os.environ.get("AVAILABILITY_FILTER_REFRESH_SECONDS") or 5)
+    AVAILABILITY_FILTER_RESCAN_SECONDS = float(os.environ.get("AVAILABILITY_FILTER_RESCAN_SECONDS") or 60)  # > longest signup transaction
+    AVAILABILITY_FILTER_LOAD = os.environ.get("AVAILABILITY_FILTER_LOAD") or "background"  # or "sync": load in the first caller
+    AVAILABILITY_FILTER_PATH = os.environ.get("AVAILABILITY_FILTER_PATH") or None
+    AVAILABILITY_RATE_LIMIT = os.environ.get("AVAILABILITY_RATE_LIMIT") or "120 per minute"
+
+    # Rate limiting: "memory://" (per process), "sqlite:////path/file.db" (one host) or "resp://host:6379/0" (shared)
+    RATELIMIT_STORAGE_URL = os.environ.get("RATELIMIT_STORAGE_URL") or "memory://"
+    RATELIMIT_KEY = os.environ.get("RATELIMIT_KEY") or "ip"  # or "user" to key authenticated requests by JWT identity
+    RATELIMIT_IN_MEMORY_FALLBACK_ENABLED = os.environ.get("RATELIMIT_IN_MEMORY_FALLBACK_ENABLED") == "True"
+    REFRESH_RATE_LIMIT = os.environ.get("REFRESH_RATE_LIMIT") or "60 per minute"  # /api/refresh, instead of the login limit
+
+    # Prometheus metrics on /metrics. With several workers, point METRICS_DIR at a directory they share
+    # (gunicorn.conf.py defaults it to a fresh temporary directory)
+    METRICS_ENABLED = (os.environ.get("METRICS_ENABLED") or "True") == "True"
+    METRICS_DIR = os.environ.get("METRICS_DIR") or None
+    METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS") or 1)
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN") or None  # require "Authorization: Bearer <token>" when set
+    SQL_N_PLUS_ONE_THRESHOLD = int(os.environ.get("SQL_N_PLUS_ONE_THRESHOLD") or 0)  # log statements run more often per request; 0 = off
+
+    # Comma-separated emails allowed to use the /api/admin endpoints
+    ADMIN_EMAILS = [e.strip() for e in (os.environ.get("ADMIN_EMAILS") or "").split(",") if e.strip()]
+
     FRONTEND_URL = os.environ.get("FRONTEND_URL") or "http://127.0.0.1:5000"
@@ -1,11 +1,14 @@
 # app/models.py
 from datetime import datetime
-from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.ext.hybrid import hybrid_property
-import uuid
-import bcrypt
 
-db = SQLAlchemy()
+from app.services.metrics import metrics
+from app.services.password_service import password_hasher
+from app.utils.referral_codes import encode_referral_code
+from app.utils.replicas import RoutingSQLAlchemy
+
+# Sessions route marked reads to a replica when SQLALCHEMY_REPLICA_URIS is set
+db = RoutingSQLAlchemy()
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -14,9 +17,11 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     _password = db.Column('password', db.String(128), nullable=False)
-    referral_code = db.Column(db.String(20), unique=True, nullable=False)
-    referred_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Only pre-allocator and imported codes are stored; see referral_code below
+    legacy_referral_code = db.Column('referral_code', db.String(20), unique=True, nullable=True)
+    referred_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
+    # Indexed for the availability filter's refresh of recent signups
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     # Relationships
     referred_by = db.relationship('User', remote_side=[id], backref='referrals')
@@ -25,7 +30,6 @@ class User(db.Model):
         self.username = username
         self.email = email
         self.password = password
-        self.referral_code = self.generate_referral_code()
         self.referred_by = referred_by
     
     @hybrid_property
@@ -34,34 +38,47 @@ class User(db.Model):
     
     @password.setter
     def password(self, plaintext_password):
-        self._password = bcrypt.hashpw(plaintext_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        with metrics.timed('password_hash_seconds', operation='hash'):
+            self._password = password_hasher.hash(plaintext_password)
     
     def verify_password(self, plaintext_password):
-        return bcrypt.checkpw(plaintext_password.encode('utf-8'), self.password.encode('utf-8'))
+        with metrics.timed('password_hash_seconds', operation='verify'):
+            return password_hasher.verify(plaintext_password, self.password)
     
-    def generate_referral_code(self):
-        return str(uuid.uuid4())[:8]
+    @property
+    def referral_code(self):
+        """The stored legacy code, else the code derived from the id (None before flush)"""
+        if self.legacy_referral_code:
+            return self.legacy_referral_code
+        return encode_referral_code(self.id) if self.id is not None else None
 
 class PasswordReset(db.Model):
     __tablename__ = 'password_resets'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    token = db.Column(db.String(100), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    # SHA-256 of the emailed token; the column kept its old name and width
+    token_hash = db.Column('token', db.String(100), unique=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    expires_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
     
     # Relationships
     user = db.relationship('User', backref='password_resets')
 
 class Referral(db.Model):
     __tablename__ = 'referrals'
+    __table_args__ = (
+        # Serves referrer_id lookups and the (date_referred, id) keyset pagination
+        db.Index('ix_referrals_referrer_date_id', 'referrer_id', 'date_referred', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     referrer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    referred_user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    referred_user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     date_referred = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default='successful')  # pending, successful, etc.
+    # Its place among the referrer's referrals, 1 for the first; NULL on rows from before the column
+    ordinal = db.Column(db.Integer)
     
     # Relationships
     referrer = db.relationship('User', foreign_keys=[referrer_id], backref='referrals_made')
@@ -72,12 +89,128 @@ class Reward(db.Model):
     __tablename__ = 'rewards'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    referral_id = db.Column(db.Integer, db.ForeignKey('referrals.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    referral_id = db.Column(db.Integer, db.ForeignKey('referrals.id'), nullable=False, index=True)
     reward_type = db.Column(db.String(50), nullable=False)  # e.g., "credit", "premium_feature"
     amount = db.Column(db.Float, nullable=True)  # if applicable
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # "<referral id>:<rule>:<user id>"; a reward applied twice collides here
+    idempotency_key = db.Column(db.String(100), unique=True, index=True, nullable=True)
     
     # Relationships
     user = db.relationship('User', backref='rewards')
-    referral = db.relationship('Referral', backref='rewards')
\ No newline at end of file
+    referral = db.relationship('Referral', backref='rewards')
+
+class RewardOutbox(db.Model):
+    """A referral whose rewards are still to be applied, written in the referral's own transaction"""
+    __tablename__ = 'reward_outbox'
+    __table_args__ = (
+        # The worker takes due rows oldest first
+        db.Index('ix_reward_outbox_available_id', 'available_at', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    referral_id = db.Column(db.Integer, db.ForeignKey('referrals.id'), unique=True, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    # Relationships
+    referral = db.relationship('Referral')
+
+class ReferralClosure(db.Model):
+    """Every ancestor/descendant pair in the referral tree, with the distance between them"""
+    __tablename__ = 'referral_closure'
+    __table_args__ = (
+        # Serves per-depth downline counts and the paginated subtree
+        db.Index('ix_referral_closure_ancestor_depth', 'ancestor_id', 'depth', 'descendant_id'),
+    )
+    
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True, index=True)
+    depth = db.Column(db.Integer, nullable=False)
+
+class ReferralCounter(db.Model):
+    """Per-user referral totals; rewards_earned and reward_amount are the reward balance"""
+    __tablename__ = 'referral_counters'
+    __table_args__ = (
+        # Global leaderboard ranks are a range count on this index
+        db.Index('ix_referral_counters_total', 'total_referrals'),
+    )
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    total_referrals = db.Column(db.Integer, nullable=False, default=0)
+    successful_referrals = db.Column(db.Integer, nullable=False, default=0)
+    rewards_earned = db.Column(db.Integer, nullable=False, default=0)
+    reward_amount = db.Column(db.Float, nullable=False, default=0.0)
+    
+    # Relationships
+    user = db.relationship('User', backref=db.backref('referral_counter', uselist=False))
+
+class ReferralRollup(db.Model):
+    """Referrals made per time bucket, by referrer; referrer_id 0 and below hold the platform totals.
+
+    create_referral bumps 'day' buckets; compaction folds days past
+    ROLLUP_DAILY_RETENTION_DAYS into 'week' and 'month' buckets. The
+    platform's count for a bucket is spread over ROLLUP_PLATFORM_SHARDS
+    rows (referrer_id 0, -1, ...) and summed on read.
+    """
+    __tablename__ = 'referral_rollups'
+    __table_args__ = (
+        # Compaction takes the oldest daily buckets across every referrer
+        db.Index('ix_referral_rollups_granularity_bucket', 'granularity', 'bucket_start'),
+    )
+    
+    PLATFORM = 0  # referrer_id of the platform-wide series; its shards count down from here
+    
+    # No foreign key: the platform series is not a user
+    referrer_id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(5), primary_key=True)
+    bucket_start = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class LeaderboardEntry(db.Model):
+    """Snapshot of the top referrers per window, shared by every worker"""
+    __tablename__ = 'leaderboard_entries'
+    __table_args__ = (
+        db.Index('ix_leaderboard_entries_window_score', 'window', 'score'),
+    )
+    
+    window = db.Column(db.String(10), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    score = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    user = db.relationship('User')
+
+class UserVersion(db.Model):
+    """Per-user stamps for issued tokens: older than version is stale, older than min_version revoked"""
+    __tablename__ = 'user_versions'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    min_version = db.Column(db.Integer, nullable=False, default=0)
+
+class RefreshToken(db.Model):
+    """A long-lived, rotating refresh token for one device; only its SHA-256 is stored"""
+    __tablename__ = 'refresh_tokens'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    # The hash this token replaced, so a replayed old token can be detected
+    previous_hash = db.Column(db.String(64), nullable=True, index=True)
+    device_name = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    # Relationships
+    user = db.relationship('User', backref=db.backref('refresh_tokens', lazy='dynamic'))
+
+class SchemaVersion(db.Model):
+    """Fingerprint of the models the database was last created or upgraded for; one row"""
+    __tablename__ = 'schema_version'
+    
+    version = db.Column(db.String(64), primary_key=True)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
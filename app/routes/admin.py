@@ -0,0 +1,59 @@
+# app/routes/admin.py
+import io
+from functools import wraps
+
+from flask import Blueprint, current_app, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from app.models import ReferralRollup
+from app.services.auth_service import get_user_profile
+from app.services.import_service import import_users
+from app.services.rollup_service import get_referral_timeseries, parse_timeseries_range
+from app.services.token_service import current_profile
+
+admin_bp = Blueprint('admin', __name__)
+
+def admin_required(fn):
+    """Allow only users whose email is listed in ADMIN_EMAILS"""
+    @wraps(fn)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        profile = current_profile() or get_user_profile(get_jwt_identity())
+        if not profile or profile['email'] not in current_app.config.get('ADMIN_EMAILS', []):
+            return jsonify({'success': False, 'message': 'Admin access required'}), 403
+        return fn(*args, **kwargs)
+    return wrapper
+
+@admin_bp.route('/import-users', methods=['POST'])
+@admin_required
+def import_users_endpoint():
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({'success': False, 'message': 'format must be ndjson or csv'}), 400
+    
+    chunk_size = request.args.get('chunk_size', 1000, type=int)
+    
+    # Read the body as a stream so large files are never held in memory
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='' if fmt == 'csv' else None)
+    result = import_users(stream, fmt=fmt, chunk_size=max(chunk_size, 1))
+    
+    return jsonify({
+        'success': True,
+        'result': result.to_dict()
+    }), 200
+
+@admin_bp.route('/referral-stats/timeseries', methods=['GET'])
+@admin_required
+def platform_timeseries():
+    granularity = request.args.get('granularity', 'day')
+    
+    try:
+        first, last = parse_timeseries_range(granularity, request.args.get('from'), request.args.get('to'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'granularity': granularity,
+        'series': get_referral_timeseries(ReferralRollup.PLATFORM, granularity, first, last)
+    }), 200
@@ -1,13 +1,20 @@
 # app/routes/auth.py
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity
 
-from app.models import User
-from app.services.auth_service import register_user, authenticate_user, initiate_password_reset, reset_password
-from app.utils.validators import validate_registration_data
+from app.services.auth_service import register_user_with_session, authenticate_user, initiate_password_reset, reset_password, get_user_profile, create_user_token, RegistrationError
+from app.services.password_service import PasswordHasherBusy
+from app.services.refresh_token_service import issue_refresh_token, rotate_refresh_token, revoke_refresh_token, revoke_session, get_sessions, InvalidRefreshToken
+from app.services.token_service import current_profile
+from app.utils.responses import conditional_json, make_etag
+from app.utils.serializers import serialize_user
+from app.utils.validators import validate_registration_format, validate_device_name
 
 auth_bp = Blueprint('auth', __name__)
 
+# Refreshing is rate-limited apart from the password routes
+refresh_bp = Blueprint('refresh', __name__)
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     data = request.get_json()
@@ -16,31 +23,37 @@ def register():
     email = data.get('email')
     password = data.get('password')
     referral_code = data.get('referral_code')
+    device_name = data.get('device_name')
 
-    # Validate input data
-    is_valid, errors = validate_registration_data(username, email, password)
-    if not is_valid:
+    # Validate input format; uniqueness is checked inside the registration transaction
+    is_valid, errors = validate_registration_format(username, email, password)
+    device_ok, device_error = validate_device_name(device_name)
+    if not device_ok:
+        errors['device_name'] = device_error
+    if not is_valid or not device_ok:
         return jsonify({'success': False, 'errors': errors}), 400
 
     # Register user
     try:
-        user = register_user(username, email, password, referral_code)
+        user, refresh_token = register_user_with_session(username, email, password, referral_code, device_name)
 
         # Generate JWT token
-        access_token = create_access_token(identity=user.id)
+        access_token = create_user_token(user)
 
         return jsonify({
             'success': True,
             'message': 'Registration successful',
             'access_token': access_token,
-            'user': {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'referral_code': user.referral_code
-            }
+            'refresh_token': refresh_token,
+            'user': serialize_user(user)
         }), 201
 
+    except RegistrationError as e:
+        return jsonify({'success': False, 'errors': e.errors}), 400
+
+    except PasswordHasherBusy:
+        raise  # Answered with a 503 by the app-level handler
+
     except ValueError as e:
         return jsonify({'success': False, 'message': str(e)}), 400  # <-- Return 400 for validation errors
 
@@ -53,6 +66,11 @@ def login():
     
     username_or_email = data.get('username_or_email')
     password = data.get('password')
+    device_name = data.get('device_name')
+    
+    device_ok, device_error = validate_device_name(device_name)
+    if not device_ok:
+        return jsonify({'success': False, 'message': device_error}), 400
     
     # Authenticate user
     user = authenticate_user(username_or_email, password)
@@ -60,20 +78,57 @@ def login():
         return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
     
     # Generate JWT token
-    access_token = create_access_token(identity=str(user.id))
+    access_token = create_user_token(user)
+    refresh_token = issue_refresh_token(user.id, device_name)
     
     return jsonify({
         'success': True,
         'message': 'Login successful',
         'access_token': access_token,
-        'user': {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'referral_code': user.referral_code
-        }
+        'refresh_token': refresh_token,
+        'user': serialize_user(user)
     }), 200
 
+@refresh_bp.route('/refresh', methods=['POST'])
+def refresh():
+    data = request.get_json() or {}
+    
+    # Rotates the refresh token and mints an access token without checking a password
+    try:
+        user, refresh_token = rotate_refresh_token(data.get('refresh_token'))
+    except InvalidRefreshToken as e:
+        return jsonify({'success': False, 'message': str(e)}), 401
+    
+    return jsonify({
+        'success': True,
+        'access_token': create_user_token(user),
+        'refresh_token': refresh_token
+    }), 200
+
+@auth_bp.route('/logout', methods=['POST'])
+def logout():
+    data = request.get_json() or {}
+    
+    revoke_refresh_token(data.get('refresh_token'))
+    
+    return jsonify({'success': True, 'message': 'Logged out'}), 200
+
+@auth_bp.route('/sessions', methods=['GET'])
+@jwt_required()
+def list_sessions():
+    return jsonify({
+        'success': True,
+        'sessions': get_sessions(get_jwt_identity())
+    }), 200
+
+@auth_bp.route('/sessions/<int:session_id>', methods=['DELETE'])
+@jwt_required()
+def delete_session(session_id):
+    if not revoke_session(get_jwt_identity(), session_id):
+        return jsonify({'success': False, 'message': 'Session not found'}), 404
+    
+    return jsonify({'success': True, 'message': 'Session revoked'}), 200
+
 @auth_bp.route('/forgot-password', methods=['POST'])
 def forgot_password():
     data = request.get_json()
@@ -125,18 +180,14 @@ def handle_reset_password():
 @auth_bp.route('/me', methods=['GET'])
 @jwt_required()
 def get_current_user():
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    # Fresh profile claims in the token answer without a database read
+    profile = current_profile() or get_user_profile(get_jwt_identity())
     
-    if not user:
+    if not profile:
         return jsonify({'success': False, 'message': 'User not found'}), 404
     
-    return jsonify({
+    # The profile is already in hand, so a match only saves the body
+    return conditional_json(make_etag('me', profile), lambda: {
         'success': True,
-        'user': {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'referral_code': user.referral_code
-        }
-    }), 200
\ No newline at end of file
+        'user': profile
+    })
\ No newline at end of file
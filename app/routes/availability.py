@@ -0,0 +1,25 @@
+# app/routes/availability.py
+from flask import Blueprint, request, jsonify
+
+from app.services.availability_service import availability
+
+availability_bp = Blueprint('availability', __name__)
+
+@availability_bp.route('/check-availability', methods=['GET'])
+def check_availability():
+    username = request.args.get('username')
+    email = request.args.get('email')
+    
+    if not username and not email:
+        return jsonify({'success': False, 'message': 'Provide a username or email to check'}), 400
+    
+    # Definite misses are answered from the in-memory filter without a query
+    taken = availability.find_taken(username, email)
+    
+    result = {'success': True}
+    if username:
+        result['username'] = {'value': username, 'available': 'username' not in taken}
+    if email:
+        result['email'] = {'value': email, 'available': 'email' not in taken}
+    
+    return jsonify(result), 200
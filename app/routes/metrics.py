@@ -0,0 +1,17 @@
+# app/routes/metrics.py
+import hmac
+
+from flask import Blueprint, Response, current_app, jsonify, request
+
+from app.services.metrics import metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    # Optional shared secret for scrapers that reach the app from outside
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return jsonify({'success': False, 'message': 'Invalid metrics token'}), 401
+    
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
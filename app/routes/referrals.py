@@ -1,8 +1,14 @@
 # app/routes/referrals.py
-from flask import Blueprint, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, current_app, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
 
-from app.services.referral_service import get_user_referrals, get_referral_stats
+from app.services.referral_service import get_referrals_page, get_referral_stats, get_referral_version
+from app.services.referral_tree_service import get_downline_summary, get_downline_members
+from app.services.reward_service import get_reward_balance
+from app.services.rollup_service import get_referral_timeseries, parse_timeseries_range
+from app.services.leaderboard_service import leaderboard
+from app.utils.pagination import encode_cursor, decode_cursor, parse_limit
+from app.utils.responses import conditional_json, make_etag
 
 referrals_bp = Blueprint('referrals', __name__)
 
@@ -11,33 +17,138 @@ referrals_bp = Blueprint('referrals', __name__)
 def get_referrals():
     user_id = get_jwt_identity()
     
-    referrals = get_user_referrals(user_id)
-    
-    referral_data = []
-    for referral in referrals:
-        referral_data.append({
-            'id': referral.id,
-            'referred_user': {
-                'id': referral.referred_user.id,
-                'username': referral.referred_user.username
-            },
-            'date_referred': referral.date_referred.isoformat(),
-            'status': referral.status
-        })
+    try:
+        limit = parse_limit(
+            request.args.get('limit'),
+            current_app.config['REFERRALS_PAGE_SIZE'],
+            current_app.config['REFERRALS_MAX_PAGE_SIZE']
+        )
+        cursor = decode_cursor(request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    cursor_token = request.args.get('cursor')
+    etag = make_etag('referrals', user_id, get_referral_version(user_id), limit, cursor_token)
+    
+    def build():
+        page = get_referrals_page(user_id, limit, cursor, cursor_token=cursor_token)
+        return {
+            'success': True,
+            'referrals': page['referrals'],
+            'next_cursor': page['next_cursor']
+        }
+    
+    return conditional_json(etag, build)
+
+@referrals_bp.route('/referral-stats', methods=['GET'])
+@jwt_required()
+def get_stats():
+    user_id = get_jwt_identity()
+    
+    return conditional_json(make_etag('referral-stats', user_id, get_referral_version(user_id)), lambda: {
+        'success': True,
+        'stats': get_referral_stats(user_id)
+    })
+
+@referrals_bp.route('/referral-stats/timeseries', methods=['GET'])
+@jwt_required()
+def get_timeseries():
+    user_id = get_jwt_identity()
+    granularity = request.args.get('granularity', 'day')
+    
+    try:
+        first, last = parse_timeseries_range(granularity, request.args.get('from'), request.args.get('to'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    # Compaction moves counts between buckets without changing the series, so the ETag holds
+    etag = make_etag('timeseries', user_id, get_referral_version(user_id), granularity, first, last)
+    
+    return conditional_json(etag, lambda: {
+        'success': True,
+        'granularity': granularity,
+        'series': get_referral_timeseries(user_id, granularity, first, last)
+    })
+
+@referrals_bp.route('/rewards', methods=['GET'])
+@jwt_required()
+def get_rewards():
+    user_id = get_jwt_identity()
+    
+    return conditional_json(make_etag('rewards', user_id, get_referral_version(user_id)), lambda: {
+        'success': True,
+        'rewards': get_reward_balance(user_id)
+    })
+
+@referrals_bp.route('/downline', methods=['GET'])
+@jwt_required()
+def get_downline():
+    user_id = get_jwt_identity()
     
     return jsonify({
         'success': True,
-        'referrals': referral_data
+        'downline': get_downline_summary(user_id)
     }), 200
 
-@referrals_bp.route('/referral-stats', methods=['GET'])
+@referrals_bp.route('/downline/members', methods=['GET'])
 @jwt_required()
-def get_stats():
+def get_downline_page():
     user_id = get_jwt_identity()
     
-    stats = get_referral_stats(user_id)
+    try:
+        limit = parse_limit(
+            request.args.get('limit'),
+            current_app.config['REFERRALS_PAGE_SIZE'],
+            current_app.config['REFERRALS_MAX_PAGE_SIZE']
+        )
+        depth = request.args.get('depth', type=int)
+        cursor = decode_cursor(request.args.get('cursor'), types=(int, int))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    members = get_downline_members(user_id, depth=depth, limit=limit + 1, cursor=cursor)
+    has_more = len(members) > limit
+    members = members[:limit]
+    
+    member_data = []
+    for member in members:
+        member_data.append({
+            'id': member.id,
+            'username': member.username,
+            'referred_by_id': member.referred_by_id,
+            'depth': member.depth
+        })
+    
+    next_cursor = None
+    if has_more:
+        last = members[-1]
+        next_cursor = encode_cursor(last.depth, last.id)
     
     return jsonify({
         'success': True,
-        'stats': stats
-    }), 200
\ No newline at end of file
+        'members': member_data,
+        'next_cursor': next_cursor
+    }), 200
+
+
+@referrals_bp.route('/leaderboard', methods=['GET'])
+def get_leaderboard():
+    window = request.args.get('window', 'all')
+    if window not in leaderboard.windows():
+        return jsonify({'success': False, 'message': f"window must be one of {', '.join(leaderboard.windows())}"}), 400
+    
+    try:
+        limit = parse_limit(request.args.get('limit'), 10, current_app.config['LEADERBOARD_SIZE'])
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    # Signed-in callers also get their own standing
+    verify_jwt_in_request(optional=True)
+    user_id = get_jwt_identity()
+    
+    return jsonify({
+        'success': True,
+        'window': window,
+        'leaders': leaderboard.top(window, limit),
+        'me': leaderboard.standing(window, int(user_id)) if user_id else None
+    }), 200
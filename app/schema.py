@@ -0,0 +1,165 @@
+# app/schema.py
+import hashlib
+import re
+from contextlib import contextmanager
+
+from sqlalchemy import inspect
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.schema import CreateColumn, CreateTable
+
+from app.models import db, User, SchemaVersion
+
+_fingerprint = None
+
+def schema_fingerprint():
+    """A hash of every table, column and index on the models; changes whenever they do"""
+    global _fingerprint
+    if _fingerprint is None:
+        parts = []
+        for table in db.metadata.sorted_tables:
+            parts.append(table.name)
+            parts += [f'{c.name}:{c.type!r}:{c.nullable}:{c.primary_key}' for c in table.columns]
+            parts += sorted(f'{i.name}:{i.unique}:{",".join(c.name for c in i.columns)}' for i in table.indexes)
+        _fingerprint = hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+    return _fingerprint
+
+# Any constant shared by every process that bootstraps this database
+PG_SCHEMA_LOCK_KEY = 0x5C4E3A
+
+def bootstrap_schema():
+    """Upgrade the schema unless the database already records the current fingerprint.
+
+    An up-to-date database costs one query and no DDL. Otherwise the
+    upgrade runs under ``schema_lock``, and a process that waited there
+    reads the fingerprint again and skips the work another one just did.
+    Returns True if this process upgraded the schema.
+    """
+    with db.engine.connect() as conn:
+        stored = _stored_fingerprint(conn)
+    if stored == schema_fingerprint():
+        return False
+    with schema_lock() as conn:
+        if _stored_fingerprint(conn) == schema_fingerprint():
+            return False
+        _upgrade(conn)
+    return True
+
+def upgrade_schema():
+    """Bring an existing database up to the current models.
+
+    Creates missing tables, adds missing nullable columns, relaxes columns
+    that have become nullable, then creates any index declared on the
+    models that the database does not have yet, and records the schema
+    fingerprint. Safe to run repeatedly, and alongside other processes
+    doing the same. Returns the names of the indexes created.
+    """
+    with schema_lock() as conn:
+        return _upgrade(conn)
+
+@contextmanager
+def schema_lock():
+    """A connection in a transaction that no other process upgrading the schema can share.
+
+    SQLite takes the database write lock up front with BEGIN IMMEDIATE;
+    PostgreSQL holds a session advisory lock around the transaction. The
+    DDL runs on this connection, so on SQLite it commits all at once.
+    """
+    with db.engine.connect() as conn:
+        dialect = conn.dialect.name
+        if dialect == 'postgresql':
+            conn.exec_driver_sql(f'SELECT pg_advisory_lock({PG_SCHEMA_LOCK_KEY})')
+        elif dialect == 'sqlite':
+            # Rebuilding a table must not cascade; the pragma is ignored inside a transaction
+            foreign_keys = conn.exec_driver_sql('PRAGMA foreign_keys').scalar()
+            conn.exec_driver_sql('PRAGMA foreign_keys=OFF')
+        try:
+            with conn.begin():
+                if dialect == 'sqlite':
+                    conn.exec_driver_sql('BEGIN IMMEDIATE')
+                yield conn
+        finally:
+            if dialect == 'postgresql':
+                conn.exec_driver_sql(f'SELECT pg_advisory_unlock({PG_SCHEMA_LOCK_KEY})')
+            elif dialect == 'sqlite' and foreign_keys:
+                conn.exec_driver_sql('PRAGMA foreign_keys=ON')
+
+def _stored_fingerprint(conn):
+    try:
+        with _savepoint(conn):
+            # Plain SQL: compiling even a Core select costs more than the query itself
+            return conn.exec_driver_sql(f'SELECT version FROM {SchemaVersion.__tablename__}').scalar()
+    except (OperationalError, ProgrammingError):
+        return None  # No schema_version table yet
+
+def _upgrade(conn):
+    db.metadata.create_all(conn)
+    _add_missing_columns(conn)
+
+    # users.referral_code only holds legacy codes now; new users store NULL
+    columns = {column['name']: column for column in inspect(conn).get_columns(User.__tablename__)}
+    if not columns['referral_code']['nullable']:
+        _drop_not_null(conn, User.__table__, 'referral_code')
+
+    created = []
+    inspector = inspect(conn)
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing and _create_if_missing(conn, lambda: index.create(conn)):
+                created.append(index.name)
+
+    conn.execute(SchemaVersion.__table__.delete())
+    conn.execute(SchemaVersion.__table__.insert().values(version=schema_fingerprint()))
+    return created
+
+def _create_if_missing(conn, create):
+    # The lock keeps app processes apart, but not a migration run by hand
+    try:
+        with _savepoint(conn):
+            create()
+    except (OperationalError, ProgrammingError) as exc:
+        message = str(exc.orig).lower()
+        if 'already exists' not in message and 'duplicate column' not in message:
+            raise
+        return False
+    return True
+
+@contextmanager
+def _savepoint(conn):
+    # A failed statement aborts a whole PostgreSQL transaction unless it ran in a savepoint
+    if conn.dialect.name != 'postgresql' or not conn.in_transaction():
+        yield
+        return
+    with conn.begin_nested():
+        yield
+
+def _add_missing_columns(conn):
+    inspector = inspect(conn)
+    for table in db.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable and column.server_default is None:
+                raise RuntimeError(f"Cannot add NOT NULL column {table.name}.{column.name} to existing rows")
+            # Constraints are not part of the column DDL; a unique index on it is created below
+            ddl = f'ALTER TABLE {table.name} ADD COLUMN {CreateColumn(column).compile(conn)}'
+            _create_if_missing(conn, lambda: conn.exec_driver_sql(ddl))
+
+def _drop_not_null(conn, table, column):
+    if conn.dialect.name != 'sqlite':
+        conn.exec_driver_sql(f'ALTER TABLE {table.name} ALTER COLUMN {column} DROP NOT NULL')
+        return
+
+    # SQLite cannot alter a column, so copy the rows into a table built from the model
+    rebuilt = f'{table.name}_rebuild'
+    ddl = re.sub(rf'CREATE TABLE "?{table.name}"?', f'CREATE TABLE {rebuilt}',
+                 str(CreateTable(table).compile(conn)), count=1)
+    names = ', '.join(f'"{c.name}"' for c in table.columns)
+
+    conn.exec_driver_sql(ddl)
+    conn.exec_driver_sql(f'INSERT INTO {rebuilt} ({names}) SELECT {names} FROM {table.name}')
+    conn.exec_driver_sql(f'DROP TABLE {table.name}')
+    conn.exec_driver_sql(f'ALTER TABLE {rebuilt} RENAME TO {table.name}')
+    for index in table.indexes:
+        index.create(conn)
@@ -1,17 +1,51 @@
 # app/services/auth_service.py
-from datetime import datetime, timedelta
-import uuid
+from datetime import datetime
+import re
 from flask import current_app
 from flask_jwt_extended import create_access_token
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
 
-from app.models import db, User, PasswordReset
+from app.models import db, User, PasswordReset, ReferralCounter
+from app.services.availability_service import availability
+from app.services.cache import cache
 from app.services.email_service import send_password_reset_email
+from app.services.password_service import password_hasher, PasswordHasherBusy
+from app.services.referral_service import create_referral, get_user_by_referral_code
+from app.services.referral_tree_service import add_to_referral_tree
+from app.services.refresh_token_service import issue_refresh_token, revoke_all_sessions
+from app.services.reward_service import rewards
+from app.services.token_service import token_versions, profile_claims
+from app.utils.db import delete_in_batches
+from app.utils.serializers import serialize_user
+from app.utils.replicas import replica_read
+from app.utils.tokens import new_token, hash_token
+from app.utils.validators import find_taken_fields
+
+# Reset tokens issued before they were hashed were stored as plain UUIDs
+LEGACY_RESET_TOKEN_RE = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+
+class RegistrationError(ValueError):
+    """Raised when the username or email is already in use"""
+    
+    def __init__(self, errors):
+        super().__init__("Username or email is already in use")
+        self.errors = errors
 
 def register_user(username, email, password, referral_code=None):
-    """Register a new user"""
+    """Register a new user and their referral in one transaction; its rewards are applied after"""
+    user, _ = _register(username, email, password, referral_code)
+    return user
+
+def register_user_with_session(username, email, password, referral_code=None, device_name=None):
+    """Register a user and start their first device session in the same transaction; returns (user, refresh token)"""
+    return _register(username, email, password, referral_code,
+                     lambda user: issue_refresh_token(user.id, device_name, commit=False))
+
+def _register(username, email, password, referral_code, in_transaction=None):
     referred_by = None
     if referral_code:
-        referred_by = User.query.filter_by(referral_code=referral_code).first()
+        referred_by = get_user_by_referral_code(referral_code)
         if not referred_by:
             raise ValueError("Invalid referral code")  # <-- Raise an error for invalid referral
 
@@ -19,22 +53,52 @@ def register_user(username, email, password, referral_code=None):
     if referred_by and referred_by.email == email:
         raise ValueError("You cannot refer yourself")  # <-- Prevent self-referral
 
+    # Names the availability filter has never seen skip the query; the unique constraints still apply
+    errors = availability.find_taken(username, email)
+    if errors:
+        raise RegistrationError(errors)
+
     # Create new user
     user = User(username=username, email=email, password=password, referred_by=referred_by)
+    user.referral_counter = ReferralCounter()
 
-    # Add to database
-    db.session.add(user)
-    db.session.commit()
+    # User, referral and its reward outbox row go out in a single flush and commit
+    try:
+        db.session.add(user)
 
-    # Create referral record if user was referred
-    if referred_by:
-        from app.services.referral_service import create_referral
-        create_referral(referred_by.id, user.id)
+        # Create referral record if user was referred
+        if referred_by:
+            create_referral(referred_by, user, commit=False)
 
-    return user
+        db.session.flush()
+
+        if referred_by:
+            add_to_referral_tree(user.id, referred_by.id)
+        extra = in_transaction(user) if in_transaction else None
 
+        cache.invalidate_user(user.id)
+        availability.add_after_commit(username, email)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        errors = find_taken_fields(username, email)
+        if not errors:
+            raise
+        raise RegistrationError(errors)
+
+    if referred_by:
+        rewards.notify()
 
+    return user, extra
 
+@replica_read
+def get_user_profile(user_id):
+    """Get a user's profile fields, read through the cache"""
+    def load():
+        user = db.session.get(User, int(user_id))
+        return serialize_user(user) if user else None
+    
+    return cache.cached('profile', user_id, load)
 
 def authenticate_user(username_or_email, password):
     """Authenticate user credentials"""
@@ -45,13 +109,20 @@ def authenticate_user(username_or_email, password):
         user = User.query.filter_by(username=username_or_email).first()
     
     if user and user.verify_password(password):
+        # Upgrade hashes made with an old work factor while we have the plaintext
+        if password_hasher.needs_rehash(user.password):
+            try:
+                user.password = password
+                db.session.commit()
+            except PasswordHasherBusy:
+                db.session.rollback()
         return user
     
     return None
 
-def create_user_token(user_id):
-    """Create JWT token for user"""
-    access_token = create_access_token(identity=user_id)
+def create_user_token(user):
+    """Create JWT token for user, stamped with their token version and profile claims"""
+    access_token = create_access_token(identity=str(user.id), additional_claims=profile_claims(user))
     return access_token
 
 def initiate_password_reset(email):
@@ -60,14 +131,24 @@ def initiate_password_reset(email):
     if not user:
         return False
     
-    # Generate token
-    token = str(uuid.uuid4())
+    # Keep at most PASSWORD_RESET_MAX_ACTIVE live tokens: drop expired ones and replace the oldest
+    now = datetime.utcnow()
+    limit = current_app.config.get('PASSWORD_RESET_MAX_ACTIVE', 3)
+    replaced = [row.id for row in PasswordReset.query.with_entities(PasswordReset.id).filter(
+        PasswordReset.user_id == user.id,
+        PasswordReset.expires_at >= now
+    ).order_by(PasswordReset.expires_at.desc(), PasswordReset.id.desc()).offset(limit - 1)]
+    stale = PasswordReset.expires_at < now
+    if replaced:
+        stale = or_(stale, PasswordReset.id.in_(replaced))
+    PasswordReset.query.filter(PasswordReset.user_id == user.id, stale).delete(synchronize_session=False)
     
-    # Save token to database
+    # Only the token's hash is stored; the token itself goes out by email
+    token = new_token()
     reset = PasswordReset(
         user_id=user.id,
-        token=token,
-        expires_at=datetime.utcnow() + timedelta(hours=24)
+        token_hash=hash_token(token),
+        expires_at=now + current_app.config['PASSWORD_RESET_EXPIRES']
     )
     
     db.session.add(reset)
@@ -80,7 +161,12 @@ def initiate_password_reset(email):
 
 def reset_password(token, new_password):
     """Reset user password using token"""
-    reset = PasswordReset.query.filter_by(token=token).first()
+    if not token:
+        return False
+    candidates = [hash_token(token)]
+    if LEGACY_RESET_TOKEN_RE.match(token):
+        candidates.append(token)
+    reset = PasswordReset.query.filter(PasswordReset.token_hash.in_(candidates)).first()
     
     if not reset or reset.expires_at < datetime.utcnow():
         return False
@@ -91,6 +177,14 @@ def reset_password(token, new_password):
     # Delete all reset tokens for this user
     PasswordReset.query.filter_by(user_id=user.id).delete()
     
+    # Sign out every existing session
+    token_versions.bump(user.id, revoke=True)
+    revoke_all_sessions(user.id, commit=False)
+    cache.invalidate_user(user.id)
     db.session.commit()
     
-    return True
\ No newline at end of file
+    return True
+
+def purge_expired_password_resets(batch_size=1000):
+    """Delete expired password reset tokens in short batches"""
+    return delete_in_batches(PasswordReset, PasswordReset.expires_at < datetime.utcnow(), batch_size)
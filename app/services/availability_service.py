@@ -0,0 +1,252 @@
+# app/services/availability_service.py
+import calendar
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func
+
+from app.models import db, User
+from app.utils.bloom import BloomFilter
+from app.utils.db import after_commit
+from app.utils.validators import find_taken_fields
+
+logger = logging.getLogger(__name__)
+
+LOAD_BATCH_SIZE = 10000
+
+
+def normalize_username(username):
+    return username.strip().lower()
+
+
+def normalize_email(email):
+    return email.strip().lower()
+
+
+class AvailabilityFilter:
+    """Bloom filter over every normalized username and email in the users table.
+
+    A miss means the name is definitely free, so the availability check
+    answers without touching the database. A hit may be a false positive
+    and falls through to one combined query. The filter is sized for
+    ``AVAILABILITY_FILTER_CAPACITY`` entries (two per user) at
+    ``AVAILABILITY_FILTER_ERROR_RATE``; at the defaults that is 2M entries,
+    about 2.3 MiB and 1% false positives per field.
+
+    Each worker loads the filter once, from ``AVAILABILITY_FILTER_PATH`` if
+    a snapshot exists, else by streaming the users table. With
+    ``AVAILABILITY_FILTER_LOAD = "background"`` a thread loads it as the
+    worker starts (gunicorn's ``post_worker_init``, else the first check),
+    and checks query the database until it is ready; ``"sync"`` loads it
+    in the first caller, which is what the test suite uses. Registrations in
+    this worker are added after commit. Every
+    ``AVAILABILITY_FILTER_REFRESH_SECONDS`` the worker adds users created
+    since its last refresh, less ``AVAILABILITY_FILTER_RESCAN_SECONDS``, so
+    signups from other workers and imports that commit late are still
+    seen. Registration does not rely on the filter for correctness; the
+    unique constraints do.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Held while loading or refreshing, so one thread does it and checks never wait on it
+        self._load_lock = threading.Lock()
+        self._reset()
+
+    def init_app(self, app):
+        self._reset()
+        app.extensions['availability'] = self
+
+    def _reset(self):
+        self._filter = None
+        self._loader = None
+        self._watermark = None
+        self._refreshed_at = None
+        self._snapshot_mtime = None
+        self._pid = None
+        self.definite_misses = 0
+        self.possible_hits = 0
+        self.false_positives = 0
+
+    def find_taken(self, username=None, email=None):
+        """Like find_taken_fields, but only queries for names the filter may contain"""
+        bloom = self._current_filter()
+        if bloom is None:
+            return find_taken_fields(username, email)
+        check_username = username if username and f"u:{normalize_username(username)}" in bloom else None
+        check_email = email if email and f"e:{normalize_email(email)}" in bloom else None
+
+        checked = sum(value is not None for value in (check_username, check_email))
+        asked = sum(bool(value) for value in (username, email))
+        if not checked:
+            self._count(definite_misses=asked)
+            return {}
+
+        errors = find_taken_fields(check_username, check_email)
+        self._count(definite_misses=asked - checked, possible_hits=checked, false_positives=checked - len(errors))
+        return errors
+
+    def add(self, username, email):
+        """Record a newly registered user's names; call after commit"""
+        bloom = self._filter
+        if bloom is None:
+            return  # The first load will read them from the table
+        with self._lock:
+            bloom.add(f"u:{normalize_username(username)}")
+            bloom.add(f"e:{normalize_email(email)}")
+
+    def add_after_commit(self, username, email):
+        after_commit(self.add, username, email)
+
+    def load(self):
+        """Load this worker's filter now, unless another thread just has; returns it"""
+        with self._load_lock:
+            if self._filter is not None and self._pid == os.getpid() and not self._snapshot_changed():
+                return self._filter
+            bloom, watermark = self._load()
+            with self._lock:
+                self._filter = bloom
+                self._watermark = watermark
+                self._refreshed_at = time.monotonic()
+                self._pid = os.getpid()
+            self._add_new_users()
+            return bloom
+
+    def warm(self, app):
+        """Start loading the filter in a background thread unless a load is under way"""
+        with self._lock:
+            # Threads do not survive a fork, so a parent's loader is never alive here
+            if self._loader is not None and self._loader.is_alive():
+                return
+            self._loader = threading.Thread(target=self._warm, args=(app,), name='availability-loader', daemon=True)
+            self._loader.start()
+
+    def invalidate(self):
+        """Drop this worker's filter so the next check reloads it"""
+        with self._lock:
+            self._filter = None
+
+    def rebuild(self, path=None):
+        """Build a fresh filter from the users table, optionally writing a snapshot"""
+        bloom, watermark = self._build()
+        if path:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(bloom.to_bytes(_to_micros(watermark)))
+            os.replace(tmp_path, path)
+        self.invalidate()
+        return bloom
+
+    def stats(self):
+        bloom = self._filter
+        return {
+            'loaded': bloom is not None,
+            'entries': bloom.count if bloom else 0,
+            'memory_bytes': bloom.memory_bytes if bloom else 0,
+            'hashes': bloom.num_hashes if bloom else 0,
+            'estimated_error_rate': bloom.estimated_error_rate() if bloom else 0.0,
+            'definite_misses': self.definite_misses,
+            'possible_hits': self.possible_hits,
+            'false_positives': self.false_positives
+        }
+
+    def _current_filter(self):
+        """This worker's filter, refreshed when due; None while it is still loading"""
+        bloom = self._filter
+        if bloom is None or self._pid != os.getpid():
+            if current_app.config.get('AVAILABILITY_FILTER_LOAD') == 'sync':
+                return self.load()
+            self.warm(current_app._get_current_object())
+            return None
+
+        refresh = current_app.config.get('AVAILABILITY_FILTER_REFRESH_SECONDS', 5)
+        if time.monotonic() - self._refreshed_at < refresh:
+            return bloom
+        if self._snapshot_changed():
+            return self.load()
+        # One thread refreshes; the others keep answering from the current filter
+        if self._load_lock.acquire(blocking=False):
+            try:
+                self._add_new_users()
+            finally:
+                self._load_lock.release()
+        return self._filter
+
+    def _warm(self, app):
+        with app.app_context():
+            try:
+                self.load()
+            except Exception:
+                logger.exception("Loading the availability filter failed; checks will query the database")
+            finally:
+                db.session.remove()
+
+    def _load(self):
+        path = current_app.config.get('AVAILABILITY_FILTER_PATH')
+        if path and os.path.exists(path):
+            try:
+                self._snapshot_mtime = os.path.getmtime(path)
+                with open(path, 'rb') as f:
+                    bloom, micros = BloomFilter.from_bytes(f.read())
+                return bloom, _from_micros(micros)
+            except (OSError, ValueError):
+                logger.warning("Ignoring unreadable availability filter snapshot %s", path, exc_info=True)
+        self._snapshot_mtime = None
+        return self._build()
+
+    def _build(self):
+        # Users created before this moment and committed after the scan are caught by the next refresh
+        watermark = datetime.utcnow()
+        user_count = db.session.query(func.count(User.id)).scalar()
+        capacity = max(current_app.config.get('AVAILABILITY_FILTER_CAPACITY', 2000000), user_count * 2)
+        bloom = BloomFilter.for_capacity(capacity, current_app.config.get('AVAILABILITY_FILTER_ERROR_RATE', 0.01))
+
+        rows = db.session.query(User.username, User.email).yield_per(LOAD_BATCH_SIZE)
+        for username, email in rows:
+            bloom.add(f"u:{normalize_username(username)}")
+            bloom.add(f"e:{normalize_email(email)}")
+        return bloom, watermark
+
+    def _snapshot_changed(self):
+        path = current_app.config.get('AVAILABILITY_FILTER_PATH')
+        if not path or not os.path.exists(path):
+            return False
+        return os.path.getmtime(path) != self._snapshot_mtime
+
+    def _add_new_users(self):
+        # created_at is stamped before commit, so look back far enough for slow transactions
+        now = datetime.utcnow()
+        rescan = timedelta(seconds=current_app.config.get('AVAILABILITY_FILTER_RESCAN_SECONDS', 60))
+        rows = db.session.query(User.username, User.email).filter(
+            User.created_at >= self._watermark - rescan
+        ).all()
+        with self._lock:
+            if self._filter is None:
+                return
+            for username, email in rows:
+                # Rescanned users are already in; adding them again would only inflate the count
+                for key in (f"u:{normalize_username(username)}", f"e:{normalize_email(email)}"):
+                    if key not in self._filter:
+                        self._filter.add(key)
+            self._watermark = now
+            self._refreshed_at = time.monotonic()
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+
+def _to_micros(moment):
+    return calendar.timegm(moment.utctimetuple()) * 1000000 + moment.microsecond
+
+
+def _from_micros(micros):
+    return datetime(1970, 1, 1) + timedelta(microseconds=micros)
+
+
+availability = AvailabilityFilter()
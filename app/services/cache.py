@@ -0,0 +1,202 @@
+# app/services/cache.py
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from app.utils.db import after_commit
+from app.utils.replicas import replicas
+from app.utils.resp import RespClient
+
+logger = logging.getLogger(__name__)
+
+
+class NullBackend:
+    """Caching disabled: every read goes to the database"""
+
+    enabled = False
+    evictions = 0
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None, nx=False):
+        return True
+
+
+class MemoryBackend:
+    """In-process LRU with per-entry TTL; only coherent for a single worker process"""
+
+    enabled = True
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None, nx=False):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if nx and key in self._data:
+                return False
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            return True
+
+
+class RedisBackend:
+    """Shared cache on any Redis-protocol server"""
+
+    enabled = True
+    evictions = 0
+
+    def __init__(self, url):
+        self.client = RespClient(url)
+
+    def get(self, key):
+        value = self.client.get(key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value, ttl=None, nx=False):
+        return self.client.set(key, value, ex=ttl, nx=nx)
+
+
+class Cache:
+    """Read-through cache for per-user reads with invalidation on commit.
+
+    Every cached value lives under a per-user generation token. Invalidating
+    a user replaces the token once the writing transaction commits, so
+    later reads miss and reload. A reader that loaded old data just before
+    the commit stores it under the retired token, where nothing reads it
+    again. The default ``null`` backend disables caching; use ``redis`` for
+    multi-worker deployments and ``memory`` only with a single worker.
+    """
+
+    def __init__(self):
+        self.backend = NullBackend()
+        self.prefix = ''
+        self.default_ttl = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def init_app(self, app):
+        name = app.config.get('CACHE_BACKEND', 'null')
+        if name == 'memory':
+            self.backend = MemoryBackend(app.config.get('CACHE_MAX_ENTRIES', 10000))
+        elif name == 'redis':
+            self.backend = RedisBackend(app.config['CACHE_REDIS_URL'])
+        elif name == 'null':
+            self.backend = NullBackend()
+        else:
+            raise ValueError(f"Unknown CACHE_BACKEND {name!r}")
+
+        self.prefix = app.config.get('CACHE_KEY_PREFIX', '')
+        self.default_ttl = app.config.get('CACHE_DEFAULT_TTL', 300)
+        self.hits = self.misses = self.errors = 0
+        app.extensions['cache'] = self
+
+    @property
+    def enabled(self):
+        return self.backend.enabled
+
+    def cached(self, namespace, user_id, loader, *key_parts, ttl=None):
+        """Return the cached value for a user's read, calling loader() on a miss"""
+        if not self.backend.enabled:
+            return loader()
+
+        # A lagging replica's answers are kept apart, so reads on the primary never serve them
+        from_replica = replicas.routing()
+        if from_replica:
+            key_parts += ('replica',)
+        try:
+            key = self._key(namespace, user_id, key_parts)
+            raw = self.backend.get(key)
+        except Exception:
+            self._count('errors')
+            logger.warning("Cache read failed", exc_info=True)
+            return loader()
+
+        if raw is not None:
+            self._count('hits')
+            return json.loads(raw)
+
+        self._count('misses')
+        value = loader()
+        if value is not None:
+            ttl = ttl or self.default_ttl
+            if from_replica:
+                # A lagging replica may predate the last invalidation; keep its answer briefly
+                ttl = min(ttl, replicas.cache_ttl) if ttl else replicas.cache_ttl
+            try:
+                self.backend.set(key, json.dumps(value), ttl=ttl)
+            except Exception:
+                self._count('errors')
+                logger.warning("Cache write failed", exc_info=True)
+        return value
+
+    def invalidate_user(self, user_id):
+        """Drop a user's cached reads once the current transaction commits"""
+        if self.backend.enabled:
+            after_commit(self._retire_generation, int(user_id))
+
+    def generation(self, user_id):
+        """The user's current generation token, creating one if none exists"""
+        gen_key = f"{self.prefix}gen:{user_id}"
+        generation = self.backend.get(gen_key)
+        if generation is None:
+            token = uuid.uuid4().hex
+            if self.backend.set(gen_key, token, ttl=self._generation_ttl(), nx=True):
+                return token
+            # Another reader created it first; an unreadable token just means no caching
+            generation = self.backend.get(gen_key) or token
+        return generation
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.backend.evictions,
+            'errors': self.errors
+        }
+
+    def _key(self, namespace, user_id, key_parts):
+        parts = ':'.join(str(part) for part in key_parts)
+        return f"{self.prefix}{namespace}:{user_id}:{self.generation(user_id)}:{parts}"
+
+    def _generation_ttl(self):
+        # Outlives the data it guards; an expired token only costs a miss
+        return self.default_ttl * 2 if self.default_ttl else None
+
+    def _retire_generation(self, user_id):
+        try:
+            self.backend.set(f"{self.prefix}gen:{user_id}", uuid.uuid4().hex, ttl=self._generation_ttl())
+        except Exception:
+            self._count('errors')
+            logger.error("Could not invalidate cache for user %s", user_id, exc_info=True)
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+cache = Cache()
@@ -0,0 +1,250 @@
+# app/services/email_queue.py
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from flask import render_template
+from flask_mail import Message, email_dispatched
+
+from app.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class EmailJob:
+    """A queued email waiting to be rendered and delivered"""
+
+    __slots__ = ('to', 'subject', 'template', 'context', 'attempts', 'enqueued_at')
+
+    def __init__(self, to, subject, template, context):
+        self.to = to
+        self.subject = subject
+        self.template = template
+        self.context = context
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+
+
+class EmailQueue:
+    """Background email delivery over a small pool of long-lived SMTP connections.
+
+    Each worker thread owns one SMTP connection, drains up to
+    ``MAIL_BATCH_SIZE`` messages per wake-up and keeps the connection open
+    until it has been idle for ``MAIL_CONNECTION_IDLE_TIMEOUT`` seconds.
+    Failed deliveries are retried with exponential backoff. With
+    ``MAIL_DELIVERY_MODE = "sync"`` messages are delivered in the calling
+    thread, which is what the test suite uses.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._reset_state()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['email_queue'] = self
+
+    def _reset_state(self):
+        self._queue = queue.Queue()
+        self._workers = []
+        self._pid = None
+        self._pending = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.latency_count = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+
+    def enqueue(self, to, subject, template, **context):
+        """Queue an email; delivers inline when running in sync mode"""
+        job = EmailJob(to, subject, template, context)
+
+        if self.app.config.get('MAIL_DELIVERY_MODE') == 'sync':
+            with self._lock:
+                self._pending += 1
+            self._deliver_batch([job], None, retry=False)
+            return
+
+        # Count the job only after a fork has reset the parent's state
+        self._ensure_workers()
+        with self._lock:
+            self._pending += 1
+        self._queue.put(job)
+
+    def flush(self, timeout=None):
+        """Block until every queued message is delivered or has given up"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def shutdown(self, timeout=10):
+        """Deliver what is queued, then stop the workers"""
+        if not self._workers or self._pid != os.getpid():
+            return
+        self.flush(timeout)
+        for _ in self._workers:
+            self._queue.put(_STOP)
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+
+    def stats(self):
+        """Queue depth and delivery counters for monitoring"""
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'pending': self._pending,
+                'sent': self.sent,
+                'failed': self.failed,
+                'retried': self.retried,
+                'latency_count': self.latency_count,
+                'latency_sum': self.latency_sum,
+                'latency_max': self.latency_max,
+            }
+
+    def _ensure_workers(self):
+        if self._workers and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._workers and self._pid == os.getpid():
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                # Forked after the parent started its workers: start afresh
+                self._reset_state()
+            self._pid = os.getpid()
+            for i in range(self.app.config.get('MAIL_QUEUE_WORKERS', 2)):
+                worker = threading.Thread(target=self._work, name=f'email-worker-{i}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+        atexit.register(self.shutdown)
+
+    def _work(self):
+        app = self.app
+        batch_size = app.config.get('MAIL_BATCH_SIZE', 20)
+        idle_timeout = app.config.get('MAIL_CONNECTION_IDLE_TIMEOUT', 30)
+        connection = None
+
+        with app.app_context():
+            while True:
+                try:
+                    job = self._queue.get(timeout=idle_timeout)
+                except queue.Empty:
+                    connection = self._close(connection)
+                    continue
+
+                if job is _STOP:
+                    self._close(connection)
+                    return
+
+                batch = [job]
+                while len(batch) < batch_size:
+                    try:
+                        job = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is _STOP:
+                        self._queue.put(_STOP)
+                        break
+                    batch.append(job)
+
+                connection = self._deliver_batch(batch, connection)
+
+    def _deliver_batch(self, batch, connection, retry=True):
+        """Send a batch over one connection, reconnecting after SMTP errors"""
+        app = self.app
+        suppress = app.config.get('MAIL_SUPPRESS_SEND', app.testing)
+
+        for job in batch:
+            try:
+                msg = Message(job.subject, recipients=[job.to])
+                with app.app_context():
+                    msg.html = render_template(job.template, **job.context)
+            except Exception:
+                logger.exception("Failed to render email %r", job.template)
+                self._finish(job, delivered=False)
+                continue
+
+            try:
+                if suppress:
+                    email_dispatched.send(msg, app=app)
+                else:
+                    if connection is None:
+                        with metrics.timed('smtp_seconds', operation='connect'):
+                            connection = self._open()
+                    with metrics.timed('smtp_seconds', operation='send'):
+                        connection.send(msg)
+            except Exception:
+                logger.warning("Email delivery to %s failed (attempt %d)", job.to, job.attempts + 1, exc_info=True)
+                connection = self._close(connection)
+                if retry:
+                    self._retry(job)
+                else:
+                    self._finish(job, delivered=False)
+                continue
+
+            self._finish(job, delivered=True)
+
+        if not retry:
+            self._close(connection)
+            return None
+        return connection
+
+    def _retry(self, job):
+        job.attempts += 1
+        if job.attempts > self.app.config.get('MAIL_MAX_RETRIES', 5):
+            logger.error("Giving up on email to %s after %d attempts", job.to, job.attempts)
+            self._finish(job, delivered=False)
+            return
+
+        with self._lock:
+            self.retried += 1
+        delay = self.app.config.get('MAIL_RETRY_BACKOFF', 2.0) * 2 ** (job.attempts - 1)
+        timer = threading.Timer(delay, self._queue.put, args=(job,))
+        timer.daemon = True
+        timer.start()
+
+    def _finish(self, job, delivered):
+        with self._lock:
+            if delivered:
+                latency = time.monotonic() - job.enqueued_at
+                self.sent += 1
+                self.latency_count += 1
+                self.latency_sum += latency
+                self.latency_max = max(self.latency_max, latency)
+            else:
+                self.failed += 1
+            self._pending -= 1
+            if not self._pending:
+                self._idle.notify_all()
+
+    def _open(self):
+        from app import mail
+        connection = mail.connect()
+        connection.__enter__()
+        return connection
+
+    def _close(self, connection):
+        if connection is not None:
+            try:
+                connection.__exit__(None, None, None)
+            except Exception:
+                logger.debug("Error closing SMTP connection", exc_info=True)
+        return None
+
+
+email_queue = EmailQueue()
@@ -1,14 +1,12 @@
 # app/services/email_service.py
-from flask import current_app, render_template
-from flask_mail import Message
+from flask import current_app
+
+from app.services.email_queue import email_queue
 
 
 def send_email(to, subject, template, **kwargs):
-    """Send email"""
-    from app import mail
-    msg = Message(subject, recipients=[to])
-    msg.html = render_template(template, **kwargs)
-    mail.send(msg)
+    """Queue email for background delivery"""
+    email_queue.enqueue(to, subject, template, **kwargs)
 
 def send_password_reset_email(email, token):
     """Send password reset email"""
@@ -0,0 +1,313 @@
+# app/services/import_service.py
+import csv
+import json
+import re
+import time
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import bindparam, or_
+
+from app.models import db, User, Referral, ReferralCounter, RewardOutbox
+from app.services.cache import cache
+from app.services.leaderboard_service import leaderboard
+from app.services.password_service import password_hasher
+from app.services.referral_service import bump_referral_counters, referral_totals, resolve_referral_codes
+from app.services.reward_service import rewards
+from app.services.referral_tree_service import attach_to_referral_tree
+from app.services.rollup_service import record_referral
+from app.utils.referral_codes import encode_referral_code, is_short_code
+from app.utils.validators import validate_registration_format
+
+BCRYPT_HASH_RE = re.compile(r'^\$2[abxy]\$\d{2}\$[./A-Za-z0-9]{53}$')
+MAX_REPORTED_ERRORS = 100
+
+# Imported referrals' outbox rows are held this far out until the import has linked the upline the rules read
+HELD_UNTIL = datetime(9999, 12, 31)
+
+
+class ImportResult:
+    """Counters and errors collected while importing users"""
+
+    def __init__(self):
+        self.rows = 0
+        self.users_created = 0
+        self.referrals_created = 0
+        self.skipped = 0
+        self.errors = []
+        self.started_at = time.monotonic()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def add_error(self, line, message):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'users_created': self.users_created,
+            'referrals_created': self.referrals_created,
+            'skipped': self.skipped,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_sec': round(self.rows_per_sec, 1),
+            'errors': self.errors
+        }
+
+
+def import_users(stream, fmt='ndjson', chunk_size=1000, on_chunk=None):
+    """Stream users from an NDJSON or CSV text stream into the database.
+
+    Rows are validated with the registration rules, hashed in parallel (or
+    taken as-is from ``password_hash``) and inserted in chunks of
+    ``chunk_size`` with one commit per chunk. A row's ``referral_code`` is
+    kept as a legacy code; rows without one get the code derived from their
+    new id. ``referred_by`` holds the referrer's referral code; codes are
+    resolved through an in-memory code -> id index, and references to users
+    further down the file are linked once those users have been inserted.
+    Only the current chunk and the index are held in memory.
+
+    Like a signup, each referral updates the referral tree and its
+    referrer's counters, rollups and leaderboard rows in its chunk's
+    transaction, so the cost follows the size of the file, never of the
+    database. Its ``reward_outbox`` row is held until the whole file is
+    linked, since a referrer's own upline may come later in it, and then
+    released to the reward engine, which applies the ``REWARD_RULES``.
+    """
+    result = ImportResult()
+    code_index = {}
+    pending = []
+
+    chunk = []
+    for line, record in _iter_records(stream, fmt, result):
+        chunk.append((line, record))
+        if len(chunk) >= chunk_size:
+            _import_chunk(chunk, code_index, pending, result)
+            chunk = []
+            if on_chunk:
+                on_chunk(result)
+    if chunk:
+        _import_chunk(chunk, code_index, pending, result)
+
+    _link_pending(pending, code_index, result, chunk_size)
+
+    if result.users_created:
+        _release_rewards()
+
+    result.elapsed = time.monotonic() - result.started_at
+    return result
+
+
+def _iter_records(stream, fmt, result):
+    if fmt == 'csv':
+        for line, record in enumerate(csv.DictReader(stream), start=2):
+            result.rows += 1
+            yield line, {key: value or None for key, value in record.items()}
+        return
+
+    for line, text in enumerate(stream, start=1):
+        text = text.strip()
+        if not text:
+            continue
+        result.rows += 1
+        try:
+            record = json.loads(text)
+        except ValueError:
+            result.add_error(line, "Invalid JSON")
+            continue
+        if not isinstance(record, dict):
+            result.add_error(line, "Expected a JSON object")
+            continue
+        yield line, record
+
+
+def _validate(record):
+    username = record.get('username')
+    email = record.get('email') or ''
+    password = record.get('password')
+    password_hash = record.get('password_hash')
+
+    _, errors = validate_registration_format(username, email, password or '')
+    if password_hash and not password:
+        errors.pop('password', None)
+        if not BCRYPT_HASH_RE.match(password_hash):
+            errors['password_hash'] = "Not a bcrypt hash"
+    # Seven-character base62 codes are reserved for codes derived from user ids
+    if is_short_code(record.get('referral_code')):
+        errors['referral_code'] = "Referral code clashes with the generated code format"
+    return errors
+
+
+def _import_chunk(chunk, code_index, pending, result):
+    rows = []
+    seen_usernames, seen_emails, seen_codes = set(), set(), set()
+    for line, record in chunk:
+        errors = _validate(record)
+        if errors:
+            result.add_error(line, errors)
+            continue
+
+        code = record.get('referral_code')
+        if record['username'] in seen_usernames or record['email'] in seen_emails or code in seen_codes:
+            result.add_error(line, "Duplicate user in file")
+            continue
+        seen_usernames.add(record['username'])
+        seen_emails.add(record['email'])
+        if code:
+            seen_codes.add(code)
+        rows.append((line, record, code))
+
+    if not rows:
+        return
+
+    # One query finds rows that clash with users already in the database
+    existing = User.query.with_entities(User.username, User.email, User.legacy_referral_code).filter(or_(
+        User.username.in_(seen_usernames),
+        User.email.in_(seen_emails),
+        User.legacy_referral_code.in_(seen_codes)
+    )).all()
+    taken_usernames = {row.username for row in existing}
+    taken_emails = {row.email for row in existing}
+    taken_codes = {row.legacy_referral_code for row in existing}
+
+    accepted = []
+    for line, record, code in rows:
+        if record['username'] in taken_usernames or record['email'] in taken_emails or (code and code in taken_codes):
+            result.add_error(line, "User already exists")
+            continue
+        accepted.append((record, code))
+
+    if not accepted:
+        return
+
+    _resolve_codes({record['referred_by'] for record, _ in accepted if record.get('referred_by')}, code_index)
+
+    to_hash = [record['password'] for record, _ in accepted if record.get('password')]
+    hashes = iter(password_hasher.hash_many(to_hash))
+
+    user_rows = []
+    for record, code in accepted:
+        user_rows.append({
+            'username': record['username'],
+            'email': record['email'],
+            'password': next(hashes) if record.get('password') else record['password_hash'],
+            'referral_code': code,
+            'referred_by_id': code_index.get(record.get('referred_by'))
+        })
+    db.session.execute(User.__table__.insert(), user_rows)
+
+    ids = dict(User.query.with_entities(User.username, User.id).filter(
+        User.username.in_([record['username'] for record, _ in accepted])
+    ))
+    db.session.execute(ReferralCounter.__table__.insert(), [
+        {'user_id': user_id, 'total_referrals': 0, 'successful_referrals': 0, 'rewards_earned': 0, 'reward_amount': 0.0}
+        for user_id in ids.values()
+    ])
+
+    links, updates = [], []
+    for (record, code), row in zip(accepted, user_rows):
+        user_id = ids[record['username']]
+        code = code or encode_referral_code(user_id)
+        code_index[code] = user_id
+
+        referrer_code = record.get('referred_by')
+        if not referrer_code or referrer_code == code:
+            continue
+        if row['referred_by_id'] is not None:
+            links.append((user_id, row['referred_by_id']))
+        elif referrer_code in code_index:
+            links.append((user_id, code_index[referrer_code]))
+            updates.append((user_id, code_index[referrer_code]))
+        else:
+            pending.append((user_id, referrer_code))
+
+    _link(links, updates, result)
+    result.users_created += len(accepted)
+    db.session.commit()
+
+
+def _resolve_codes(codes, code_index):
+    """Add referrers that already exist in the database to the index"""
+    missing = [code for code in codes if code not in code_index]
+    if missing:
+        code_index.update(resolve_referral_codes(missing))
+
+
+def _link(links, updates, result):
+    """Link (user id, referrer id) pairs in the caller's transaction.
+
+    Bulk-inserts the referral rows and their held outbox rows, then adds
+    them to the referral tree, and to the counters, rollups and leaderboard
+    of just the referrers involved, as signups do one at a time.
+    """
+    if updates:
+        db.session.execute(
+            User.__table__.update()
+            .where(User.__table__.c.id == bindparam('user_id'))
+            .values(referred_by_id=bindparam('referrer_id')),
+            [{'user_id': user_id, 'referrer_id': referrer_id} for user_id, referrer_id in updates]
+        )
+    if not links:
+        return
+
+    counts = Counter(referrer_id for _, referrer_id in links)
+    for referrer_id, count in counts.items():
+        bump_referral_counters(referrer_id, total_referrals=count, successful_referrals=count)
+    totals = referral_totals(list(counts))
+    next_ordinal = {referrer_id: totals.get(referrer_id, count) - count + 1 for referrer_id, count in counts.items()}
+
+    rows = []
+    for user_id, referrer_id in links:
+        rows.append({'referrer_id': referrer_id, 'referred_user_id': user_id, 'status': 'successful',
+                     'ordinal': next_ordinal[referrer_id]})
+        next_ordinal[referrer_id] += 1
+    db.session.execute(Referral.__table__.insert(), rows)
+    referral_ids = Referral.query.with_entities(Referral.id).filter(
+        Referral.referred_user_id.in_([user_id for user_id, _ in links])
+    ).all()
+    db.session.execute(RewardOutbox.__table__.insert(), [
+        {'referral_id': referral_id, 'attempts': 0, 'available_at': HELD_UNTIL}
+        for referral_id, in referral_ids
+    ])
+    for user_id, referrer_id in links:
+        attach_to_referral_tree(user_id, referrer_id)
+
+    for referrer_id, count in counts.items():
+        record_referral(referrer_id, count)
+        cache.invalidate_user(referrer_id)
+    for referrer in User.query.with_entities(User.id, User.username).filter(User.id.in_(list(counts))):
+        leaderboard.record_referral(referrer)
+    result.referrals_created += len(links)
+
+
+def _release_rewards():
+    """Make every held outbox row due and hand them to the reward engine.
+
+    This also releases rows an interrupted import left held.
+    """
+    released = RewardOutbox.query.filter(RewardOutbox.available_at == HELD_UNTIL).update(
+        {'available_at': datetime.utcnow()}, synchronize_session=False
+    )
+    db.session.commit()
+    if released:
+        rewards.notify()
+
+
+def _link_pending(pending, code_index, result, chunk_size):
+    """Link users whose referrer appeared later in the file"""
+    for start in range(0, len(pending), chunk_size):
+        batch = pending[start:start + chunk_size]
+        _resolve_codes({code for _, code in batch}, code_index)
+
+        links = []
+        for user_id, code in batch:
+            if code in code_index:
+                links.append((user_id, code_index[code]))
+            else:
+                result.add_error(None, f"Unknown referral code {code!r} for user {user_id}")
+        _link(links, links, result)
+        db.session.commit()
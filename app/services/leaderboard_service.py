@@ -0,0 +1,247 @@
+# app/services/leaderboard_service.py
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import case, func, literal, select
+
+from app.models import db, User, ReferralCounter, ReferralRollup, LeaderboardEntry
+from app.utils.db import after_commit, upsert
+
+logger = logging.getLogger(__name__)
+
+ALL_TIME = 'all'
+
+
+def window_days(window):
+    """Number of days in a rolling window such as '7d'; None for all time"""
+    if window == ALL_TIME:
+        return None
+    if not window.endswith('d') or not window[:-1].isdigit() or int(window[:-1]) < 1:
+        raise ValueError(f"Unknown leaderboard window {window!r}")
+    return int(window[:-1])
+
+
+class TopN:
+    """The N highest scores, kept sorted in memory"""
+
+    def __init__(self, size):
+        self.size = size
+        self._order = []   # sorted (-score, user_id)
+        self._scores = {}  # user_id -> score
+        self._names = {}   # user_id -> username
+
+    def __len__(self):
+        return len(self._order)
+
+    def qualifies(self, user_id, score):
+        """True if this score would place the user on the board"""
+        if user_id in self._scores or len(self._order) < self.size:
+            return score > 0
+        return (-score, user_id) < self._order[-1]
+
+    def update(self, user_id, score, username=None):
+        old = self._scores.pop(user_id, None)
+        if old is not None:
+            del self._order[bisect_left(self._order, (-old, user_id))]
+        if username is not None:
+            self._names[user_id] = username
+
+        if score > 0 and (len(self._order) < self.size or (-score, user_id) < self._order[-1]):
+            insort(self._order, (-score, user_id))
+            self._scores[user_id] = score
+            if len(self._order) > self.size:
+                _, dropped = self._order.pop()
+                del self._scores[dropped]
+
+        if user_id not in self._scores:
+            self._names.pop(user_id, None)
+
+    def rank_of_score(self, score):
+        """Competition rank: one more than the number of strictly higher scores"""
+        return bisect_left(self._order, (-score, 0)) + 1
+
+    def score(self, user_id):
+        return self._scores.get(user_id)
+
+    def entries(self, limit):
+        return [
+            {
+                'rank': self.rank_of_score(-neg_score),
+                'user_id': user_id,
+                'username': self._names.get(user_id),
+                'score': -neg_score
+            }
+            for neg_score, user_id in self._order[:limit]
+        ]
+
+
+class Leaderboard:
+    """Top referrers per window, held in memory and snapshotted to leaderboard_entries.
+
+    create_referral bumps the referrer's daily rollup and then recomputes
+    their scores here. When those scores make a board, it upserts the snapshot row in
+    the same transaction and updates this worker's in-memory board after
+    commit. Workers reload their boards from the snapshot table every
+    ``LEADERBOARD_REFRESH_SECONDS``, which is also how a cold worker starts.
+    Rolling windows only shed old days when the offline
+    ``rebuild_leaderboard`` job runs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def init_app(self, app):
+        self._reset()
+        app.extensions['leaderboard'] = self
+
+    def _reset(self):
+        self._boards = {}
+        self._loaded_at = None
+        self._pid = None
+
+    def windows(self):
+        return [ALL_TIME] + list(current_app.config.get('LEADERBOARD_WINDOWS', []))
+
+    def invalidate(self):
+        """Force the next read to reload the boards from the snapshot table"""
+        with self._lock:
+            self._loaded_at = None
+
+    def record_referral(self, referrer):
+        """Account a new referral, already in today's rollup, inside the caller's transaction"""
+        today = datetime.utcnow().date()
+        boards = self._current_boards()
+        scores = {
+            window: score
+            for window, score in self._scores_for(referrer.id, today).items()
+            if boards[window].qualifies(referrer.id, score)
+        }
+        if not scores:
+            return
+
+        now = datetime.utcnow()
+        for window, score in scores.items():
+            upsert(
+                LeaderboardEntry,
+                {'window': window, 'user_id': referrer.id, 'score': score, 'updated_at': now},
+                ['window', 'user_id'],
+                {'score': score, 'updated_at': now}
+            )
+        after_commit(self._apply, referrer.id, referrer.username, scores)
+
+    def top(self, window, limit):
+        return self._current_boards()[window].entries(limit)
+
+    def standing(self, window, user_id):
+        """The user's score and rank; rank is None outside a rolling board"""
+        board = self._current_boards()[window]
+        score = board.score(user_id)
+        if score is not None:
+            return {'rank': board.rank_of_score(score), 'score': score}
+
+        score = self._scores_for(user_id, datetime.utcnow().date())[window]
+        if window != ALL_TIME:
+            return {'rank': None, 'score': score}
+
+        higher = db.session.query(func.count()).filter(ReferralCounter.total_referrals > score).scalar()
+        return {'rank': higher + 1, 'score': score}
+
+    def _apply(self, user_id, username, scores):
+        with self._lock:
+            for window, score in scores.items():
+                if window in self._boards:
+                    self._boards[window].update(user_id, score, username)
+
+    def _scores_for(self, user_id, today):
+        scores = {
+            ALL_TIME: db.session.query(ReferralCounter.total_referrals).filter_by(user_id=user_id).scalar() or 0
+        }
+
+        rolling = [(window, window_days(window)) for window in self.windows() if window != ALL_TIME]
+        if rolling:
+            oldest = today - timedelta(days=max(days for _, days in rolling) - 1)
+            sums = db.session.query(*[
+                func.coalesce(func.sum(case(
+                    (ReferralRollup.bucket_start >= today - timedelta(days=days - 1), ReferralRollup.count),
+                    else_=0
+                )), 0)
+                for _, days in rolling
+            ]).filter(
+                ReferralRollup.referrer_id == user_id,
+                ReferralRollup.granularity == 'day',
+                ReferralRollup.bucket_start >= oldest
+            ).one()
+            scores.update({window: int(total) for (window, _), total in zip(rolling, sums)})
+
+        return scores
+
+    def _current_boards(self):
+        refresh = current_app.config.get('LEADERBOARD_REFRESH_SECONDS', 30)
+        if self._pid == os.getpid() and self._loaded_at is not None and time.monotonic() - self._loaded_at < refresh:
+            return self._boards
+
+        size = current_app.config.get('LEADERBOARD_SIZE', 100)
+        boards = {}
+        for window in self.windows():
+            board = TopN(size)
+            rows = db.session.query(LeaderboardEntry.user_id, User.username, LeaderboardEntry.score
+            ).join(User, User.id == LeaderboardEntry.user_id
+            ).filter(LeaderboardEntry.window == window
+            ).order_by(LeaderboardEntry.score.desc(), LeaderboardEntry.user_id
+            ).limit(size)
+            for user_id, username, score in rows:
+                board.update(user_id, score, username)
+            boards[window] = board
+
+        with self._lock:
+            self._boards = boards
+            self._loaded_at = time.monotonic()
+            self._pid = os.getpid()
+        return boards
+
+
+leaderboard = Leaderboard()
+
+
+def rebuild_leaderboard():
+    """Recompute every board from the referral counters and daily rollups.
+
+    Rolling windows sum the rollups' daily buckets, so run
+    ``backfill_referral_rollups`` first when referrals were written around
+    ``create_referral``. This belongs in a scheduled batch job, never in the
+    request path.
+    """
+    size = current_app.config.get('LEADERBOARD_SIZE', 100)
+    today = datetime.utcnow().date()
+    now = datetime.utcnow()
+
+    LeaderboardEntry.query.delete()
+    columns = ['window', 'user_id', 'score', 'updated_at']
+    db.session.execute(LeaderboardEntry.__table__.insert().from_select(columns, select(
+        literal(ALL_TIME), ReferralCounter.user_id, ReferralCounter.total_referrals, literal(now)
+    ).where(ReferralCounter.total_referrals > 0
+    ).order_by(ReferralCounter.total_referrals.desc(), ReferralCounter.user_id
+    ).limit(size)))
+
+    for window in leaderboard.windows()[1:]:
+        total = func.sum(ReferralRollup.count)
+        db.session.execute(LeaderboardEntry.__table__.insert().from_select(columns, select(
+            literal(window), ReferralRollup.referrer_id, total, literal(now)
+        ).where(
+            ReferralRollup.granularity == 'day',
+            ReferralRollup.bucket_start >= today - timedelta(days=window_days(window) - 1),
+            ReferralRollup.referrer_id > ReferralRollup.PLATFORM
+        ).group_by(ReferralRollup.referrer_id
+        ).order_by(total.desc(), ReferralRollup.referrer_id
+        ).limit(size)))
+
+    db.session.commit()
+    leaderboard.invalidate()
+
+    return LeaderboardEntry.query.count()
@@ -0,0 +1,351 @@
+# app/services/metrics.py
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+# Summed counters of exited workers, in METRICS_DIR
+RETIRED_FILE = 'metrics-retired.json'
+
+# name -> (type, help, buckets)
+METRICS = {
+    'http_requests_total': ('counter', 'Requests served, by route, method and status', None),
+    'http_request_duration_seconds': ('histogram', 'Request latency by route', LATENCY_BUCKETS),
+    'http_request_sql_queries': ('histogram', 'SQL statements run per request', COUNT_BUCKETS),
+    'http_request_sql_seconds': ('histogram', 'Time spent in SQL per request', LATENCY_BUCKETS),
+    'sql_queries_total': ('counter', 'SQL statements run, in and out of requests', None),
+    'sql_query_seconds_total': ('counter', 'Time spent in SQL, in and out of requests', None),
+    'sql_n_plus_one_total': ('counter', 'Requests that repeated one statement more than SQL_N_PLUS_ONE_THRESHOLD times', None),
+    'rate_limit_check_seconds': ('histogram', 'Time the rate limiter adds to each request', FAST_BUCKETS),
+    'password_hash_seconds': ('histogram', 'bcrypt time by operation (hash or verify)', LATENCY_BUCKETS),
+    'smtp_seconds': ('histogram', 'SMTP time by operation (connect or send)', LATENCY_BUCKETS),
+}
+
+
+class Metrics:
+    """Request, SQL and hot-spot timings, served in Prometheus text format on /metrics.
+
+    Each worker keeps its own counters and histograms. With ``METRICS_DIR``
+    set, workers write a snapshot there at most every
+    ``METRICS_FLUSH_SECONDS``, and a scrape of any worker sums every
+    snapshot in the directory. Snapshots are named by pid and a token
+    drawn at startup, so a worker reusing a dead one's pid never
+    overwrites its totals. A scrape folds the snapshots of exited workers
+    into ``metrics-retired.json`` and deletes them, so counters never go
+    backwards and the directory stays one file per live worker. Gauges
+    come only from live workers, one series per worker with a ``pid``
+    label, since a setting or state such as the number of healthy
+    replicas means nothing summed. The gauges are the ``stats()`` of every
+    extension that has one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.enabled = False
+        self.directory = None
+        self.flush_seconds = 1.0
+        self._reset()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        self.directory = app.config.get('METRICS_DIR')
+        self.flush_seconds = app.config.get('METRICS_FLUSH_SECONDS', 1.0)
+        self._reset()
+        if self.enabled:
+            app.before_request(self._start_request)
+            app.after_request(self._finish_request)
+        app.extensions['metrics'] = self
+
+    def _reset(self):
+        self._counters = Counter()  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self._pid = os.getpid()
+        self._token = uuid.uuid4().hex[:8]
+        self._flushed_at = 0.0
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_pid()
+            self._counters[key] += value
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_pid()
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * len(buckets) + [0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def timed(self, name, **labels):
+        """Observe the duration of the with-block in histogram ``name``"""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def after_rate_limit(self):
+        """Registered right after the limiter's before_request hook to time it"""
+        state = g.get('_metrics')
+        if state is not None:
+            self.observe('rate_limit_check_seconds', time.perf_counter() - state['started'])
+
+    def render(self):
+        """Every worker's metrics in Prometheus text exposition format"""
+        snapshots = [self._snapshot()]
+        if self.directory:
+            self._write(snapshots[0])
+            snapshots = self._read_all()
+
+        counters, histograms = _merge(snapshots)
+        gauges = {}
+        for snapshot in snapshots:
+            for name, value in snapshot['gauges']:
+                gauges.setdefault(name, []).append((snapshot['pid'], value))
+
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            if kind == 'counter':
+                for (series_name, labels), value in sorted(counters.items()):
+                    if series_name == name:
+                        lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            for (series_name, labels), series in sorted(histograms.items()):
+                if series_name != name:
+                    continue
+                for bound, count in zip(buckets, series):
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {count}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {series[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(series[-2])}")
+                lines.append(f"{name}_count{_labels(labels)} {series[-1]}")
+        for name, series in sorted(gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines += [f"{name}{_labels((('pid', pid),))} {_number(value)}" for pid, value in sorted(series)]
+        return "\n".join(lines) + "\n"
+
+    def stats(self):
+        with self._lock:
+            return {'series': len(self._counters) + len(self._histograms)}
+
+    def _start_request(self):
+        g._metrics = {'started': time.perf_counter(), 'queries': 0, 'sql_seconds': 0.0, 'statements': Counter()}
+
+    def _finish_request(self, response):
+        state = g.pop('_metrics', None)
+        if state is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        elapsed = time.perf_counter() - state['started']
+        self.inc('http_requests_total', route=route, method=request.method, status=str(response.status_code))
+        self.observe('http_request_duration_seconds', elapsed, route=route, method=request.method)
+        self.observe('http_request_sql_queries', state['queries'], route=route)
+        self.observe('http_request_sql_seconds', state['sql_seconds'], route=route)
+
+        threshold = current_app.config.get('SQL_N_PLUS_ONE_THRESHOLD', 0)
+        if threshold:
+            repeated = [(count, statement) for statement, count in state['statements'].items() if count > threshold]
+            if repeated:
+                self.inc('sql_n_plus_one_total', route=route)
+                for count, statement in repeated:
+                    logger.warning("Possible N+1 in %s %s: %d runs of %s",
+                                   request.method, route, count, " ".join(statement.split())[:300])
+
+        if self.directory and time.monotonic() - self._flushed_at >= self.flush_seconds:
+            self._write(self._snapshot())
+        return response
+
+    def _record_query(self, statement, elapsed):
+        self.inc('sql_queries_total')
+        self.inc('sql_query_seconds_total', elapsed)
+        state = g.get('_metrics') if has_app_context() else None
+        if state is not None:
+            state['queries'] += 1
+            state['sql_seconds'] += elapsed
+            state['statements'][statement] += 1
+
+    def _check_pid(self):
+        # A forked worker starts from zero rather than re-reporting its parent's counts
+        if self._pid != os.getpid():
+            self._counters = Counter()
+            self._histograms = {}
+            self._pid = os.getpid()
+            self._token = uuid.uuid4().hex[:8]
+            self._flushed_at = 0.0
+
+    def _snapshot(self):
+        gauges = {}
+        if has_app_context():
+            for name, extension in sorted(current_app.extensions.items()):
+                stats = getattr(extension, 'stats', None)
+                if not callable(stats):
+                    continue
+                try:
+                    values = stats()
+                except Exception:
+                    logger.warning("Collecting %s stats failed", name, exc_info=True)
+                    continue
+                for key, value in values.items():
+                    if isinstance(value, (int, float)):
+                        gauges[f"app_{name}_{key}"] = float(value)
+        with self._lock:
+            self._check_pid()
+            return {
+                'pid': os.getpid(),
+                'token': self._token,
+                'written_at': time.time(),
+                'counters': [[name, labels, value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, labels, list(series)] for (name, labels), series in self._histograms.items()],
+                'gauges': list(gauges.items())
+            }
+
+    def _write(self, snapshot):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"metrics-{snapshot['pid']}-{snapshot['token']}.json")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+        self._flushed_at = time.monotonic()
+
+    def _read_all(self):
+        """Live workers' snapshots plus the retired totals, after folding in any newly exited workers"""
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+            # One scrape at a time folds, or two would both add the same exited worker
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                return self._fold_exited()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _fold_exited(self):
+        retired_path = os.path.join(self.directory, RETIRED_FILE)
+        retired, live, exited = None, {}, []
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                logger.warning("Skipping unreadable metrics file %s", path)
+                continue
+            if path == retired_path:
+                retired = snapshot
+                continue
+            pid = snapshot['pid']
+            if pid != os.getpid() and not _alive(pid):
+                exited.append((path, snapshot))
+                continue
+            # Of two snapshots with one pid, the older is from a worker whose pid was reused
+            newest = live.get(pid)
+            if newest is None or snapshot.get('written_at', 0) > newest[1].get('written_at', 0):
+                if newest is not None:
+                    exited.append(newest)
+                live[pid] = (path, snapshot)
+            else:
+                exited.append((path, snapshot))
+
+        if exited:
+            counters, histograms = _merge(([retired] if retired else []) + [snapshot for _, snapshot in exited])
+            retired = {
+                'pid': None,
+                'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+                'histograms': [[name, labels, series] for (name, labels), series in histograms.items()],
+                'gauges': []
+            }
+            tmp_path = f"{retired_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(retired, f)
+            os.replace(tmp_path, retired_path)
+            for path, _ in exited:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+        return [snapshot for _, snapshot in live.values()] + ([retired] if retired else [])
+
+
+metrics = Metrics()
+
+
+def _merge(snapshots):
+    """Sum the counters and histograms of several snapshots"""
+    counters, histograms = Counter(), {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            counters[(name, tuple(map(tuple, labels)))] += value
+        for name, labels, series in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [0] * len(series))
+            for i, value in enumerate(series):
+                merged[i] += value
+    return counters, histograms
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    if metrics.enabled:
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_started')
+    if started:
+        metrics._record_query(statement, time.perf_counter() - started.pop())
+
+@event.listens_for(Engine, 'handle_error')
+def _query_failed(exception_context):
+    started = exception_context.connection.info.get('metrics_started') if exception_context.connection else None
+    if started and exception_context.cursor is not None:
+        started.pop()
@@ -0,0 +1,92 @@
+# app/services/password_service.py
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import bcrypt
+from flask import current_app
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing pool has no room for more work"""
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded worker pool so login bursts cannot starve other requests.
+
+    At most ``BCRYPT_POOL_SIZE`` hashes run at once and ``BCRYPT_MAX_PENDING``
+    more may wait for a worker. Callers that cannot get a slot within
+    ``BCRYPT_ADMISSION_TIMEOUT`` seconds get ``PasswordHasherBusy``, which the
+    app turns into a 503.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self._pid = None
+
+    @property
+    def rounds(self):
+        return current_app.config.get('BCRYPT_LOG_ROUNDS', 12)
+
+    def hash(self, password):
+        """Hash a plaintext password with the configured work factor"""
+        return self._run(_hash, password.encode('utf-8'), self.rounds).decode('utf-8')
+
+    def verify(self, password, hashed):
+        """Check a plaintext password against a stored hash"""
+        return self._run(_check, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def hash_many(self, passwords):
+        """Hash a batch of passwords in parallel for offline jobs such as imports"""
+        self._ensure_pool()
+        rounds = self.rounds
+        encoded = [password.encode('utf-8') for password in passwords]
+        return [hashed.decode('utf-8') for hashed in self._executor.map(_hash, encoded, [rounds] * len(encoded))]
+
+    def needs_rehash(self, hashed):
+        """True when the stored hash was made with a different work factor"""
+        try:
+            return int(hashed.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def _run(self, fn, *args):
+        self._ensure_pool()
+        if not self._slots.acquire(timeout=current_app.config.get('BCRYPT_ADMISSION_TIMEOUT', 0.05)):
+            raise PasswordHasherBusy("Password hashing pool is full")
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def _ensure_pool(self):
+        if self._executor is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                return
+            config = current_app.config
+            size = config.get('BCRYPT_POOL_SIZE') or os.cpu_count() or 2
+            if config.get('BCRYPT_POOL_TYPE') == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=size)
+            else:
+                # bcrypt releases the GIL while hashing, so threads run in parallel
+                self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='bcrypt')
+            self._slots = threading.BoundedSemaphore(size + config.get('BCRYPT_MAX_PENDING', 32))
+            self._pid = os.getpid()
+
+
+password_hasher = PasswordHasher()
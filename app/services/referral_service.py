@@ -1,51 +1,212 @@
 # app/services/referral_service.py
-from app.models import db, User, Referral, Reward
+from sqlalchemy import and_, case, func, or_, select
 
-def create_referral(referrer_id, referred_user_id):
-    """Create a new referral record"""
+from app.models import db, User, Referral, Reward, RewardOutbox, ReferralCounter
+from app.services.cache import cache
+from app.services.leaderboard_service import leaderboard
+from app.services.rollup_service import record_referral
+from app.utils.pagination import encode_cursor
+from app.utils.referral_codes import decode_referral_code
+from app.utils.replicas import replica_read, replicas
+from app.utils.serializers import serialize_referral
+
+REFERRAL_REWARD_TYPE = 'credit'
+REFERRAL_REWARD_AMOUNT = 10.0  # Example: $10 credit per referral
+
+def get_user_by_referral_code(code):
+    """Find a user by referral code: generated codes decode to a primary-key fetch"""
+    user_id = decode_referral_code(code)
+    if user_id is not None:
+        return db.session.get(User, user_id)
+    
+    # Codes issued before the id-derived allocator, or carried over by an import
+    return User.query.filter_by(legacy_referral_code=code).first()
+
+def resolve_referral_codes(codes):
+    """Map each known code to its user id with at most two queries"""
+    decoded, legacy = {}, []
+    for code in codes:
+        user_id = decode_referral_code(code)
+        if user_id is not None:
+            decoded[code] = user_id
+        else:
+            legacy.append(code)
+    
+    resolved = {}
+    if decoded:
+        existing = {user_id for (user_id,) in db.session.query(User.id).filter(User.id.in_(decoded.values()))}
+        resolved.update({code: user_id for code, user_id in decoded.items() if user_id in existing})
+    if legacy:
+        resolved.update(db.session.query(User.legacy_referral_code, User.id).filter(
+            User.legacy_referral_code.in_(legacy)
+        ))
+    return resolved
+
+def create_referral(referrer, referred_user, commit=True):
+    """Create a new referral record; pass commit=False to join the caller's transaction.
+    
+    Its rewards are only queued here, in the same transaction, and applied
+    by the reward worker. A caller that commits itself should call
+    ``rewards.notify()`` afterwards.
+    """
+    bump_referral_counters(referrer.id, total_referrals=1, successful_referrals=1)
+    
     referral = Referral(
-        referrer_id=referrer_id,
-        referred_user_id=referred_user_id,
-        status='successful'
+        referrer=referrer,
+        referred_user=referred_user,
+        status='successful',
+        ordinal=referral_totals([referrer.id]).get(referrer.id, 1)
     )
     
     db.session.add(referral)
-    db.session.commit()
+    db.session.add(RewardOutbox(referral=referral))
     
-    # Optionally process rewards
-    process_referral_reward(referral.id)
+    record_referral(referrer.id)
+    leaderboard.record_referral(referrer)
+    cache.invalidate_user(referrer.id)
+    
+    if commit:
+        db.session.commit()
+        from app.services.reward_service import rewards  # reward_service imports this module
+        rewards.notify()
     
     return referral
 
-def get_user_referrals(user_id):
-    """Get all users referred by a specific user"""
-    return Referral.query.filter_by(referrer_id=user_id).all()
+@replica_read
+def get_user_referrals(user_id, limit=None, cursor=None):
+    """Get a page of a user's referrals, newest first, with the referred user joined in.
+    
+    ``cursor`` is the ``(date_referred, id)`` of the last row already seen;
+    the next page starts strictly after it.
+    """
+    query = db.session.query(
+        Referral.id,
+        Referral.date_referred,
+        Referral.status,
+        User.id.label('referred_user_id'),
+        User.username.label('referred_username')
+    ).join(User, User.id == Referral.referred_user_id
+    ).filter(Referral.referrer_id == user_id)
+    
+    if cursor:
+        date_referred, referral_id = cursor
+        query = query.filter(or_(
+            Referral.date_referred < date_referred,
+            and_(Referral.date_referred == date_referred, Referral.id < referral_id)
+        ))
+    
+    query = query.order_by(Referral.date_referred.desc(), Referral.id.desc())
+    if limit:
+        query = query.limit(limit)
+    
+    return query.all()
 
+@replica_read
+def get_referrals_page(user_id, limit, cursor=None, cursor_token=None):
+    """Get one serialized page of a user's referrals, read through the cache"""
+    def load():
+        # Fetch one extra row to learn whether another page exists
+        referrals = get_user_referrals(user_id, limit=limit + 1, cursor=cursor)
+        has_more = len(referrals) > limit
+        referrals = referrals[:limit]
+        
+        referral_data = [serialize_referral(referral) for referral in referrals]
+        
+        next_cursor = None
+        if has_more:
+            last = referrals[-1]
+            next_cursor = encode_cursor(last.date_referred, last.id)
+        
+        return {'referrals': referral_data, 'next_cursor': next_cursor}
+    
+    return cache.cached('referrals', user_id, load, limit, cursor_token or '')
+
+@replica_read
+def get_referral_version(user_id):
+    """A marker that changes with every referral and reward of the user, for ETags.
+    
+    Every such write invalidates the user's cache generation, so with a
+    cache that token is the marker and costs no query. Without one, or
+    when this request reads from a replica, the user's counters row is
+    read by primary key: from the same replica the body then comes from,
+    so a lagging replica's body never carries the primary's marker.
+    """
+    if cache.enabled and not replicas.routing():
+        try:
+            return cache.generation(user_id)
+        except Exception:
+            pass  # Fall back to the counters when the cache is unreachable
+    
+    row = db.session.query(
+        ReferralCounter.total_referrals, ReferralCounter.successful_referrals,
+        ReferralCounter.rewards_earned, ReferralCounter.reward_amount
+    ).filter(ReferralCounter.user_id == int(user_id)).first()
+    return tuple(row) if row else None
+
+@replica_read
 def get_referral_stats(user_id):
-    """Get referral statistics for a user"""
-    referrals = Referral.query.filter_by(referrer_id=user_id).all()
-    
-    stats = {
-        'total_referrals': len(referrals),
-        'successful_referrals': len([r for r in referrals if r.status == 'successful']),
-        'rewards_earned': Reward.query.filter_by(user_id=user_id).count()
-    }
-    
-    return stats
-
-def process_referral_reward(referral_id):
-    """Process rewards for a successful referral"""
-    referral = Referral.query.get(referral_id)
-    
-    # Create a reward record
-    reward = Reward(
-        user_id=referral.referrer_id,
-        referral_id=referral.id,
-        reward_type='credit',
-        amount=10.0  # Example: $10 credit per referral
+    """Get referral statistics for a user from their counters row, read through the cache"""
+    def load():
+        counter = db.session.get(ReferralCounter, int(user_id))
+        
+        return {
+            'total_referrals': counter.total_referrals if counter else 0,
+            'successful_referrals': counter.successful_referrals if counter else 0,
+            'rewards_earned': counter.rewards_earned if counter else 0,
+            'reward_amount': counter.reward_amount if counter else 0.0
+        }
+    
+    return cache.cached('stats', user_id, load)
+
+def bump_referral_counters(user_id, **deltas):
+    """Add deltas to a user's counters in the current transaction"""
+    updated = ReferralCounter.query.filter_by(user_id=user_id).update(
+        {getattr(ReferralCounter, name): getattr(ReferralCounter, name) + delta for name, delta in deltas.items()},
+        synchronize_session=False
     )
     
-    db.session.add(reward)
+    # Users created before the counters table existed get their row on first use
+    if not updated:
+        db.session.add(ReferralCounter(user_id=user_id, **deltas))
+
+def referral_totals(user_ids):
+    """Users' total_referrals, read after bumping them: the bump holds their rows, so new referrals take the next numbers.
+
+    Counter rows the bump only just added are not flushed here and are left
+    out; their total is the bump itself.
+    """
+    with db.session.no_autoflush:
+        return dict(db.session.query(ReferralCounter.user_id, ReferralCounter.total_referrals).filter(
+            ReferralCounter.user_id.in_(user_ids)
+        ))
+
+def reconcile_referral_counters():
+    """Rebuild every user's counters from the raw referral and reward rows"""
+    referral_totals = select(
+        Referral.referrer_id.label('user_id'),
+        func.count().label('total'),
+        func.sum(case((Referral.status == 'successful', 1), else_=0)).label('successful')
+    ).group_by(Referral.referrer_id).subquery()
+    
+    reward_totals = select(
+        Reward.user_id.label('user_id'),
+        func.count().label('total'),
+        func.sum(Reward.amount).label('amount')
+    ).group_by(Reward.user_id).subquery()
+    
+    rows = select(
+        User.id,
+        func.coalesce(referral_totals.c.total, 0),
+        func.coalesce(referral_totals.c.successful, 0),
+        func.coalesce(reward_totals.c.total, 0),
+        func.coalesce(reward_totals.c.amount, 0.0)
+    ).outerjoin(referral_totals, referral_totals.c.user_id == User.id
+    ).outerjoin(reward_totals, reward_totals.c.user_id == User.id)
+    
+    ReferralCounter.query.delete()
+    db.session.execute(ReferralCounter.__table__.insert().from_select(
+        ['user_id', 'total_referrals', 'successful_referrals', 'rewards_earned', 'reward_amount'], rows
+    ))
     db.session.commit()
     
-    return reward
\ No newline at end of file
+    return ReferralCounter.query.count()
@@ -0,0 +1,118 @@
+# app/services/referral_tree_service.py
+from sqlalchemy import and_, func, literal, or_, select, true, union_all
+from sqlalchemy.orm import aliased
+
+from app.models import db, User, ReferralClosure
+from app.utils.replicas import replica_read
+
+def add_to_referral_tree(user_id, referrer_id):
+    """Link a new user under their referrer and every ancestor of the referrer"""
+    direct = select(
+        literal(referrer_id),
+        literal(user_id),
+        literal(1)
+    )
+    inherited = select(
+        ReferralClosure.ancestor_id,
+        literal(user_id),
+        ReferralClosure.depth + 1
+    ).where(ReferralClosure.descendant_id == referrer_id)
+
+    db.session.execute(ReferralClosure.__table__.insert().from_select(
+        ['ancestor_id', 'descendant_id', 'depth'], union_all(direct, inherited)
+    ))
+
+def attach_to_referral_tree(user_id, referrer_id):
+    """Link a user and the downline they may already have under a referrer and every ancestor of the referrer.
+
+    Imports link users whose own referrals were linked earlier; a signup
+    has no downline yet and uses ``add_to_referral_tree``.
+    """
+    uppers = union_all(
+        select(literal(referrer_id).label('ancestor_id'), literal(0).label('depth')),
+        select(ReferralClosure.ancestor_id, ReferralClosure.depth).where(ReferralClosure.descendant_id == referrer_id)
+    ).subquery()
+    lowers = union_all(
+        select(literal(user_id).label('descendant_id'), literal(0).label('depth')),
+        select(ReferralClosure.descendant_id, ReferralClosure.depth).where(ReferralClosure.ancestor_id == user_id)
+    ).subquery()
+
+    db.session.execute(ReferralClosure.__table__.insert().from_select(
+        ['ancestor_id', 'descendant_id', 'depth'],
+        select(uppers.c.ancestor_id, lowers.c.descendant_id, uppers.c.depth + lowers.c.depth + 1
+               ).select_from(uppers.join(lowers, true()))
+    ))
+
+@replica_read
+def get_downline_summary(user_id):
+    """Count a user's downline per depth with one indexed GROUP BY"""
+    rows = db.session.query(
+        ReferralClosure.depth, func.count()
+    ).filter(ReferralClosure.ancestor_id == user_id
+    ).group_by(ReferralClosure.depth
+    ).order_by(ReferralClosure.depth).all()
+
+    by_depth = [{'depth': depth, 'count': count} for depth, count in rows]
+    total = sum(count for _, count in rows)
+    direct = rows[0][1] if rows and rows[0][0] == 1 else 0
+
+    return {
+        'total': total,
+        'direct': direct,
+        'indirect': total - direct,
+        'by_depth': by_depth
+    }
+
+@replica_read
+def get_downline_members(user_id, depth=None, limit=None, cursor=None):
+    """Get a page of a user's downline ordered by (depth, user id).
+
+    ``cursor`` is the ``(depth, user id)`` of the last member already seen.
+    """
+    query = db.session.query(
+        ReferralClosure.depth,
+        User.id,
+        User.username,
+        User.referred_by_id
+    ).join(User, User.id == ReferralClosure.descendant_id
+    ).filter(ReferralClosure.ancestor_id == user_id)
+
+    if depth is not None:
+        query = query.filter(ReferralClosure.depth == depth)
+
+    if cursor:
+        last_depth, last_id = cursor
+        query = query.filter(or_(
+            ReferralClosure.depth > last_depth,
+            and_(ReferralClosure.depth == last_depth, ReferralClosure.descendant_id > last_id)
+        ))
+
+    query = query.order_by(ReferralClosure.depth, ReferralClosure.descendant_id)
+    if limit:
+        query = query.limit(limit)
+
+    return query.all()
+
+def rebuild_referral_tree():
+    """Rebuild the closure table from users.referred_by_id with a recursive CTE"""
+    tree = select(
+        User.referred_by_id.label('ancestor_id'),
+        User.id.label('descendant_id'),
+        literal(1).label('depth')
+    ).where(User.referred_by_id.isnot(None)).cte('tree', recursive=True)
+
+    child = aliased(User)
+    tree = tree.union_all(select(
+        tree.c.ancestor_id,
+        child.id,
+        tree.c.depth + 1
+    ).join(child, child.referred_by_id == tree.c.descendant_id))
+
+    ReferralClosure.query.delete()
+    db.session.execute(ReferralClosure.__table__.insert().from_select(
+        ['ancestor_id', 'descendant_id', 'depth'],
+        select(tree.c.ancestor_id, tree.c.descendant_id, tree.c.depth)
+    ))
+    db.session.commit()
+
+    return ReferralClosure.query.count()
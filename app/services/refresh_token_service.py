@@ -0,0 +1,104 @@
+# app/services/refresh_token_service.py
+from datetime import datetime
+from flask import current_app
+
+from app.models import db, User, RefreshToken
+from app.utils.db import delete_in_batches
+from app.utils.tokens import new_token, hash_token
+
+class InvalidRefreshToken(ValueError):
+    """Raised for unknown, expired, rotated-away or revoked refresh tokens"""
+
+def issue_refresh_token(user_id, device_name=None, commit=True):
+    """Start a device session and return its refresh token"""
+    # Keep at most REFRESH_TOKENS_PER_USER devices, dropping the least recently used
+    limit = current_app.config.get('REFRESH_TOKENS_PER_USER', 10)
+    sessions = RefreshToken.query.with_entities(RefreshToken.id).filter_by(user_id=user_id
+    ).order_by(RefreshToken.last_used_at.desc(), RefreshToken.id.desc()).offset(limit - 1).all()
+    if sessions:
+        RefreshToken.query.filter(RefreshToken.id.in_([row.id for row in sessions])).delete(synchronize_session=False)
+    
+    token = new_token()
+    now = datetime.utcnow()
+    db.session.add(RefreshToken(
+        user_id=user_id,
+        token_hash=hash_token(token),
+        device_name=device_name[:100] if device_name else None,
+        created_at=now,
+        last_used_at=now,
+        expires_at=now + current_app.config['REFRESH_TOKEN_EXPIRES']
+    ))
+    
+    if commit:
+        db.session.commit()
+    
+    return token
+
+def rotate_refresh_token(token):
+    """Exchange a refresh token for a new one; returns (user, new token)"""
+    token_hash = hash_token(token or '')
+    now = datetime.utcnow()
+    
+    session = RefreshToken.query.filter_by(token_hash=token_hash).first()
+    if not session:
+        # An already rotated token being replayed means it leaked: end that device session
+        if RefreshToken.query.filter_by(previous_hash=token_hash).delete():
+            db.session.commit()
+        raise InvalidRefreshToken("Invalid refresh token")
+    
+    if session.expires_at < now:
+        db.session.delete(session)
+        db.session.commit()
+        raise InvalidRefreshToken("Refresh token has expired")
+    
+    replacement = new_token()
+    # Conditional on the old hash, so two concurrent refreshes cannot both win
+    rotated = RefreshToken.query.filter_by(id=session.id, token_hash=token_hash).update({
+        'token_hash': hash_token(replacement),
+        'previous_hash': token_hash,
+        'last_used_at': now,
+        'expires_at': now + current_app.config['REFRESH_TOKEN_EXPIRES']
+    }, synchronize_session=False)
+    if not rotated:
+        db.session.rollback()
+        raise InvalidRefreshToken("Invalid refresh token")
+    
+    db.session.commit()
+    return db.session.get(User, session.user_id), replacement
+
+def revoke_refresh_token(token):
+    """Sign out the device holding this refresh token"""
+    revoked = RefreshToken.query.filter_by(token_hash=hash_token(token or '')).delete()
+    db.session.commit()
+    return revoked > 0
+
+def revoke_session(user_id, session_id):
+    """Sign out one of a user's devices"""
+    revoked = RefreshToken.query.filter_by(id=session_id, user_id=int(user_id)).delete()
+    db.session.commit()
+    return revoked > 0
+
+def revoke_all_sessions(user_id, commit=True):
+    """Sign out every device of a user"""
+    RefreshToken.query.filter_by(user_id=int(user_id)).delete()
+    if commit:
+        db.session.commit()
+
+def get_sessions(user_id):
+    """Get a user's active device sessions"""
+    sessions = RefreshToken.query.filter(
+        RefreshToken.user_id == int(user_id),
+        RefreshToken.expires_at >= datetime.utcnow()
+    ).order_by(RefreshToken.last_used_at.desc()).all()
+    
+    return [{
+        'id': session.id,
+        'device_name': session.device_name,
+        'created_at': session.created_at.isoformat(),
+        'last_used_at': session.last_used_at.isoformat(),
+        'expires_at': session.expires_at.isoformat()
+    } for session in sessions]
+
+def purge_expired_refresh_tokens(batch_size=1000):
+    """Delete expired refresh tokens in short batches; returns the number removed"""
+    return delete_in_batches(RefreshToken, RefreshToken.expires_at < datetime.utcnow(), batch_size)
@@ -0,0 +1,302 @@
+# app/services/reward_service.py
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+
+from app.models import db, Referral, Reward, RewardOutbox, ReferralClosure, ReferralCounter
+from app.services.cache import cache
+from app.services.referral_service import bump_referral_counters, REFERRAL_REWARD_TYPE, REFERRAL_REWARD_AMOUNT
+from app.utils.replicas import replica_read
+
+logger = logging.getLogger(__name__)
+
+# name -> rule(referrals, config) returning grants; REWARD_RULES picks which run
+RULES = {}
+
+def reward_rule(name):
+    """Register a reward rule under a name REWARD_RULES can list.
+
+    A rule takes the batch's referrals (rows with ``referral_id``,
+    ``referrer_id`` and ``referred_user_id``) and the app config, and
+    returns the grants it awards as ``grant(...)`` dicts.
+    """
+    def register(fn):
+        RULES[name] = fn
+        return fn
+    return register
+
+def grant(referral_id, rule, user_id, amount, reward_type=REFERRAL_REWARD_TYPE):
+    """One reward row; the key makes applying the same grant twice a no-op"""
+    return {
+        'idempotency_key': f"{referral_id}:{rule}:{user_id}",
+        'user_id': user_id,
+        'referral_id': referral_id,
+        'reward_type': reward_type,
+        'amount': amount
+    }
+
+def parse_amounts(value):
+    """Floats from a comma-separated setting such as "2,1" or "0:10,10:15" (pairs become tuples)"""
+    amounts = []
+    for part in (value or '').split(','):
+        part = part.strip()
+        if part:
+            amounts.append(tuple(float(x) for x in part.split(':')) if ':' in part else float(part))
+    return amounts
+
+@reward_rule('flat')
+def flat_reward(referrals, config):
+    """REFERRAL_REWARD_AMOUNT to the direct referrer"""
+    amount = config.get('REFERRAL_REWARD_AMOUNT', REFERRAL_REWARD_AMOUNT)
+    return [grant(r.referral_id, 'flat', r.referrer_id, amount) for r in referrals]
+
+@reward_rule('tiered')
+def tiered_reward(referrals, config):
+    """The direct referrer's amount from REWARD_TIERS by their referral count, this one included.
+
+    ``REWARD_TIERS = "1:10,10:12.5,100:15"`` pays 10 for the 1st to 9th
+    referral, 12.5 from the 10th and 15 from the 100th. The count is the
+    ordinal stamped on the referral when it was created; only referrals
+    from before that column are counted row by row.
+    """
+    tiers = sorted(parse_amounts(config.get('REWARD_TIERS')))
+    ordinals = dict(db.session.query(Referral.id, Referral.ordinal).filter(
+        Referral.id.in_([r.referral_id for r in referrals])))
+
+    unstamped = [referral_id for referral_id, ordinal in ordinals.items() if ordinal is None]
+    if unstamped:
+        earlier = aliased(Referral)
+        ordinals.update(db.session.query(Referral.id, func.count(earlier.id)).join(
+            earlier, (earlier.referrer_id == Referral.referrer_id) & (earlier.id <= Referral.id)
+        ).filter(Referral.id.in_(unstamped)).group_by(Referral.id))
+
+    grants = []
+    for r in referrals:
+        amounts = [amount for threshold, amount in tiers if ordinals.get(r.referral_id, 0) >= threshold]
+        if amounts:
+            grants.append(grant(r.referral_id, 'tiered', r.referrer_id, amounts[-1]))
+    return grants
+
+@reward_rule('upline')
+def upline_reward(referrals, config):
+    """REWARD_UPLINE_AMOUNTS to the referrer's own upline: the first to their referrer, and so on"""
+    amounts = parse_amounts(config.get('REWARD_UPLINE_AMOUNTS'))
+    if not amounts:
+        return []
+    by_user = {r.referred_user_id: r.referral_id for r in referrals}
+
+    # Depth 1 is the direct referrer; the upline starts at depth 2
+    ancestors = db.session.query(
+        ReferralClosure.descendant_id, ReferralClosure.ancestor_id, ReferralClosure.depth
+    ).filter(
+        ReferralClosure.descendant_id.in_(list(by_user)), ReferralClosure.depth.between(2, len(amounts) + 1)
+    )
+    return [grant(by_user[user_id], 'upline', ancestor_id, amounts[depth - 2])
+            for user_id, ancestor_id, depth in ancestors]
+
+@replica_read
+def get_reward_balance(user_id):
+    """A user's reward balance, read from their counters row alone"""
+    row = db.session.query(ReferralCounter.rewards_earned, ReferralCounter.reward_amount).filter(
+        ReferralCounter.user_id == int(user_id)
+    ).first()
+
+    return {
+        'rewards_earned': row.rewards_earned if row else 0,
+        'balance': row.reward_amount if row else 0.0
+    }
+
+
+class RewardEngine:
+    """Applies queued referral rewards in batches, off the request path.
+
+    ``create_referral`` writes a ``reward_outbox`` row in the signup
+    transaction. A worker thread per process takes up to
+    ``REWARD_BATCH_SIZE`` due rows, runs the ``REWARD_RULES`` over them,
+    inserts the rewards, adds them to each user's balance (their counters
+    row) and deletes the rows, all in one transaction. It wakes when this
+    process queues a referral and otherwise polls every
+    ``REWARD_POLL_INTERVAL`` seconds for rows queued by other processes.
+    Every grant carries an idempotency key, so two workers that take the
+    same rows never pay twice. A failing batch is retried row by row, and
+    failing rows back off exponentially. With
+    ``REWARD_PROCESSING_MODE = "sync"`` rewards are applied in the calling
+    thread right after the referral commits, which is what the test suite
+    uses.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.Lock()
+        self._reset()
+
+    def init_app(self, app):
+        unknown = [name for name in self._rule_names(app.config) if name not in RULES]
+        if unknown:
+            raise ValueError(f"Unknown REWARD_RULES {', '.join(unknown)}")
+        self.stop()
+        self.app = app
+        self._reset()
+        app.before_request(self._ensure_started)
+        app.extensions['rewards'] = self
+
+    def _reset(self):
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._pid = None
+        self.batches = 0
+        self.applied = 0
+        self.granted = 0
+        self.duplicates = 0
+        self.failed = 0
+
+    def notify(self):
+        """Called once a referral has committed: apply its rewards now or wake the worker"""
+        if self.app.config.get('REWARD_PROCESSING_MODE') == 'sync':
+            self.run_until_empty()
+            return
+        self._ensure_started()
+        self._wake.set()
+
+    def run_once(self):
+        """Apply one batch of due outbox rows; returns how many rows were applied"""
+        batch_size = self.app.config.get('REWARD_BATCH_SIZE', 100)
+        rows = db.session.query(
+            RewardOutbox.id, RewardOutbox.referral_id, RewardOutbox.attempts,
+            Referral.referrer_id, Referral.referred_user_id
+        ).join(Referral, Referral.id == RewardOutbox.referral_id
+        ).filter(RewardOutbox.available_at <= datetime.utcnow()
+        ).order_by(RewardOutbox.available_at, RewardOutbox.id).limit(batch_size).all()
+        if not rows:
+            db.session.rollback()
+            return 0
+
+        try:
+            self._apply(rows)
+            return len(rows)
+        except Exception:
+            db.session.rollback()
+            if len(rows) == 1:
+                self._defer(rows[0])
+                return 0
+
+        # Find the rows that fail on their own and let the rest through
+        applied = 0
+        for row in rows:
+            try:
+                self._apply([row])
+                applied += 1
+            except Exception:
+                db.session.rollback()
+                self._defer(row)
+        return applied
+
+    def run_until_empty(self):
+        """Apply batches until no due rows are left; returns how many rows were applied"""
+        total = 0
+        while True:
+            applied = self.run_once()
+            if not applied:
+                return total
+            total += applied
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'applied': self.applied,
+                'granted': self.granted,
+                'duplicates': self.duplicates,
+                'failed': self.failed
+            }
+
+    def _rule_names(self, config):
+        return [name.strip() for name in (config.get('REWARD_RULES') or '').split(',') if name.strip()]
+
+    def _apply(self, rows):
+        grants = []
+        for name in self._rule_names(self.app.config):
+            grants += RULES[name](rows, self.app.config)
+
+        # A grant another worker already applied is skipped; racing inserts hit the unique key
+        keys = [g['idempotency_key'] for g in grants]
+        existing = {key for (key,) in db.session.query(Reward.idempotency_key).filter(
+            Reward.idempotency_key.in_(keys))} if keys else set()
+        new = [g for g in grants if g['idempotency_key'] not in existing]
+
+        if new:
+            now = datetime.utcnow()
+            db.session.execute(Reward.__table__.insert(), [dict(g, created_at=now) for g in new])
+            balances = defaultdict(lambda: [0, 0.0])
+            for g in new:
+                balances[g['user_id']][0] += 1
+                balances[g['user_id']][1] += g['amount'] or 0.0
+            for user_id, (count, amount) in balances.items():
+                bump_referral_counters(user_id, rewards_earned=count, reward_amount=amount)
+                cache.invalidate_user(user_id)
+
+        RewardOutbox.query.filter(RewardOutbox.id.in_([row.id for row in rows])).delete(synchronize_session=False)
+        db.session.commit()
+
+        with self._lock:
+            self.batches += 1
+            self.applied += len(rows)
+            self.granted += len(new)
+            self.duplicates += len(grants) - len(new)
+
+    def _defer(self, row):
+        attempts = row.attempts + 1
+        delay = self.app.config.get('REWARD_RETRY_BACKOFF', 2.0) * 2 ** (attempts - 1)
+        logger.exception("Applying rewards for referral %s failed (attempt %d)", row.referral_id, attempts)
+        try:
+            RewardOutbox.query.filter_by(id=row.id).update({
+                'attempts': attempts,
+                'available_at': datetime.utcnow() + timedelta(seconds=delay)
+            }, synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.exception("Deferring referral %s failed", row.referral_id)
+        with self._lock:
+            self.failed += 1
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() or self.app.config.get('REWARD_PROCESSING_MODE') == 'sync':
+            return
+        interval = self.app.config.get('REWARD_POLL_INTERVAL', 5)
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            self._wake = threading.Event()
+            self._thread = threading.Thread(target=self._work, args=(self.app, interval, self._stop, self._wake),
+                                            name='reward-worker', daemon=True)
+            self._thread.start()
+
+    def _work(self, app, interval, stop, wake):
+        while not stop.is_set():
+            wake.wait(interval)
+            wake.clear()
+            if stop.is_set():
+                return
+            with app.app_context():
+                try:
+                    self.run_until_empty()
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Reward worker batch failed")
+                db.session.remove()
+
+
+rewards = RewardEngine()
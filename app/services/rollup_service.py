@@ -0,0 +1,194 @@
+# app/services/rollup_service.py
+import random
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, tuple_
+
+from app.models import db, Referral, ReferralRollup
+from app.services.leaderboard_service import ALL_TIME, leaderboard, window_days
+from app.utils.db import upsert
+from app.utils.replicas import replica_read
+
+GRANULARITIES = ('day', 'week', 'month')
+
+# Buckets returned when a timeseries request leaves out "from"
+DEFAULT_BUCKETS = {'day': 30, 'week': 12, 'month': 12}
+
+INSERT_CHUNK = 1000
+
+def bucket_start(day, granularity):
+    """The first day of the bucket holding day: the day itself, its Monday or the 1st of its month"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+def add_buckets(start, granularity, n):
+    """The start of the bucket n buckets after (or, for negative n, before) start"""
+    if granularity == 'month':
+        year, month = divmod(start.year * 12 + start.month - 1 + n, 12)
+        return date(year, month + 1, 1)
+    return start + timedelta(days=n * (7 if granularity == 'week' else 1))
+
+def count_buckets(first, last, granularity):
+    """Buckets from first to last, both bucket starts, inclusive"""
+    if granularity == 'month':
+        return (last.year - first.year) * 12 + last.month - first.month + 1
+    return (last - first).days // (7 if granularity == 'week' else 1) + 1
+
+def daily_retention_days():
+    """Days kept as daily buckets; never fewer than the longest rolling leaderboard reads"""
+    windows = [window_days(window) for window in leaderboard.windows() if window != ALL_TIME]
+    return max([current_app.config.get('ROLLUP_DAILY_RETENTION_DAYS', 90)] + windows)
+
+def daily_horizon():
+    """The oldest day still held as a daily bucket once compaction has run"""
+    return datetime.utcnow().date() - timedelta(days=daily_retention_days() - 1)
+
+def record_referral(referrer_id, count=1):
+    """Count new referrals in today's buckets for their referrer and the platform, in the caller's transaction.
+
+    The platform's bucket is one of ``ROLLUP_PLATFORM_SHARDS`` rows picked
+    at random, so concurrent signups rarely wait on each other's row lock.
+    """
+    today = datetime.utcnow().date()
+    shard = random.randrange(current_app.config.get('ROLLUP_PLATFORM_SHARDS', 16))
+    for owner in (referrer_id, ReferralRollup.PLATFORM - shard):
+        upsert(
+            ReferralRollup,
+            {'referrer_id': owner, 'granularity': 'day', 'bucket_start': today, 'count': count},
+            ['referrer_id', 'granularity', 'bucket_start'],
+            {'count': ReferralRollup.count + count}
+        )
+
+def parse_timeseries_range(granularity, start=None, end=None):
+    """Validate timeseries arguments; returns the first and last bucket starts.
+
+    ``start`` and ``end`` are ISO dates, each rounded down to the start of
+    its bucket. ``end`` defaults to today and ``start`` to
+    ``DEFAULT_BUCKETS`` buckets before it. Raises ValueError with a
+    message for the client.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    try:
+        end = date.fromisoformat(end) if end else datetime.utcnow().date()
+        start = date.fromisoformat(start) if start else None
+    except ValueError:
+        raise ValueError("from and to must be dates in YYYY-MM-DD form")
+
+    last = bucket_start(end, granularity)
+    first = bucket_start(start, granularity) if start else add_buckets(last, granularity, 1 - DEFAULT_BUCKETS[granularity])
+    if first > last:
+        raise ValueError("from must not be after to")
+
+    max_buckets = current_app.config.get('ROLLUP_MAX_BUCKETS', 366)
+    if count_buckets(first, last, granularity) > max_buckets:
+        raise ValueError(f"at most {max_buckets} buckets per request")
+    if granularity == 'day' and first < daily_horizon():
+        raise ValueError(f"daily buckets cover the last {daily_retention_days()} days; use week or month")
+    return first, last
+
+@replica_read
+def get_referral_timeseries(referrer_id, granularity, first, last):
+    """Referrals per bucket from first to last, zeros included, read from the rollups alone.
+
+    Pass ``ReferralRollup.PLATFORM`` for the whole platform, which sums its
+    shards along with the buckets. Week and month
+    series add the daily buckets compaction has not folded yet, so the
+    cost follows the number of buckets, never the number of referrals.
+    """
+    counts = {add_buckets(first, granularity, n): 0 for n in range(count_buckets(first, last, granularity))}
+    referrer_id = int(referrer_id)
+    if referrer_id == ReferralRollup.PLATFORM:
+        owner = ReferralRollup.referrer_id <= ReferralRollup.PLATFORM
+    else:
+        owner = ReferralRollup.referrer_id == referrer_id
+    rows = db.session.query(ReferralRollup.bucket_start, ReferralRollup.count).filter(
+        owner,
+        ReferralRollup.granularity.in_({'day', granularity}),
+        ReferralRollup.bucket_start >= first,
+        ReferralRollup.bucket_start < add_buckets(last, granularity, 1)
+    )
+    for start, count in rows:
+        counts[bucket_start(start, granularity)] += count
+
+    return [{'bucket_start': start.isoformat(), 'count': count} for start, count in counts.items()]
+
+def _fold(totals, owner, day, count, horizon):
+    if day >= horizon:
+        totals[(owner, 'day', day)] += count
+        return
+    for granularity in ('week', 'month'):
+        totals[(owner, granularity, bucket_start(day, granularity))] += count
+
+def compact_referral_rollups(batch_size=None):
+    """Fold daily buckets older than the retention into week and month buckets; returns days folded.
+
+    Each batch takes the oldest daily buckets through the
+    (granularity, bucket_start) index, deletes them, adds their counts to
+    the week and month buckets and commits on its own. A batch whose rows
+    another compactor took first is rolled back and read again, so no day
+    is ever counted twice.
+    """
+    batch_size = batch_size or current_app.config.get('ROLLUP_COMPACT_BATCH_SIZE', 1000)
+    horizon = daily_horizon()
+    total = 0
+    while True:
+        rows = db.session.query(ReferralRollup.referrer_id, ReferralRollup.bucket_start, ReferralRollup.count).filter(
+            ReferralRollup.granularity == 'day', ReferralRollup.bucket_start < horizon
+        ).order_by(ReferralRollup.bucket_start, ReferralRollup.referrer_id).limit(batch_size).all()
+        if not rows:
+            return total
+
+        deleted = ReferralRollup.query.filter(
+            ReferralRollup.granularity == 'day',
+            tuple_(ReferralRollup.referrer_id, ReferralRollup.bucket_start).in_(
+                [(row.referrer_id, row.bucket_start) for row in rows])
+        ).delete(synchronize_session=False)
+        if deleted != len(rows):
+            db.session.rollback()
+            continue
+
+        totals = defaultdict(int)
+        for row in rows:
+            _fold(totals, row.referrer_id, row.bucket_start, row.count, horizon)
+        for (owner, granularity, start), count in totals.items():
+            upsert(
+                ReferralRollup,
+                {'referrer_id': owner, 'granularity': granularity, 'bucket_start': start, 'count': count},
+                ['referrer_id', 'granularity', 'bucket_start'],
+                {'count': ReferralRollup.count + count}
+            )
+        db.session.commit()
+        total += len(rows)
+
+def backfill_referral_rollups():
+    """Rebuild every rollup from the raw referrals; returns the number of buckets written.
+
+    This scans the referrals table once, grouped by referrer and day, so it
+    belongs in a batch job, never in the request path. Days past the
+    retention go straight into week and month buckets.
+    """
+    horizon = daily_horizon()
+    day = func.date(Referral.date_referred, type_=db.Date)
+    totals = defaultdict(int)
+    for referrer_id, referred_on, count in db.session.query(
+        Referral.referrer_id, day, func.count()
+    ).filter(Referral.date_referred.isnot(None)).group_by(Referral.referrer_id, day):
+        for owner in (referrer_id, ReferralRollup.PLATFORM):
+            _fold(totals, owner, referred_on, count, horizon)
+
+    rows = [
+        {'referrer_id': owner, 'granularity': granularity, 'bucket_start': start, 'count': count}
+        for (owner, granularity, start), count in totals.items()
+    ]
+    ReferralRollup.query.delete()
+    for i in range(0, len(rows), INSERT_CHUNK):
+        db.session.execute(ReferralRollup.__table__.insert(), rows[i:i + INSERT_CHUNK])
+    db.session.commit()
+
+    return len(rows)
@@ -0,0 +1,93 @@
+# app/services/sweeper.py
+import logging
+import os
+import threading
+
+from app.models import db
+from app.services.auth_service import purge_expired_password_resets
+from app.services.refresh_token_service import purge_expired_refresh_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class Sweeper:
+    """Background thread that deletes expired tokens every ``SWEEP_INTERVAL`` seconds.
+
+    Each job deletes in batches of ``SWEEP_BATCH_SIZE`` rows with a commit
+    per batch, selected through the ``expires_at`` indexes, so a sweep never
+    holds a long lock. The thread starts with the first request a worker
+    serves (so it survives a preloading fork); set ``SWEEP_INTERVAL`` to 0
+    to disable it and run ``flask purge-expired-tokens`` from cron instead.
+    """
+
+    jobs = {
+        'password_resets': purge_expired_password_resets,
+        'refresh_tokens': purge_expired_refresh_tokens,
+    }
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.Lock()
+        self._reset()
+
+    def init_app(self, app):
+        self.stop()
+        self.app = app
+        self._reset()
+        app.before_request(self._ensure_started)
+        app.extensions['sweeper'] = self
+
+    def _reset(self):
+        self._thread = None
+        self._stop = threading.Event()
+        self._pid = None
+        self.runs = 0
+        self.purged = {name: 0 for name in self.jobs}
+
+    def run_once(self):
+        """Run every purge job now; returns rows removed per job"""
+        batch_size = self.app.config.get('SWEEP_BATCH_SIZE', 500)
+        removed = {}
+        for name, job in self.jobs.items():
+            try:
+                removed[name] = job(batch_size)
+            except Exception:
+                db.session.rollback()
+                logger.exception("Sweeping %s failed", name)
+                removed[name] = 0
+        with self._lock:
+            self.runs += 1
+            for name, count in removed.items():
+                self.purged[name] += count
+        return removed
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            return {'runs': self.runs, **{f'purged_{name}': count for name, count in self.purged.items()}}
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        interval = self.app.config.get('SWEEP_INTERVAL', 300)
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            if interval <= 0:
+                return
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._work, args=(self.app, interval, self._stop),
+                                            name='token-sweeper', daemon=True)
+            self._thread.start()
+
+    def _work(self, app, interval, stop):
+        while not stop.wait(interval):
+            with app.app_context():
+                self.run_once()
+                db.session.remove()
+
+
+sweeper = Sweeper()
@@ -0,0 +1,129 @@
+# app/services/token_service.py
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from flask_jwt_extended import get_jwt
+
+from app.models import db, UserVersion
+from app.utils.db import after_commit, upsert
+from app.utils.serializers import serialize_profile_claims
+
+
+class TokenVersions:
+    """Compact per-user map of token stamps, checked on every authenticated request.
+
+    Each access token carries the user's ``version`` at issue time as its
+    ``ver`` claim. Changing a user's profile bumps ``version``, so tokens
+    issued earlier carry stale profile claims and readers fall back to the
+    database. Changing their password also raises ``min_version``, which
+    revokes every earlier token. Stamps are kept in memory for
+    ``JWT_VERSION_TTL`` seconds for those checks; the writing worker drops
+    its entry on commit and other workers see the change when their entry
+    expires. New tokens are always stamped from the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ttl = 30
+        self.max_entries = 100000
+        self._reset()
+
+    def init_app(self, app):
+        self._reset()
+        self.ttl = app.config.get('JWT_VERSION_TTL', 30)
+        self.max_entries = app.config.get('JWT_VERSION_MAP_SIZE', 100000)
+        app.extensions['token_versions'] = self
+
+    def _reset(self):
+        self._entries = OrderedDict()  # user_id -> (version, min_version, loaded_at)
+        self._pid = None
+        self.hits = 0
+        self.loads = 0
+
+    def get(self, user_id):
+        """The user's (version, min_version), from memory while fresh"""
+        user_id = int(user_id)
+        now = time.monotonic()
+        with self._lock:
+            self._check_pid()
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[2] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[:2]
+        return self.load(user_id)
+
+    def load(self, user_id):
+        """The user's (version, min_version) from the database, refreshing the memory entry"""
+        user_id = int(user_id)
+        now = time.monotonic()
+        row = db.session.query(UserVersion.version, UserVersion.min_version).filter_by(user_id=user_id).first()
+        stamps = (row.version, row.min_version) if row else (0, 0)
+        with self._lock:
+            self._check_pid()
+            self.loads += 1
+            self._entries[user_id] = stamps + (now,)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return stamps
+
+    def is_revoked(self, claims):
+        """True for tokens issued before the user's last password change"""
+        if 'ver' not in claims:
+            return False  # Issued before tokens were stamped; they expire on their own
+        return claims['ver'] < self.get(claims[current_app.config['JWT_IDENTITY_CLAIM']])[1]
+
+    def is_stale(self, claims):
+        """True when the user changed since the token's profile claims were issued"""
+        return claims.get('ver', -1) < self.get(claims[current_app.config['JWT_IDENTITY_CLAIM']])[0]
+
+    def bump(self, user_id, revoke=False):
+        """Mark the user's existing tokens stale, or revoked, once the transaction commits"""
+        upsert(
+            UserVersion,
+            {'user_id': user_id, 'version': 1, 'min_version': 1 if revoke else 0},
+            ['user_id'],
+            {
+                'version': UserVersion.version + 1,
+                'min_version': UserVersion.version + 1 if revoke else UserVersion.min_version
+            }
+        )
+        after_commit(self.forget, user_id)
+
+    def forget(self, user_id):
+        with self._lock:
+            self._entries.pop(int(user_id), None)
+
+    def _check_pid(self):
+        # Entries inherited from the parent process were never invalidated here
+        if self._pid != os.getpid():
+            self._entries.clear()
+            self._pid = os.getpid()
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'loads': self.loads}
+
+
+token_versions = TokenVersions()
+
+
+def profile_claims(user):
+    """Claims embedded in a user's access token"""
+    # Stamped from the database: a stamp cached before a password change on another worker would be revoked
+    claims = {'ver': token_versions.load(user.id)[0]}
+    if current_app.config.get('JWT_PROFILE_CLAIMS'):
+        claims['profile'] = serialize_profile_claims(user)
+    return claims
+
+
+def current_profile():
+    """The caller's profile from their token, or None if it has no claims or they are stale"""
+    claims = get_jwt()
+    profile = claims.get('profile')
+    if profile is None or token_versions.is_stale(claims):
+        return None
+    return {'id': int(claims[current_app.config['JWT_IDENTITY_CLAIM']]), **profile}
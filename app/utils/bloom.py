@@ -0,0 +1,70 @@
+# app/utils/bloom.py
+import hashlib
+import math
+import struct
+
+_HEADER = struct.Struct('>5sQBQ')
+_MAGIC = b'VCBF1'
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings.
+
+    Answers "definitely absent" or "possibly present". Sized for
+    ``capacity`` items at a false-positive rate of ``error_rate``, it uses
+    about ``-1.44 * log2(error_rate)`` bits per item (9.6 bits, 7 hashes at
+    1%). Adding more than ``capacity`` items raises the false-positive rate
+    but never causes false negatives.
+    """
+
+    def __init__(self, num_bits, num_hashes, count=0, bits=None):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.count = count
+        self.bits = bits if bits is not None else bytearray((num_bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate):
+        capacity = max(capacity, 1)
+        num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        num_hashes = max(1, int(round(num_bits / capacity * math.log(2))))
+        return cls(num_bits, num_hashes)
+
+    @property
+    def memory_bytes(self):
+        return len(self.bits)
+
+    def estimated_error_rate(self):
+        """False-positive probability at the current fill level"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def _positions(self, item):
+        # Kirsch-Mitzenmacher double hashing from one 128-bit digest
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = struct.unpack('>QQ', digest)
+        h2 |= 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def to_bytes(self, extra=0):
+        """Serialize the filter; ``extra`` is an integer stored alongside it"""
+        return _HEADER.pack(_MAGIC, self.num_bits, self.num_hashes, self.count) + struct.pack('>Q', extra) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Inverse of to_bytes; returns (filter, extra)"""
+        magic, num_bits, num_hashes, count = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("Not a Bloom filter snapshot")
+        (extra,) = struct.unpack_from('>Q', data, _HEADER.size)
+        bits = bytearray(data[_HEADER.size + 8:])
+        if len(bits) != (num_bits + 7) // 8:
+            raise ValueError("Truncated Bloom filter snapshot")
+        return cls(num_bits, num_hashes, count, bits), extra
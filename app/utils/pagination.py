@@ -0,0 +1,36 @@
+# app/utils/pagination.py
+import base64
+from datetime import datetime
+
+def encode_cursor(*values):
+    """Encode a keyset position such as (datetime, id) as an opaque cursor"""
+    parts = [value.isoformat() if isinstance(value, datetime) else str(value) for value in values]
+    raw = '|'.join(parts).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, types=(datetime.fromisoformat, int)):
+    """Decode a cursor from encode_cursor, converting each part with ``types``.
+    
+    Raises ValueError if the cursor is malformed.
+    """
+    if not cursor:
+        return None
+    
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        parts = raw.split('|')
+        if len(parts) != len(types):
+            raise ValueError
+        return tuple(convert(part) for convert, part in zip(types, parts))
+    except (TypeError, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+def parse_limit(value, default, maximum):
+    """Parse a page size query parameter, clamped to [1, maximum]"""
+    if value is None:
+        return default
+    
+    limit = int(value)
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, maximum)
@@ -0,0 +1,187 @@
+# app/utils/rate_limit.py
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from flask_jwt_extended.exceptions import JWTExtendedException
+from flask_limiter.util import get_remote_address
+from jwt import PyJWTError
+from limits.storage import Storage
+
+from app.utils.resp import RespClient
+
+CLEANUP_EVERY = 1000
+
+
+def rate_limit_key():
+    """Rate-limit per JWT identity when RATELIMIT_KEY is 'user', otherwise per client IP"""
+    if current_app.config.get('RATELIMIT_KEY') == 'user':
+        try:
+            verify_jwt_in_request(optional=True)
+            identity = get_jwt_identity()
+        except (JWTExtendedException, PyJWTError):
+            identity = None
+        if identity is not None:
+            return f"user:{identity}"
+    return f"ip:{get_remote_address()}"
+
+
+def sliding_count(current, previous, expiry, now):
+    """Sliding-window estimate: the previous window's hits weighted by how much of it still overlaps"""
+    elapsed = now % expiry
+    return current + int(previous * (expiry - elapsed) / expiry)
+
+
+class SQLiteStorage(Storage):
+    """Sliding-window counters in a SQLite file shared by every worker on one host.
+
+    Each hit is one upsert and one two-row read in a single write
+    transaction in WAL mode, so workers never block readers and the counts
+    are exact across processes. Use it
+    with the default ``fixed-window`` strategy; the counts it returns
+    already blend the previous window in. URI: ``sqlite:///path/to/file``.
+    """
+
+    STORAGE_SCHEME = ['sqlite']
+
+    def __init__(self, uri=None, timeout=5.0, **options):
+        self.path = uri.split(':///', 1)[1] if uri and ':///' in uri else ''
+        if not self.path or self.path == ':memory:':
+            raise ValueError("SQLite rate-limit storage needs a file path, e.g. sqlite:////var/run/ratelimit.db")
+        self.timeout = float(timeout)
+        self._local = threading.local()
+        super().__init__(uri, **options)
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        now = time.time()
+        window = int(now // expiry)
+        conn = self._connection()
+        # One write transaction, so the count read back includes this hit and no later one
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT INTO rate_limits (key, window, count, expiry, expires_at) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (key, window) DO UPDATE SET count = count + excluded.count',
+                (key, window, amount, expiry, (window + 2) * expiry)
+            )
+            self._local.writes += 1
+            if self._local.writes % CLEANUP_EVERY == 0:
+                conn.execute('DELETE FROM rate_limits WHERE expires_at < ?', (now,))
+            count = self._count(conn, key, now)[0]
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return count
+
+    def get(self, key):
+        return self._count(self._connection(), key, time.time())[0]
+
+    def get_expiry(self, key):
+        now = time.time()
+        expiry = self._count(self._connection(), key, now)[1]
+        return int((now // expiry + 1) * expiry) if expiry else int(now)
+
+    def check(self):
+        try:
+            self._connection().execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._connection().execute('DELETE FROM rate_limits').rowcount
+
+    def clear(self, key):
+        self._connection().execute('DELETE FROM rate_limits WHERE key = ?', (key,))
+
+    def _count(self, conn, key, now):
+        rows = conn.execute(
+            'SELECT window, count, expiry FROM rate_limits WHERE key = ? ORDER BY window DESC LIMIT 2', (key,)
+        ).fetchall()
+        if not rows:
+            return 0, None
+        expiry = rows[0][2]
+        window = int(now // expiry)
+        counts = {row_window: count for row_window, count, _ in rows}
+        return sliding_count(counts.get(window, 0), counts.get(window - 1, 0), expiry, now), expiry
+
+    def _connection(self):
+        # One connection per thread, and a fresh one after a fork
+        if getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limits ('
+                'key TEXT NOT NULL, window INTEGER NOT NULL, count INTEGER NOT NULL, '
+                'expiry INTEGER NOT NULL, expires_at REAL NOT NULL, PRIMARY KEY (key, window)'
+                ') WITHOUT ROWID'
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            self._local.writes = 0
+        return self._local.conn
+
+
+class RespStorage(Storage):
+    """Sliding-window counters on any Redis-protocol server, shared by a cluster.
+
+    A hit costs one round trip: INCRBY on the current window's bucket, its
+    EXPIRE, a read of the previous bucket and a note of the window length
+    for reads that do not know it. URI: ``resp://host:6379/0``.
+    """
+
+    STORAGE_SCHEME = ['resp']
+
+    def __init__(self, uri=None, timeout=1.0, **options):
+        self.client = RespClient(uri, timeout=float(timeout))
+        super().__init__(uri, **options)
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        now = time.time()
+        window = int(now // expiry)
+        current, _, previous, _ = self.client.pipeline(
+            ('INCRBY', f"{key}:{window}", amount),
+            ('EXPIRE', f"{key}:{window}", expiry * 2),
+            ('GET', f"{key}:{window - 1}"),
+            ('SET', f"{key}:expiry", expiry, 'EX', expiry * 2)
+        )
+        return sliding_count(current, int(previous or 0), expiry, now)
+
+    def get(self, key):
+        now = time.time()
+        expiry = self._expiry(key)
+        if not expiry:
+            return 0
+        window = int(now // expiry)
+        current, previous = self.client.pipeline(('GET', f"{key}:{window}"), ('GET', f"{key}:{window - 1}"))
+        return sliding_count(int(current or 0), int(previous or 0), expiry, now)
+
+    def get_expiry(self, key):
+        now = time.time()
+        expiry = self._expiry(key)
+        return int((now // expiry + 1) * expiry) if expiry else int(now)
+
+    def check(self):
+        try:
+            return self.client.ping()
+        except OSError:
+            return False
+
+    def reset(self):
+        # Buckets expire on their own; a shared server is never flushed from here
+        return None
+
+    def clear(self, key):
+        expiry = self._expiry(key)
+        if expiry:
+            window = int(time.time() // expiry)
+            self.client.delete(f"{key}:{window}", f"{key}:{window - 1}", f"{key}:expiry")
+
+    def _expiry(self, key):
+        value = self.client.get(f"{key}:expiry")
+        return int(value) if value is not None else None
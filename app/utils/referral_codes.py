@@ -0,0 +1,81 @@
+# app/utils/referral_codes.py
+import hashlib
+import hmac
+from functools import lru_cache
+
+from flask import current_app
+
+ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+CODE_LENGTH = 7
+ID_BITS = 40  # 2**40 < 62**7, so every id fits in seven base62 digits
+HALF_BITS = ID_BITS // 2
+HALF_MASK = (1 << HALF_BITS) - 1
+ROUNDS = 4
+
+
+class ReferralCodec:
+    """Keyed permutation of user ids onto 7-character base62 codes.
+
+    A four-round Feistel network over 40 bits scrambles the id, so codes do
+    not reveal signup order, and every id maps to a different code. Decoding
+    inverts the network, turning a code back into the id without a lookup.
+    """
+
+    def __init__(self, secret):
+        self._key = hashlib.sha256(secret.encode('utf-8')).digest()
+
+    def encode(self, user_id):
+        if not 0 < user_id <= (1 << ID_BITS) - 1:
+            raise ValueError(f"User id {user_id} is out of range for a referral code")
+        left, right = user_id >> HALF_BITS, user_id & HALF_MASK
+        for i in range(ROUNDS):
+            left, right = right, left ^ self._round(i, right)
+
+        value = (left << HALF_BITS) | right
+        digits = []
+        for _ in range(CODE_LENGTH):
+            value, digit = divmod(value, 62)
+            digits.append(ALPHABET[digit])
+        return ''.join(reversed(digits))
+
+    def decode(self, code):
+        """The user id a code was made from, or None if no id encodes to it"""
+        if not is_short_code(code):
+            return None
+        value = 0
+        for char in code:
+            value = value * 62 + ALPHABET.index(char)
+        if value >> ID_BITS:
+            return None
+
+        left, right = value >> HALF_BITS, value & HALF_MASK
+        for i in reversed(range(ROUNDS)):
+            left, right = right ^ self._round(i, left), left
+        return (left << HALF_BITS) | right or None
+
+    def _round(self, i, half):
+        digest = hmac.new(self._key, bytes([i]) + half.to_bytes(4, 'big'), hashlib.sha256).digest()
+        return int.from_bytes(digest[:4], 'big') & HALF_MASK
+
+
+def is_short_code(code):
+    """True for codes in the generated format; older codes are 8 characters"""
+    return isinstance(code, str) and len(code) == CODE_LENGTH and all(char in ALPHABET for char in code)
+
+
+@lru_cache(maxsize=4)
+def _codec(secret):
+    return ReferralCodec(secret)
+
+
+def _current_codec():
+    # Changing the secret changes every generated code, so it must stay fixed once users exist
+    return _codec(current_app.config.get('REFERRAL_CODE_SECRET') or current_app.config['SECRET_KEY'])
+
+
+def encode_referral_code(user_id):
+    return _current_codec().encode(user_id)
+
+
+def decode_referral_code(code):
+    return _current_codec().decode(code)
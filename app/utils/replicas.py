@@ -0,0 +1,206 @@
+# app/utils/replicas.py
+import functools
+import logging
+import os
+import threading
+import time
+
+from flask import current_app
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, event, orm
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+
+from app.utils.sqlite import sqlite_profile, install_pragmas
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaRouter:
+    """Read replicas for the service reads marked with :func:`replica_read`.
+
+    Each session (one per request) picks a healthy replica round-robin the
+    first time it runs a replica read and keeps it, so a request sees one
+    consistent copy. A replica that fails to answer is skipped for
+    ``SQLALCHEMY_REPLICA_RETRY_SECONDS`` and the read is retried on the
+    primary; with every replica down, reads go to the primary.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.uris = []
+        self.config = {}
+        self.engine_options = {}
+        self.retry_seconds = 30
+        self.cache_ttl = 5
+        self._engines = {}
+        self._reset()
+
+    def init_app(self, app):
+        self.dispose()
+        self.uris = list(app.config.get('SQLALCHEMY_REPLICA_URIS') or [])
+        self.config = app.config
+        self.engine_options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}, pool_pre_ping=True)
+        self.retry_seconds = app.config.get('SQLALCHEMY_REPLICA_RETRY_SECONDS', 30)
+        self.cache_ttl = app.config.get('SQLALCHEMY_REPLICA_CACHE_TTL', 5)
+        self._reset()
+        app.extensions['replicas'] = self
+
+    def _reset(self):
+        self._engines = {}
+        self._down_until = {}
+        self._next = 0
+        self._pid = os.getpid()
+        self.reads = 0
+        self.fallbacks = 0
+        self.failures = 0
+
+    def choose(self):
+        """(uri, engine) of the next healthy replica, or None to read from the primary"""
+        if not self.uris:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            if self._pid != os.getpid():
+                # Pooled connections must not cross a fork
+                self._engines = {}
+                self._pid = os.getpid()
+            for offset in range(len(self.uris)):
+                uri = self.uris[(self._next + offset) % len(self.uris)]
+                if self._down_until.get(uri, 0) <= now:
+                    self._next = (self._next + offset + 1) % len(self.uris)
+                    if uri not in self._engines:
+                        self._engines[uri] = self._create_engine(uri)
+                    self.reads += 1
+                    return uri, self._engines[uri]
+            self.fallbacks += 1
+        return None
+
+    def _create_engine(self, uri):
+        options, pragmas = sqlite_profile(self.config, make_url(uri))
+        engine = create_engine(uri, **{**options, **self.engine_options})
+        if pragmas:
+            install_pragmas(engine, pragmas)
+        return engine
+
+    def mark_down(self, uri):
+        with self._lock:
+            self._down_until[uri] = time.monotonic() + self.retry_seconds
+            self.failures += 1
+            self.fallbacks += 1
+        logger.warning("Read replica %s failed; using the primary for %ss", uri, self.retry_seconds, exc_info=True)
+
+    def routing(self):
+        """True inside a replica read whose SELECTs this request's session sends to a replica"""
+        info = _session().info
+        return bool(info.get('replica_depth') and info.get('replica') is not None and not info.get('wrote'))
+
+    def dispose(self):
+        with self._lock:
+            engines, self._engines = self._engines, {}
+        for engine in engines.values():
+            engine.dispose()
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'replicas': len(self.uris),
+                'healthy': sum(1 for uri in self.uris if self._down_until.get(uri, 0) <= now),
+                'reads': self.reads,
+                'fallbacks': self.fallbacks,
+                'failures': self.failures
+            }
+
+
+replicas = ReplicaRouter()
+
+
+class RoutingSession(SignallingSession):
+    """Session that sends the SELECTs of a replica read to the request's replica.
+
+    Everything else goes to the primary: writes, locking reads, and every
+    read after the session has written, so a request always reads its own
+    writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        replica = self.info.get('replica')
+        if (replica is not None and self.info.get('replica_depth') and not self.info.get('wrote')
+                and not self._flushing and getattr(clause, 'is_select', False)
+                and getattr(clause, '_for_update_arg', None) is None
+                and (mapper is None or 'bind_key' not in mapper.persist_selectable.info)):
+            return replica[1]
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy with replica-routing sessions and the SQLite tuning profile"""
+
+    def __init__(self, *args, **kwargs):
+        self._pragmas = {}
+        super().__init__(*args, **kwargs)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        profile_options, pragmas = sqlite_profile(app.config, sa_url)
+        for key, value in profile_options.items():
+            if key == 'connect_args':
+                options['connect_args'] = {**value, **options.get('connect_args', {})}
+            else:
+                options.setdefault(key, value)
+        sa_url, options = super().apply_driver_hacks(app, sa_url, options)
+        if pragmas:
+            self._pragmas[sa_url] = pragmas
+        return sa_url, options
+
+    def create_engine(self, sa_url, engine_opts):
+        engine = super().create_engine(sa_url, engine_opts)
+        pragmas = self._pragmas.pop(sa_url, None)
+        if pragmas:
+            install_pragmas(engine, pragmas)
+        return engine
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _stick_after_flush(session, flush_context):
+    session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _stick_after_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+
+def _session():
+    return current_app.extensions['sqlalchemy'].db.session()
+
+
+def replica_read(fn):
+    """Run fn's queries on a read replica unless this request has already written"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        session = _session()
+        if session.info.get('replica_depth'):
+            return fn(*args, **kwargs)
+        if not replicas.uris or session.info.get('wrote'):
+            return fn(*args, **kwargs)
+        if 'replica' not in session.info:
+            session.info['replica'] = replicas.choose()
+        if session.info['replica'] is None:
+            return fn(*args, **kwargs)
+
+        session.info['replica_depth'] = 1
+        try:
+            return fn(*args, **kwargs)
+        except OperationalError:
+            # Nothing has been written yet, so dropping the broken transaction loses nothing
+            replicas.mark_down(session.info['replica'][0])
+            session.info['replica'] = None
+            session.rollback()
+        finally:
+            session.info['replica_depth'] = 0
+        return fn(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,130 @@
+# app/utils/resp.py
+import socket
+import threading
+from urllib.parse import urlparse
+
+
+class RespError(Exception):
+    """Error reply from a Redis-protocol server"""
+
+
+class RespClient:
+    """Minimal Redis-protocol (RESP2) client with one connection per thread.
+
+    Speaks only the handful of commands the cache and rate limiter need, so
+    the app has no hard dependency on a Redis client library. Any server
+    that implements RESP (Redis, KeyDB, Dragonfly, a test stand-in) works.
+    """
+
+    def __init__(self, url, timeout=1.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.password = parsed.password
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def execute(self, *args):
+        """Send one command and return its decoded reply, reconnecting once on a dropped socket"""
+        for attempt in (0, 1):
+            conn = self._connection()
+            try:
+                conn.sendall(self._encode(args))
+                return self._read(self._local.reader)
+            except (ConnectionError, socket.timeout, OSError):
+                self.close()
+                if attempt:
+                    raise
+
+    def pipeline(self, *commands):
+        """Send several commands in one round trip and return their replies"""
+        conn = self._connection()
+        try:
+            conn.sendall(b''.join(self._encode(args) for args in commands))
+            replies = []
+            for _ in commands:
+                try:
+                    replies.append(self._read(self._local.reader))
+                except RespError as e:
+                    replies.append(e)
+            return replies
+        except (ConnectionError, socket.timeout, OSError):
+            self.close()
+            raise
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+        self._local.conn = None
+        self._local.reader = None
+
+    def get(self, key):
+        return self.execute('GET', key)
+
+    def set(self, key, value, ex=None, nx=False):
+        args = ['SET', key, value]
+        if ex:
+            args += ['EX', int(ex)]
+        if nx:
+            args.append('NX')
+        return self.execute(*args) is not None
+
+    def delete(self, *keys):
+        return self.execute('DEL', *keys)
+
+    def incrby(self, key, amount=1):
+        return self.execute('INCRBY', key, amount)
+
+    def ping(self):
+        return self.execute('PING') == b'PONG'
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._local.conn = conn
+            self._local.reader = conn.makefile('rb')
+            if self.password:
+                self.execute('AUTH', self.password)
+            if self.db:
+                self.execute('SELECT', self.db)
+        return conn
+
+    @staticmethod
+    def _encode(args):
+        out = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode('utf-8')
+            out.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(out)
+
+    def _read(self, reader):
+        line = reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload
+        if kind == b'-':
+            raise RespError(payload.decode('utf-8', 'replace'))
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length == -1:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(payload)
+            if length == -1:
+                return None
+            return [self._read(reader) for _ in range(length)]
+        raise RespError(f"Unexpected reply {line!r}")
@@ -0,0 +1,43 @@
+# app/utils/responses.py
+import hashlib
+
+from flask import current_app, json, request
+
+try:
+    import orjson
+except ImportError:  # Optional; Flask's encoder is used without it
+    orjson = None
+
+def dumps(payload):
+    """Encode a payload of plain JSON types, with orjson when it is installed"""
+    sort_keys = current_app.config.get('JSON_SORT_KEYS', True)
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+    return json.dumps(payload, separators=(',', ':'), sort_keys=sort_keys).encode('utf-8')
+
+def make_etag(*parts):
+    """A strong ETag for a response fully determined by parts"""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+def json_response(payload, status=200, etag=None):
+    """Serialize payload into a JSON response, tagged with etag when given"""
+    response = current_app.response_class(dumps(payload), status=status, mimetype='application/json')
+    if etag is not None:
+        _tag(response, etag)
+    return response
+
+def conditional_json(etag, build):
+    """An empty 304 if the client already holds etag; otherwise build() serialized with it.
+    
+    ``build`` only runs on a miss, so a matching If-None-Match skips both the
+    reads behind the body and its serialization.
+    """
+    if request.if_none_match.contains(etag):
+        return _tag(current_app.response_class(status=304), etag)
+    return json_response(build(), etag=etag)
+
+def _tag(response, etag):
+    response.set_etag(etag)
+    # Per-user bodies: browsers may keep them but must revalidate, shared caches must not
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,34 @@
+# app/utils/serializers.py
+from operator import attrgetter
+
+def compile_serializer(**spec):
+    """Build a function turning an object or row into a dict, resolving the spec once.
+    
+    Each value is an attribute name, a function of the object, or a nested
+    spec (a dict) applied to the same object.
+    """
+    keys = tuple(spec)
+    getters = tuple(
+        attrgetter(source) if isinstance(source, str)
+        else compile_serializer(**source) if isinstance(source, dict)
+        else source
+        for source in spec.values()
+    )
+    
+    def serialize(obj):
+        return {key: get(obj) for key, get in zip(keys, getters)}
+    
+    return serialize
+
+# The profile fields access tokens embed; /api/me adds the id
+serialize_profile_claims = compile_serializer(username='username', email='email', referral_code='referral_code')
+
+serialize_user = compile_serializer(id='id', username='username', email='email', referral_code='referral_code')
+
+# Rows from get_user_referrals
+serialize_referral = compile_serializer(
+    id='id',
+    referred_user={'id': 'referred_user_id', 'username': 'referred_username'},
+    date_referred=lambda row: row.date_referred.isoformat(),
+    status='status'
+)
@@ -0,0 +1,49 @@
+# app/utils/sqlite.py
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+
+def sqlite_profile(config, url):
+    """Engine options and connect-time pragmas for a SQLite URL under SQLITE_PROFILE.
+
+    The ``tuned`` profile puts file databases in WAL mode, so readers never
+    block the writer, and waits ``SQLITE_BUSY_TIMEOUT_MS`` for a lock
+    instead of failing with "database is locked". It also keeps a small
+    pool of connections so their pragmas and page cache outlive a request,
+    and lets it overflow to one connection per request thread
+    (``WEB_THREADS``): a request holds its connection until teardown, so
+    a smaller cap would queue requests behind each other.
+    Returns ``({}, None)`` for other databases and for the ``default``
+    profile.
+    """
+    if url.get_backend_name() != 'sqlite' or config.get('SQLITE_PROFILE', 'tuned') != 'tuned':
+        return {}, None
+
+    pragmas = {
+        'busy_timeout': int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'synchronous': 'NORMAL',  # Durable across crashes in WAL mode; only a power loss can drop the last commits
+        'mmap_size': int(config.get('SQLITE_MMAP_SIZE', 268435456)),
+        'cache_size': -int(config.get('SQLITE_CACHE_SIZE_KB', 20000)),  # Negative means KiB, not pages
+        'temp_store': 'MEMORY'
+    }
+    if url.database in (None, '', ':memory:'):
+        return {}, pragmas
+
+    pool_size = int(config.get('SQLITE_POOL_SIZE', 5))
+    options = {
+        'poolclass': QueuePool,  # SQLAlchemy otherwise opens a new connection per checkout for file databases
+        'pool_size': pool_size,
+        'max_overflow': max(int(config.get('WEB_THREADS', 64)) - pool_size, 0),
+        'connect_args': {'check_same_thread': False}
+    }
+    return options, {'journal_mode': 'WAL', **pragmas}
+
+
+def install_pragmas(engine, pragmas):
+    """Run the pragmas on every new DBAPI connection the engine opens"""
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
@@ -0,0 +1,11 @@
+# app/utils/tokens.py
+import hashlib
+import secrets
+
+def new_token():
+    """A random, URL-safe token with 256 bits of entropy"""
+    return secrets.token_urlsafe(32)
+
+def hash_token(token):
+    """Fixed-width SHA-256 digest stored in place of a token"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
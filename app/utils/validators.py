@@ -1,5 +1,7 @@
 # app/utils/validators.py
 import re
+from sqlalchemy import or_
+
 from app.models import User
 
 def validate_email(email):
@@ -23,6 +25,13 @@ def validate_password_strength(password):
     
     return True, "Password is strong enough"
 
+def validate_device_name(device_name):
+    """Validate the optional device label sent with register and login"""
+    if device_name is not None and not isinstance(device_name, str):
+        return False, "Device name must be a string"
+    
+    return True, None
+
 def is_username_taken(username):
     """Check if username already exists"""
     return User.query.filter_by(username=username).first() is not None
@@ -31,24 +40,48 @@ def is_email_taken(email):
     """Check if email already exists"""
     return User.query.filter_by(email=email).first() is not None
 
-def validate_registration_data(username, email, password):
-    """Validate registration data"""
+def find_taken_fields(username, email):
+    """Check username and email availability with a single query; None skips a field"""
+    errors = {}
+    conditions = []
+    if username is not None:
+        conditions.append(User.username == username)
+    if email is not None:
+        conditions.append(User.email == email)
+    if not conditions:
+        return errors
+    
+    rows = User.query.with_entities(User.username, User.email).filter(
+        or_(*conditions)
+    ).limit(2).all()
+    
+    for taken_username, taken_email in rows:
+        if username is not None and taken_username == username:
+            errors['username'] = "Username is already taken"
+        if email is not None and taken_email == email:
+            errors['email'] = "Email is already registered"
+    
+    return errors
+
+def validate_registration_format(username, email, password):
+    """Validate registration data without touching the database"""
     errors = {}
     
     if not username or len(username) < 3:
         errors['username'] = "Username must be at least 3 characters long"
     
-    if is_username_taken(username):
-        errors['username'] = "Username is already taken"
-    
     if not validate_email(email):
         errors['email'] = "Invalid email format"
     
-    if is_email_taken(email):
-        errors['email'] = "Email is already registered"
-    
     is_valid, password_error = validate_password_strength(password)
     if not is_valid:
         errors['password'] = password_error
     
+    return len(errors) == 0, errors
+
+def validate_registration_data(username, email, password):
+    """Validate registration data"""
+    _, errors = validate_registration_format(username, email, password)
+    errors.update(find_taken_fields(username, email))
+    
     return len(errors) == 0, errors
\ No newline at end of file
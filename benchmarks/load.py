@@ -0,0 +1,256 @@
+"""Load benchmark: per-endpoint throughput, latency percentiles and queries per request.
+
+    python -m benchmarks.load --db /tmp/vomychat-bench.db [--users 1000000] [--mode inprocess|http]
+        [--requests 200] [--concurrency 8] [--save-baseline] [--threshold 0.25]
+
+Seeds ``--db`` with ``benchmarks.seed`` if it does not exist yet, then
+drives register, login, /api/me, /api/referrals and /api/referral-stats
+through the app factory. ``inprocess`` uses Flask test clients; ``http``
+serves the app from a threaded server in this process (or targets
+``--url``) and sends real HTTP requests. A fifth of the reads act as one of
+the top referrers, whose referral lists are the largest.
+
+Results are compared with the baseline stored for the mode in
+``--baseline``. The run fails (exit status 1) when any request got a 4xx or
+5xx, or an endpoint's p95 latency grows by more than ``--threshold`` or it
+issues more queries per request. ``--save-baseline`` records the current
+run instead, unless it had errors.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import has_request_context  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from werkzeug.serving import make_server  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.models import db, User, ReferralCounter  # noqa: E402
+from app.services.auth_service import create_user_token  # noqa: E402
+from benchmarks.seed import PASSWORD, bench_config, seed  # noqa: E402
+
+ENDPOINTS = ['register', 'login', 'me', 'referrals', 'referral-stats']
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines.json')
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class InProcessTarget:
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def send(self, method, path, body=None, headers=None):
+        if not hasattr(self._local, 'client'):
+            self._local.client = self.app.test_client()
+        return self._local.client.open(path, method=method, json=body, headers=headers).status_code
+
+    def close(self):
+        pass
+
+
+class HTTPTarget:
+    def __init__(self, app=None, url=None):
+        self.server = None
+        if url is None:
+            logging.getLogger('werkzeug').setLevel(logging.WARNING)  # One log line per request skews the timings
+            self.server = make_server("127.0.0.1", 0, app, threaded=True)
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+            url = f"http://127.0.0.1:{self.server.server_port}"
+        self.url = url.rstrip('/')
+
+    def send(self, method, path, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method, headers={
+            **({'Content-Type': 'application/json'} if data else {}), **(headers or {})
+        })
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def close(self):
+        if self.server:
+            self.server.shutdown()
+
+
+class Workload:
+    """Request factories for each endpoint over a sample of seeded users"""
+
+    def __init__(self, app, sample_size=1000, top_referrers=100, seed_value=7):
+        self.rng = random.Random(seed_value)
+        self.tag = uuid.uuid4().hex[:8]
+        self._counter = iter(range(10 ** 12))
+        self._lock = threading.Lock()
+        with app.app_context():
+            max_id = db.session.query(db.func.max(User.id)).scalar()
+            top = [user_id for (user_id,) in db.session.query(ReferralCounter.user_id).order_by(
+                ReferralCounter.total_referrals.desc()).limit(top_referrers)]
+            ids = set(self.rng.sample(range(1, max_id + 1), min(sample_size, max_id))) | set(top)
+            users = db.session.query(User).filter(User.id.in_(ids)).all()
+            self.users = {user.id: (user.username, user.referral_code, create_user_token(user)) for user in users}
+            db.session.remove()
+        self.top = [user_id for user_id in top if user_id in self.users]
+        self.regular = [user_id for user_id in self.users if user_id not in set(self.top)]
+
+    def _user(self):
+        with self._lock:
+            pool = self.top if self.top and self.rng.random() < 0.2 else self.regular
+            return self.users[self.rng.choice(pool)]
+
+    def request(self, endpoint):
+        """(method, path, body, headers) for one request to endpoint"""
+        username, code, token = self._user()
+        auth = {'Authorization': f"Bearer {token}"}
+        if endpoint == 'register':
+            with self._lock:
+                n = next(self._counter)
+            name = f"load{self.tag}x{n}"
+            return 'POST', '/api/register', {
+                'username': name, 'email': f"{name}@bench.example", 'password': PASSWORD, 'referral_code': code
+            }, None
+        if endpoint == 'login':
+            return 'POST', '/api/login', {'username_or_email': username, 'password': PASSWORD}, None
+        if endpoint == 'me':
+            return 'GET', '/api/me', None, auth
+        if endpoint == 'referrals':
+            return 'GET', '/api/referrals?limit=50', None, auth
+        return 'GET', '/api/referral-stats', None, auth
+
+
+def run_endpoint(target, workload, endpoint, requests, concurrency, count_queries):
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    queries_before = count_queries()
+
+    def worker(index):
+        for _ in range(index, requests, concurrency):
+            method, path, body, headers = workload.request(endpoint)
+            started = time.perf_counter()
+            status = target.send(method, path, body, headers)
+            latencies[index].append(time.perf_counter() - started)
+            errors[index] += status >= 400
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    queries = count_queries()
+    flat = sorted(latency for worker_latencies in latencies for latency in worker_latencies)
+    return {
+        'requests': len(flat),
+        'errors': sum(errors),
+        'throughput': len(flat) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(flat, 0.50) * 1e3,
+        'p95_ms': percentile(flat, 0.95) * 1e3,
+        'p99_ms': percentile(flat, 0.99) * 1e3,
+        'queries': (queries - queries_before) / len(flat) if queries is not None and flat else None
+    }
+
+
+def compare(results, baseline, threshold):
+    """Regressions of results against a baseline, as printable lines"""
+    regressions = []
+    for endpoint, result in results.items():
+        # Failing fast looks fast, so any error fails the run whatever the latency
+        if result['errors']:
+            regressions.append(f"{endpoint}: {result['errors']} of {result['requests']} requests failed")
+        base = baseline.get(endpoint)
+        if not base:
+            continue
+        if result['p95_ms'] > base['p95_ms'] * (1 + threshold):
+            regressions.append(f"{endpoint}: p95 {result['p95_ms']:.1f} ms vs baseline {base['p95_ms']:.1f} ms")
+        if result['queries'] is not None and base.get('queries') is not None \
+                and result['queries'] > base['queries'] + 0.5:
+            regressions.append(f"{endpoint}: {result['queries']:.1f} queries/request vs baseline {base['queries']:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", required=True, help="Seeded database file (created if missing)")
+    parser.add_argument("--users", type=int, default=1000000, help="Users to seed when --db does not exist")
+    parser.add_argument("--mode", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument("--url", help="With --mode http, benchmark this running server instead")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--bcrypt-rounds", type=int, default=12, help="Work factor for seeding and login")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed p95 growth, as a fraction")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        seed(args.db, args.users, rounds=args.bcrypt_rounds)
+    app = create_app(bench_config(args.db, BCRYPT_LOG_ROUNDS=args.bcrypt_rounds))
+    workload = Workload(app)
+
+    counter = {'queries': 0}
+    def count(*args):
+        # Only the requests' own queries; a background thread's would blur the per-request figure
+        if has_request_context():
+            counter['queries'] += 1
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", count)
+    count_queries = (lambda: None) if args.url else (lambda: counter['queries'])
+
+    target = HTTPTarget(app, args.url) if args.mode == "http" else InProcessTarget(app)
+    results = {}
+    try:
+        for endpoint in args.endpoints.split(","):
+            run_endpoint(target, workload, endpoint, args.warmup, args.concurrency, count_queries)
+            results[endpoint] = run_endpoint(target, workload, endpoint, args.requests, args.concurrency, count_queries)
+    finally:
+        target.close()
+
+    print(f"{'endpoint':<16} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'queries':>8} {'errors':>7}")
+    for endpoint, r in results.items():
+        queries = f"{r['queries']:.1f}" if r['queries'] is not None else "-"
+        print(f"{endpoint:<16} {r['throughput']:>8.1f} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} "
+              f"{queries:>8} {r['errors']:>7}")
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    if args.save_baseline:
+        failed = compare(results, {}, args.threshold)
+        if failed:
+            for line in failed:
+                print(f"NOT SAVED {line}")
+            sys.exit(1)
+        baselines[args.mode] = results
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"Saved {args.mode} baseline to {args.baseline}")
+        return
+
+    regressions = compare(results, baselines.get(args.mode, {}), args.threshold)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
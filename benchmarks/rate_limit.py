@@ -0,0 +1,97 @@
+"""Rate-limit storage benchmark: per-request overhead and cross-process enforcement.
+
+    python -m benchmarks.rate_limit [--requests 2000] [--workers 4] [--resp-url resp://127.0.0.1:6379/0]
+
+For each storage it reports:
+  * the cost of one limiter hit, measured directly against the storage;
+  * the added latency per request through the app, against a run with
+    rate limiting disabled (GET /api/check-availability, which is answered
+    from memory and so isolates the limiter);
+  * how many of ``workers * per_worker`` hits forked processes were allowed
+    on a shared key whose limit is ``limit``. A storage that enforces
+    limits across processes allows exactly ``limit``; the per-process
+    ``memory://`` storage allows up to ``limit`` per worker.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from limits import parse  # noqa: E402
+from limits.storage import storage_from_string  # noqa: E402
+from limits.strategies import FixedWindowRateLimiter  # noqa: E402
+
+import app.utils.rate_limit  # noqa: E402,F401  registers sqlite:// and resp://
+from app import create_app  # noqa: E402
+from app.config import Config  # noqa: E402
+
+
+def storage_hit_cost(url, requests):
+    storage = storage_from_string(url)
+    limiter = FixedWindowRateLimiter(storage)
+    item = parse("1000000 per hour")
+    start = time.perf_counter()
+    for i in range(requests):
+        limiter.hit(item, f"bench-{i % 100}")
+    return (time.perf_counter() - start) / requests
+
+
+def request_cost(url, requests):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+        RATELIMIT_ENABLED = url is not None
+        RATELIMIT_STORAGE_URL = url or "memory://"
+        RATELIMIT_DEFAULT = "1000000 per hour"
+        AVAILABILITY_RATE_LIMIT = "1000000 per hour"
+
+    client = create_app(BenchConfig).test_client()
+    client.get("/api/check-availability?username=warmup")
+    start = time.perf_counter()
+    for i in range(requests):
+        assert client.get(f"/api/check-availability?username=user{i}").status_code == 200
+    return (time.perf_counter() - start) / requests
+
+
+def _worker(url, hits, limit):
+    storage = storage_from_string(url)
+    limiter = FixedWindowRateLimiter(storage)
+    item = parse(f"{limit} per hour")
+    return sum(limiter.hit(item, "shared-key") for _ in range(hits))
+
+
+def allowed_across_processes(url, workers, per_worker, limit):
+    with multiprocessing.get_context("fork").Pool(workers) as pool:
+        return sum(pool.starmap(_worker, [(url, per_worker, limit)] * workers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--per-worker", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=60)
+    parser.add_argument("--resp-url", help="resp://host:port/db of a Redis-protocol server to include")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="ratelimit-bench-")
+    storages = {"memory": "memory://", "sqlite": f"sqlite:///{os.path.join(tmpdir, 'limits.db')}"}
+    if args.resp_url:
+        storages["resp"] = args.resp_url
+
+    baseline = request_cost(None, args.requests)
+    print(f"{'storage':<8} {'hit (us)':>10} {'request (us)':>13} {'overhead (us)':>14} {'allowed':>12}")
+    print(f"{'off':<8} {'-':>10} {baseline * 1e6:>13.1f} {'-':>14} {'-':>12}")
+    for name, url in storages.items():
+        hit = storage_hit_cost(url, args.requests)
+        request = request_cost(url, args.requests)
+        allowed = allowed_across_processes(url, args.workers, args.per_worker, args.limit)
+        print(f"{name:<8} {hit * 1e6:>10.1f} {request * 1e6:>13.1f} {(request - baseline) * 1e6:>14.1f} "
+              f"{allowed:>5}/{args.limit:<6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Seed a database file with users whose referral counts follow a power law.
+
+    python -m benchmarks.seed --db /tmp/vomychat-bench.db [--users 1000000] [--referred 0.7] [--attachment 0.9]
+
+Each new user is referred with probability ``referred``. Their referrer is
+chosen by preferential attachment: with probability ``attachment`` an
+earlier referral's referrer (so users who already refer many attract more),
+otherwise any earlier user. Referral counts then follow a power law with
+exponent ``1 + 1 / attachment``: most users refer no one and a few
+super-referrers have tens of thousands of referrals at a million users.
+
+Users are ``user<id>`` / ``user<id>@bench.example`` with password
+``Password123``. Rows are bulk-inserted, each referral with a
+``reward_outbox`` row, then the closure table, rewards, counters, rollups
+and leaderboard are derived with the app's own rebuild jobs and reward
+engine.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import bcrypt  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.models import db, User, Referral, RewardOutbox  # noqa: E402
+from app.services.leaderboard_service import rebuild_leaderboard  # noqa: E402
+from app.services.referral_service import reconcile_referral_counters  # noqa: E402
+from app.services.reward_service import rewards  # noqa: E402
+from app.services.referral_tree_service import rebuild_referral_tree  # noqa: E402
+from app.services.rollup_service import backfill_referral_rollups  # noqa: E402
+
+PASSWORD = "Password123"
+CHUNK = 20000
+REWARD_BATCH = 5000  # outbox rows per reward engine batch while seeding
+
+
+def bench_config(path, **overrides):
+    """Config for a benchmark app on the given database file"""
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.abspath(path)}",
+        'RATELIMIT_ENABLED': False,
+        'MAIL_DELIVERY_MODE': "sync",
+        'MAIL_SUPPRESS_SEND': True,
+        # No background threads: their queries would land in load.py's per-request counts
+        'REWARD_PROCESSING_MODE': "sync",
+        'AVAILABILITY_FILTER_LOAD': "sync",
+        'SWEEP_INTERVAL': 0,
+        **overrides
+    }
+    return type('BenchConfig', (Config,), settings)
+
+
+def power_law_referrers(users, referred, attachment, rng):
+    """Yield (user_id, referrer_id or None) for ids 1..users"""
+    referrers = []  # One entry per referral made, so picking from it favours big referrers
+    for user_id in range(1, users + 1):
+        referrer_id = None
+        if user_id > 1 and rng.random() < referred:
+            if referrers and rng.random() < attachment:
+                referrer_id = rng.choice(referrers)
+            else:
+                referrer_id = rng.randrange(1, user_id)
+            referrers.append(referrer_id)
+        yield user_id, referrer_id
+
+
+def seed(path, users, referred=0.7, attachment=0.9, days=90, rounds=None, seed_value=42, log=print):
+    """Create and fill the database at path; returns the app bound to it"""
+    for stale in (path, f"{path}-wal", f"{path}-shm"):
+        if os.path.exists(stale):
+            os.remove(stale)
+    app = create_app(bench_config(path, REWARD_BATCH_SIZE=REWARD_BATCH))
+    rng = random.Random(seed_value)
+    rounds = rounds or app.config['BCRYPT_LOG_ROUNDS']
+    password = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+    now = datetime.utcnow()
+    started = time.perf_counter()
+
+    with app.app_context():
+        user_rows, referral_rows, outbox_rows = [], [], []
+
+        def flush():
+            if not user_rows:
+                return
+            db.session.execute(User.__table__.insert(), user_rows)
+            if referral_rows:
+                db.session.execute(Referral.__table__.insert(), referral_rows)
+                db.session.execute(RewardOutbox.__table__.insert(), outbox_rows)
+            db.session.commit()
+            user_rows.clear()
+            referral_rows.clear()
+            outbox_rows.clear()
+
+        referral_id = 0
+        referral_counts = Counter()
+        for user_id, referrer_id in power_law_referrers(users, referred, attachment, rng):
+            # Later ids joined later, spread over the last ``days`` days
+            joined = now - timedelta(days=days * (1 - user_id / users), seconds=rng.randrange(3600))
+            user_rows.append({
+                'id': user_id,
+                'username': f"user{user_id}",
+                'email': f"user{user_id}@bench.example",
+                'password': password,
+                'referred_by_id': referrer_id,
+                'created_at': joined
+            })
+            if referrer_id is not None:
+                referral_id += 1
+                referral_counts[referrer_id] += 1
+                referral_rows.append({
+                    'id': referral_id,
+                    'referrer_id': referrer_id,
+                    'referred_user_id': user_id,
+                    'date_referred': joined,
+                    'status': 'successful',
+                    'ordinal': referral_counts[referrer_id]
+                })
+                outbox_rows.append({'referral_id': referral_id, 'attempts': 0, 'available_at': joined})
+            if len(user_rows) >= CHUNK:
+                flush()
+                log(f"  {user_id:,} users ({time.perf_counter() - started:.0f}s)")
+        flush()
+
+        log(f"Rebuilding referral tree, rewards, counters, rollups and leaderboard ({referral_id:,} referrals)")
+        # The upline rule reads the tree, and the counters are then rebuilt from every reward row
+        closure_rows = rebuild_referral_tree()
+        rewards.run_until_empty()
+        reconcile_referral_counters()
+        backfill_referral_rollups()
+        rebuild_leaderboard()
+        db.session.execute(db.text("ANALYZE"))
+        db.session.commit()
+        db.session.remove()
+        db.engine.dispose()
+
+    log(f"Seeded {users:,} users, {referral_id:,} referrals and {closure_rows:,} closure rows "
+        f"in {time.perf_counter() - started:.0f}s")
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", required=True, help="Database file to create (replaced if it exists)")
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--referred", type=float, default=0.7, help="Share of users who joined through a referral")
+    parser.add_argument("--attachment", type=float, default=0.9, help="Preferential-attachment probability")
+    parser.add_argument("--bcrypt-rounds", type=int, help="Work factor of the shared password hash")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    seed(args.db, args.users, args.referred, args.attachment, rounds=args.bcrypt_rounds, seed_value=args.seed)
+
+
+if __name__ == "__main__":
+    main()
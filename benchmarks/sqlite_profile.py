@@ -0,0 +1,112 @@
+"""SQLite profile benchmark: throughput and lock errors of concurrent workers on one database file.
+
+    python -m benchmarks.sqlite_profile [--workers 8] [--seconds 10]
+
+For each of the ``default`` and ``tuned`` SQLite profiles, ``workers``
+forked processes (standing in for gunicorn workers) share a fresh database
+file. For ``seconds`` each one repeats a mix of requests: register a user
+under a shared referrer, log them in, then read the referrer's stats and
+referrals. It reports requests per second, the 95th-percentile latency,
+how many requests failed with "database is locked" and how many returned
+another error status.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.models import db  # noqa: E402
+from app.services.auth_service import register_user  # noqa: E402
+
+
+def bench_config(path, profile):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{path}"
+        SQLITE_PROFILE = profile
+        RATELIMIT_ENABLED = False
+        PROPAGATE_EXCEPTIONS = True
+        BCRYPT_LOG_ROUNDS = 4
+        MAIL_DELIVERY_MODE = "sync"
+        MAIL_SUPPRESS_SEND = True
+        CACHE_BACKEND = "null"
+        SWEEP_INTERVAL = 0
+    return BenchConfig
+
+
+def _worker(path, profile, worker, seconds, start_at):
+    client = create_app(bench_config(path, profile)).test_client()
+    login = client.post("/api/login", json={"username_or_email": "referrer", "password": "Password123"})
+    headers = {"Authorization": f"Bearer {login.get_json()['access_token']}"}
+    code = client.get("/api/me", headers=headers).get_json()["user"]["referral_code"]
+
+    time.sleep(max(0.0, start_at - time.time()))
+    deadline = time.time() + seconds
+    latencies = []
+    locked = failed = i = 0
+    while time.time() < deadline:
+        username = f"w{worker}u{i}"
+        i += 1
+        calls = [
+            lambda: client.post("/api/register", json={
+                "username": username, "email": f"{username}@example.com",
+                "password": "Password123", "referral_code": code}),
+            lambda: client.post("/api/login", json={"username_or_email": username, "password": "Password123"}),
+            lambda: client.get("/api/referral-stats", headers=headers),
+            lambda: client.get("/api/referrals?limit=20", headers=headers),
+        ]
+        for call in calls:
+            started = time.perf_counter()
+            try:
+                failed += call().status_code >= 400
+            except OperationalError as e:
+                if "database is locked" not in str(e):
+                    raise
+                locked += 1
+            latencies.append(time.perf_counter() - started)
+    return latencies, locked, failed
+
+
+def run(profile, workers, seconds):
+    path = os.path.join(tempfile.mkdtemp(prefix="sqlite-bench-"), "app.db")
+    app = create_app(bench_config(path, profile))
+    with app.app_context():
+        register_user("referrer", "referrer@example.com", "Password123")
+        db.session.remove()
+        db.engine.dispose()
+
+    start_at = time.time() + 2  # Let every worker finish its setup first
+    with multiprocessing.get_context("fork").Pool(workers) as pool:
+        results = pool.starmap(_worker, [(path, profile, w, seconds, start_at) for w in range(workers)])
+    latencies = sorted(latency for worker_latencies, _, _ in results for latency in worker_latencies)
+    return {
+        'requests': len(latencies),
+        'throughput': len(latencies) / seconds,
+        'p95': latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+        'locked': sum(locked for _, locked, _ in results),
+        'failed': sum(failed for _, _, failed in results)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"{'profile':<8} {'req/s':>8} {'p95 (ms)':>9} {'requests':>9} {'locked':>7} {'failed':>7}")
+    for profile in ("default", "tuned"):
+        result = run(profile, args.workers, args.seconds)
+        print(f"{profile:<8} {result['throughput']:>8.1f} {result['p95'] * 1e3:>9.1f} {result['requests']:>9} "
+              f"{result['locked']:>7} {result['failed']:>7}")
+
+
+if __name__ == "__main__":
+    main()
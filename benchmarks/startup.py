@@ -0,0 +1,86 @@
+"""Startup benchmark: import time, create_app time and first-request latency against budgets.
+
+    python -m benchmarks.startup [--runs 5] [--import-budget-ms 1500] [--boot-budget-ms 100]
+        [--first-request-budget-ms 250]
+
+Each run is a fresh interpreter, as a new worker would be. It imports the
+``app`` package, calls ``create_app`` on a database file and serves one
+GET /api/leaderboard through a test client. ``first boot`` starts from an
+empty file, so it pays for creating the schema; ``boot`` reuses the file,
+which is the common case of a worker restart or an autoscaled instance
+joining. Medians are compared with the budgets; exceeding any of them fails
+the run (exit status 1).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+from benchmarks.seed import bench_config
+application = app.create_app(bench_config(sys.argv[1]))
+booted = time.perf_counter()
+assert application.test_client().get("/api/leaderboard").status_code == 200
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1e3,
+    'boot_ms': (booted - imported) * 1e3,
+    'first_request_ms': (served - booted) * 1e3
+}))
+"""
+
+
+def probe(path):
+    output = subprocess.run([sys.executable, "-c", PROBE, path], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget-ms", type=float, default=1500)
+    parser.add_argument("--boot-budget-ms", type=float, default=100)
+    parser.add_argument("--first-request-budget-ms", type=float, default=250)
+    args = parser.parse_args()
+
+    cold, warm = [], []
+    with tempfile.TemporaryDirectory() as directory:
+        for run in range(args.runs):
+            path = os.path.join(directory, f"startup-{run}.db")
+            cold.append(probe(path))
+            warm.append(probe(path))
+
+    budgets = {
+        'import_ms': args.import_budget_ms,
+        'boot_ms': args.boot_budget_ms,
+        'first_request_ms': args.first_request_budget_ms
+    }
+    print(f"{'':<12} {'import (ms)':>12} {'boot (ms)':>10} {'first request (ms)':>19}")
+    medians = {}
+    for label, runs in (("first boot", cold), ("boot", warm)):
+        medians[label] = {key: statistics.median(run[key] for run in runs) for key in budgets}
+        m = medians[label]
+        print(f"{label:<12} {m['import_ms']:>12.1f} {m['boot_ms']:>10.1f} {m['first_request_ms']:>19.1f}")
+    print(f"{'budget':<12} {budgets['import_ms']:>12.1f} {budgets['boot_ms']:>10.1f} "
+          f"{budgets['first_request_ms']:>19.1f}")
+
+    over = [f"{key} {medians['boot'][key]:.1f} ms > {budget:.1f} ms"
+            for key, budget in budgets.items() if medians['boot'][key] > budget]
+    for line in over:
+        print(f"OVER BUDGET {line}")
+    if over:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
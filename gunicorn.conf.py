@@ -0,0 +1,57 @@
+# gunicorn.conf.py
+import glob
+import os
+import shutil
+import tempfile
+
+# gunicorn -c gunicorn.conf.py run:app
+bind = os.environ.get("BIND") or "0.0.0.0:8000"
+workers = int(os.environ.get("WEB_CONCURRENCY") or 2)
+
+# Requests spend their time waiting on the database, the bcrypt pool or the
+# mail queue, all of which release the GIL, so one process serves many at once
+worker_class = "gthread"
+threads = int(os.environ.get("WEB_THREADS") or 64)
+
+# Import the app and bootstrap the schema once in the master, then fork the
+# workers from it: they share the imported code and skip the startup work
+preload_app = (os.environ.get("PRELOAD_APP") or "True") == "True"
+
+# Each worker counts its own metrics; a scrape reaches one worker, so they
+# share snapshots through METRICS_DIR. Default it to a directory of this
+# master's own, which the app reads from the environment as it is imported
+_default_metrics_dir = os.path.join(tempfile.gettempdir(), f"referral-metrics-{os.getpid()}")
+metrics_dir = os.environ.setdefault("METRICS_DIR", _default_metrics_dir)
+
+
+def on_starting(server):
+    # Start from empty: snapshots left by an earlier run would be summed into this one
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, "metrics-*.json")):
+        os.remove(path)
+
+
+def post_fork(server, worker):
+    # Pooled connections the master opened while bootstrapping belong to it;
+    # drop them without closing so each worker opens its own
+    if server.cfg.preload_app:
+        from app.models import db
+        db.get_engine(worker.app.wsgi()).dispose(close=False)
+
+
+def post_worker_init(worker):
+    # Load the availability filter while the worker starts, not in its first signup or check
+    from app.services.availability_service import availability
+    availability.warm(worker.wsgi)
+
+
+def when_ready(server):
+    # Configure the ORM mappers in the master too (~15 ms), rather than on each worker's first request
+    if server.cfg.preload_app:
+        from sqlalchemy.orm import configure_mappers
+        configure_mappers()
+
+
+def on_exit(server):
+    if metrics_dir == _default_metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
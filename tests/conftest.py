@@ -1,25 +1,32 @@
 import sys
 import os
+import threading
+from contextlib import contextmanager
 
 # Add the project root directory to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app import create_app, db
+from app.config import Config
 import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+    JWT_SECRET_KEY = "test-secret-key"
+    MAIL_SUPPRESS_SEND = True
+    MAIL_DELIVERY_MODE = "sync"
+    REWARD_PROCESSING_MODE = "sync"
+    AVAILABILITY_FILTER_LOAD = "sync"
+    BCRYPT_LOG_ROUNDS = 4
 
 @pytest.fixture
 def app():
     """Create and configure a new app instance for testing"""
-    app = create_app()
-    app.config.update({
-        "TESTING": True,
-        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
-        "JWT_SECRET_KEY": "test-secret-key",
-        "MAIL_SUPPRESS_SEND": True
-    })
-    
-    with app.app_context():
-        db.create_all()
+    # Configured before create_app so the schema is bootstrapped once, in memory, not in app.db
+    app = create_app(TestConfig)
     
     yield app  # Provide the app instance for tests
     
@@ -28,7 +35,66 @@ def app():
         db.session.remove()
         db.drop_all()
 
+@pytest.fixture
+def file_config(tmp_path):
+    """A factory for TestConfigs on the SQLite file <name>.db in tmp_path, which other threads and processes can open"""
+    def make(name, **settings):
+        return type(f"{name.title()}Config", (TestConfig,), {
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / f'{name}.db'}",
+            "SWEEP_INTERVAL": 0,
+            **settings
+        })
+    return make
+
+@pytest.fixture
+def file_app(file_config):
+    """A factory for apps on file_config databases; their connections are closed after the test"""
+    apps = []
+    def make(name="app", **settings):
+        app = create_app(file_config(name, **settings))
+        apps.append(app)
+        return app
+    
+    yield make
+    
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+@pytest.fixture
+def capture_statements():
+    """A context manager collecting the SQL run while its block executes.
+
+    ``capture_statements(app)`` watches the app's engine, and with no app
+    every engine; only the calling thread's statements are kept unless
+    ``all_threads``.
+    """
+    @contextmanager
+    def capture(app=None, all_threads=False):
+        statements = []
+        caller = threading.get_ident()
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if all_threads or threading.get_ident() == caller:
+                statements.append(statement)
+        # Without pushing a context, which would end the caller's session on the way out
+        target = Engine if app is None else db.get_engine(app)
+        event.listen(target, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(target, "before_cursor_execute", record)
+    return capture
+
 @pytest.fixture
 def client(app):
     """A test client for the app"""
     return app.test_client()
+
+@pytest.fixture
+def resp_server():
+    """A local Redis-protocol stand-in for the shared cache and rate limiter"""
+    from resp_server import RespStandIn
+    server = RespStandIn().start()
+    yield server
+    server.stop()
@@ -0,0 +1,110 @@
+"""A tiny in-memory Redis-protocol server standing in for Redis in tests"""
+import socketserver
+import threading
+import time
+
+OK = ("+", "OK")
+PONG = ("+", "PONG")
+
+
+class RespStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), RespHandler)
+        self.data = {}
+        self.expires = {}
+        self.lock = threading.Lock()
+        self.commands = 0
+
+    @property
+    def url(self):
+        return f"redis://127.0.0.1:{self.server_address[1]}/0"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def _alive(self, key):
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def run(self, name, args):
+        with self.lock:
+            self.commands += 1
+            if name == "PING":
+                return PONG
+            if name == "GET":
+                return self.data[args[0]] if self._alive(args[0]) else None
+            if name == "SET":
+                key, value, options = args[0], args[1], [a.upper() for a in args[2:]]
+                if "NX" in options and self._alive(key):
+                    return None
+                self.data[key] = value
+                self.expires.pop(key, None)
+                for flag, scale in (("EX", 1), ("PX", 0.001)):
+                    if flag in options:
+                        self.expires[key] = time.time() + int(args[2 + options.index(flag) + 1]) * scale
+                return OK
+            if name == "DEL":
+                removed = sum(1 for key in args if self._alive(key))
+                for key in args:
+                    self.data.pop(key, None)
+                    self.expires.pop(key, None)
+                return removed
+            if name in ("INCR", "INCRBY"):
+                key = args[0]
+                value = int(self.data[key]) if self._alive(key) else 0
+                value += int(args[1]) if name == "INCRBY" else 1
+                self.data[key] = str(value)
+                return value
+            if name in ("EXPIRE", "PEXPIRE"):
+                if not self._alive(args[0]):
+                    return 0
+                scale = 1 if name == "EXPIRE" else 0.001
+                self.expires[args[0]] = time.time() + int(args[1]) * scale
+                return 1
+            if name == "PTTL":
+                if not self._alive(args[0]):
+                    return -2
+                expires_at = self.expires.get(args[0])
+                return -1 if expires_at is None else int((expires_at - time.time()) * 1000)
+            if name == "FLUSHDB":
+                self.data.clear()
+                self.expires.clear()
+                return OK
+            return ("-", f"ERR unknown command '{name}'")
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            count = int(line[1:-2])
+            args = []
+            for _ in range(count):
+                length = int(self.rfile.readline()[1:-2])
+                args.append(self.rfile.read(length + 2)[:-2])
+            name, args = args[0].decode().upper(), [a.decode() for a in args[1:]]
+            self.wfile.write(encode(self.server.run(name, args)))
+
+
+def encode(reply):
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, tuple):
+        return f"{reply[0]}{reply[1]}\r\n".encode()
+    reply = reply.encode()
+    return b"$%d\r\n%s\r\n" % (len(reply), reply)
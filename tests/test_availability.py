@@ -0,0 +1,155 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app.models import db
+from app.services.auth_service import register_user
+from app.services.availability_service import AvailabilityFilter, availability
+from app.utils.bloom import BloomFilter
+
+
+def test_bloom_filter_sizing_and_snapshot_round_trip():
+    """Test filter sizing, membership and serialization."""
+    bloom = BloomFilter.for_capacity(1000, 0.01)
+    assert bloom.num_hashes == 7
+    assert 1150 < bloom.memory_bytes < 1250
+
+    for i in range(1000):
+        bloom.add(f"user{i}")
+    assert all(f"user{i}" in bloom for i in range(1000))
+    false_positives = sum(f"other{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+    restored, extra = BloomFilter.from_bytes(bloom.to_bytes(42))
+    assert extra == 42
+    assert restored.count == 1000
+    assert all(f"user{i}" in restored for i in range(1000))
+
+
+def test_check_availability_skips_the_database_for_unseen_names(app, client, capture_statements):
+    """Test that definite misses are answered without a users query."""
+    with app.app_context():
+        register_user("taken", "taken@example.com", "Password123")
+
+    assert client.get("/api/check-availability?username=warmup").status_code == 200
+    with capture_statements(app) as statements:
+        response = client.get("/api/check-availability?username=fresh&email=fresh@example.com")
+        data = response.get_json()
+        assert data["username"]["available"] is True
+        assert data["email"]["available"] is True
+        assert statements == []
+
+        response = client.get("/api/check-availability?username=Taken&email=taken@example.com")
+        data = response.get_json()
+        assert data["username"]["available"] is True  # Matches the filter, but usernames are case-sensitive
+        assert data["email"]["available"] is False
+        assert len(statements) == 1
+
+    assert client.get("/api/check-availability").status_code == 400
+
+
+def test_registration_updates_the_filter_and_reuses_the_check(app, client):
+    """Test that new users become visible to the filter and duplicates are still rejected."""
+    assert client.get("/api/check-availability?username=newbie").get_json()["username"]["available"] is True
+
+    response = client.post("/api/register", json={
+        "username": "newbie",
+        "email": "newbie@example.com",
+        "password": "Password123"
+    })
+    assert response.status_code == 201
+    assert client.get("/api/check-availability?username=newbie").get_json()["username"]["available"] is False
+
+    response = client.post("/api/register", json={
+        "username": "newbie",
+        "email": "other@example.com",
+        "password": "Password123"
+    })
+    assert response.status_code == 400
+    assert "username" in response.get_json()["errors"]
+    assert availability.stats()["possible_hits"] >= 2
+
+
+def test_filter_picks_up_users_from_other_workers(app, tmp_path):
+    """Test the snapshot load and the id-range refresh for users added elsewhere."""
+    snapshot = tmp_path / "availability.bloom"
+    app.config.update({"AVAILABILITY_FILTER_PATH": str(snapshot), "AVAILABILITY_FILTER_REFRESH_SECONDS": 0})
+    with app.app_context():
+        register_user("first", "first@example.com", "Password123")
+        availability.rebuild(str(snapshot))
+        assert availability.find_taken("first") == {"username": "Username is already taken"}
+
+        # Simulate another worker committing a user this worker never saw
+        db.session.execute(db.text(
+            "INSERT INTO users (username, email, password, referral_code, created_at) "
+            "VALUES ('second', 'second@example.com', 'x', 'abcdefgh', CURRENT_TIMESTAMP)"
+        ))
+        db.session.commit()
+        assert availability.find_taken(email="second@example.com") == {"email": "Email is already registered"}
+
+
+def test_cold_filter_is_built_once(file_app, capture_statements, monkeypatch):
+    """Test that concurrent first checks wait for one load instead of each scanning the users table."""
+    app = file_app("availability")
+    build = AvailabilityFilter._build
+    def slow_build(self):
+        time.sleep(0.05)  # Long enough for every thread to arrive while the first one loads
+        return build(self)
+    monkeypatch.setattr(AvailabilityFilter, "_build", slow_build)
+    with app.app_context():
+        register_user("crowd", "crowd@example.com", "Password123")
+        availability.invalidate()
+        db.session.remove()
+
+    def check():
+        with app.app_context():
+            assert availability.find_taken("crowd") == {"username": "Username is already taken"}
+            db.session.remove()
+
+    with capture_statements(app, all_threads=True) as statements:
+        threads = [threading.Thread(target=check) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert sum("count(users.id)" in statement for statement in statements) == 1
+
+
+def test_background_load_keeps_the_scan_off_the_request_path(file_app, capture_statements):
+    """Test that a fresh worker's first signup queries once while the filter loads in a thread."""
+    app = file_app("availability", AVAILABILITY_FILTER_LOAD="background")
+    client = app.test_client()
+    with capture_statements(app) as statements:
+        response = client.post("/api/register", json={
+            "username": "early", "email": "early@example.com", "password": "Password123"
+        })
+    assert response.status_code == 201
+
+    deadline = time.monotonic() + 5
+    while not availability.stats()["loaded"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert availability.stats()["loaded"]
+    # The full scan ran on the loader thread; the request only made its combined check
+    assert not any("count(users.id)" in statement for statement in statements)
+    assert client.get("/api/check-availability?username=early").get_json()["username"]["available"] is False
+    with capture_statements(app) as statements:
+        assert client.get("/api/check-availability?username=later").get_json()["username"]["available"] is True
+    assert statements == []
+
+
+def test_late_commit_below_the_watermark_is_seen(app):
+    """Test that a user with a lower id, committed after a refresh saw a higher one, still reaches the filter."""
+    app.config["AVAILABILITY_FILTER_REFRESH_SECONDS"] = 0
+    insert = db.text("INSERT INTO users (id, username, email, password, created_at) VALUES (:id, :name, :email, 'x', :at)")
+    with app.app_context():
+        register_user("prompt", "prompt@example.com", "Password123")
+        db.session.execute(insert, {"id": 50, "name": "ahead", "email": "ahead@example.com", "at": datetime.utcnow()})
+        db.session.commit()
+        assert availability.find_taken("ahead")
+        assert availability.find_taken("straggler") == {}
+
+        # Given its id and stamped before the refresh above, as by a transaction that was slow to commit
+        db.session.execute(insert, {"id": 10, "name": "straggler", "email": "straggler@example.com",
+                                    "at": datetime.utcnow() - timedelta(seconds=10)})
+        db.session.commit()
+        assert availability.find_taken("straggler") == {"username": "Username is already taken"}
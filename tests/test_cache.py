@@ -0,0 +1,92 @@
+import pytest
+
+from app.models import db
+from app.services.auth_service import register_user
+from app.services.cache import cache, MemoryBackend
+
+
+def use_backend(app, backend, **config):
+    app.config.update({"CACHE_BACKEND": backend, **config})
+    cache.init_app(app)
+
+
+def login(client, username):
+    token = client.post("/api/login", json={
+        "username_or_email": username,
+        "password": "Password123"
+    }).get_json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.mark.parametrize("backend", ["memory", "redis"])
+def test_reads_are_cached_until_a_referral_commits(app, client, resp_server, backend):
+    """Test read-through caching and invalidation fired by create_referral."""
+    # Without profile claims in the token, /api/me reads through the cache too
+    use_backend(app, backend, CACHE_REDIS_URL=resp_server.url, JWT_PROFILE_CLAIMS=False)
+    with app.app_context():
+        owner = register_user("owner", "owner@example.com", "Password123")
+        code = owner.referral_code
+    headers = login(client, "owner")
+
+    for _ in range(2):
+        assert client.get("/api/referral-stats", headers=headers).get_json()["stats"]["total_referrals"] == 0
+        assert client.get("/api/referrals", headers=headers).get_json()["referrals"] == []
+        assert client.get("/api/me", headers=headers).get_json()["user"]["username"] == "owner"
+    assert cache.stats()["misses"] == 3
+    assert cache.stats()["hits"] == 3
+
+    with app.app_context():
+        register_user("guest", "guest@example.com", "Password123", code)
+
+    assert client.get("/api/referral-stats", headers=headers).get_json()["stats"]["total_referrals"] == 1
+    referrals = client.get("/api/referrals", headers=headers).get_json()["referrals"]
+    assert [r["referred_user"]["username"] for r in referrals] == ["guest"]
+    if backend == "redis":
+        assert resp_server.commands > 0
+
+
+def test_no_stale_read_when_write_commits_during_load(app):
+    """Test that a value loaded before a concurrent commit is never served afterwards."""
+    use_backend(app, "memory")
+    calls = []
+
+    def load_then_concurrent_write():
+        calls.append(1)
+        value = {"version": len(calls)}
+        if len(calls) == 1:
+            # Another request commits an invalidating write mid-load
+            cache.invalidate_user(42)
+            db.session.commit()
+        return value
+
+    with app.app_context():
+        assert cache.cached("stats", 42, load_then_concurrent_write) == {"version": 1}
+        assert cache.cached("stats", 42, load_then_concurrent_write) == {"version": 2}
+        assert cache.cached("stats", 42, load_then_concurrent_write) == {"version": 2}
+
+
+def test_rolled_back_invalidation_is_discarded(app):
+    """Test that invalidation hooks only fire for committed transactions."""
+    use_backend(app, "memory")
+    with app.app_context():
+        generation = cache.generation(7)
+        cache.invalidate_user(7)
+        db.session.rollback()
+        assert cache.generation(7) == generation
+
+        cache.invalidate_user(7)
+        db.session.commit()
+        assert cache.generation(7) != generation
+
+
+def test_memory_backend_evicts_least_recently_used():
+    """Test LRU eviction and the eviction counter."""
+    backend = MemoryBackend(max_entries=2)
+    backend.set("a", "1")
+    backend.set("b", "2")
+    backend.get("a")
+    backend.set("c", "3")
+
+    assert backend.get("b") is None
+    assert backend.get("a") == "1"
+    assert backend.evictions == 1
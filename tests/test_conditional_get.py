@@ -0,0 +1,87 @@
+import pytest
+
+from app.routes import referrals
+from app.services.auth_service import register_user, create_user_token
+from app.services.cache import cache
+from app.utils import responses
+
+
+@pytest.fixture
+def owner(app):
+    """A referrer with one referral, and the headers to call the API as them"""
+    with app.app_context():
+        user = register_user("tagged", "tagged@example.com", "Password123")
+        register_user("tagged_friend", "tagged_friend@example.com", "Password123", user.referral_code)
+        return user.referral_code, {"Authorization": f"Bearer {create_user_token(user)}"}
+
+
+@pytest.mark.parametrize("path", ["/api/referral-stats", "/api/referrals?limit=10", "/api/rewards"])
+def test_unchanged_reads_answer_304_from_the_counters_row(app, client, owner, monkeypatch, capture_statements, path):
+    """Test that a matching If-None-Match gets an empty 304 after one primary-key read."""
+    _, headers = owner
+    first = client.get(path, headers=headers)
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "private, no-cache"
+    etag = first.headers["ETag"]
+
+    # The body is never built on a match
+    for name in ("get_referral_stats", "get_referrals_page", "get_reward_balance"):
+        monkeypatch.setattr(referrals, name, lambda *args, **kwargs: pytest.fail("body was built"))
+    with capture_statements(app) as statements:
+        second = client.get(path, headers={**headers, "If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.data == b""
+    assert second.headers["ETag"] == etag
+    assert len(statements) == 1
+    assert "FROM referral_counters" in statements[0]
+
+
+def test_new_referral_changes_the_etag(app, client, owner):
+    """Test that a referral committed since the last poll gets the client a fresh body."""
+    code, headers = owner
+    etag = client.get("/api/referral-stats", headers=headers).headers["ETag"]
+    with app.app_context():
+        register_user("tagged_second", "tagged_second@example.com", "Password123", code)
+
+    response = client.get("/api/referral-stats", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.get_json()["stats"]["total_referrals"] == 2
+    assert response.get_json()["stats"]["reward_amount"] == 20.0
+
+
+def test_etag_uses_the_cache_generation_without_queries(app, client, owner, capture_statements):
+    """Test that with a cache the 304 path runs no SQL at all."""
+    _, headers = owner
+    app.config["CACHE_BACKEND"] = "memory"
+    cache.init_app(app)
+
+    etag = client.get("/api/referral-stats", headers=headers).headers["ETag"]
+    with capture_statements(app) as statements:
+        response = client.get("/api/referral-stats", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert statements == []
+
+
+def test_pages_and_profile_have_their_own_etags(client, owner):
+    """Test that the page size is part of the referrals ETag and /api/me answers 304 too."""
+    _, headers = owner
+    ten = client.get("/api/referrals?limit=10", headers=headers).headers["ETag"]
+    one = client.get("/api/referrals?limit=1", headers=headers).headers["ETag"]
+    assert ten != one
+
+    me = client.get("/api/me", headers=headers)
+    assert me.get_json()["user"]["username"] == "tagged"
+    assert client.get("/api/me", headers={**headers, "If-None-Match": me.headers["ETag"]}).status_code == 304
+
+
+def test_fallback_encoder_matches_orjson(client, owner, monkeypatch):
+    """Test that responses decode the same with and without orjson installed."""
+    _, headers = owner
+    fast = client.get("/api/referrals", headers=headers)
+    monkeypatch.setattr(responses, "orjson", None)
+    plain = client.get("/api/referrals", headers=headers)
+
+    assert fast.get_json() == plain.get_json()
+    assert fast.headers["ETag"] == plain.headers["ETag"]
+    assert fast.get_json()["referrals"][0]["referred_user"]["username"] == "tagged_friend"
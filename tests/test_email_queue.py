@@ -0,0 +1,85 @@
+from app import mail
+from app.services.email_queue import EmailQueue
+
+
+class FakeConnection:
+    """Stands in for a Flask-Mail SMTP connection"""
+
+    def __init__(self, log, fail_first=False):
+        self.log = log
+        self.fail_first = fail_first
+
+    def send(self, msg):
+        if self.fail_first:
+            self.fail_first = False
+            raise OSError("connection reset")
+        self.log.append(msg.recipients[0])
+
+    def __exit__(self, *exc):
+        pass
+
+
+def test_forgot_password_delivers_in_sync_mode(client):
+    """Test that sync mode sends the reset email before the request returns."""
+    client.post("/api/register", json={
+        "username": "mailuser",
+        "email": "mail@example.com",
+        "password": "Password123"
+    })
+    with mail.record_messages() as outbox:
+        response = client.post("/api/forgot-password", json={"email": "mail@example.com"})
+
+    assert response.status_code == 200
+    assert len(outbox) == 1
+    assert outbox[0].subject == "Password Reset"
+    assert outbox[0].recipients == ["mail@example.com"]
+
+
+def test_background_queue_reuses_connection_and_retries(app, monkeypatch):
+    """Test that queued mail is batched over pooled connections and retried after a failure."""
+    app.config.update({
+        "MAIL_DELIVERY_MODE": "background",
+        "MAIL_SUPPRESS_SEND": False,
+        "MAIL_QUEUE_WORKERS": 1,
+        "MAIL_RETRY_BACKOFF": 0.01
+    })
+    delivered, opened = [], []
+
+    def fake_open(self):
+        opened.append(1)
+        return FakeConnection(delivered, fail_first=len(opened) == 1)
+
+    monkeypatch.setattr(EmailQueue, "_open", fake_open)
+    queue = EmailQueue(app)
+
+    with app.app_context():
+        for i in range(3):
+            queue.enqueue(f"user{i}@example.com", "Welcome", "emails/welcome.html", username=f"user{i}")
+        assert queue.flush(timeout=5)
+
+    stats = queue.stats()
+    queue.shutdown()
+
+    assert sorted(delivered) == [f"user{i}@example.com" for i in range(3)]
+    assert stats["sent"] == 3
+    assert stats["retried"] == 1
+    assert stats["queue_depth"] == 0
+    assert len(opened) == 2
+
+
+def test_queue_started_before_a_fork_counts_jobs_in_the_child(app, monkeypatch):
+    """Test that the first message after a fork is counted once, so flush returns."""
+    app.config.update({"MAIL_DELIVERY_MODE": "background", "MAIL_QUEUE_WORKERS": 1})
+    queue = EmailQueue(app)
+    # As inherited from a parent process that had started its workers
+    queue._workers = [object()]
+    queue._pid = -1
+
+    with app.app_context():
+        queue.enqueue("forked@example.com", "Welcome", "emails/welcome.html", username="forked")
+        assert queue.flush(timeout=5)
+
+    stats = queue.stats()
+    queue.shutdown()
+    assert stats["pending"] == 0
+    assert stats["sent"] == 1
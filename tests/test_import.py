@@ -0,0 +1,168 @@
+import io
+import json
+from datetime import datetime
+
+import bcrypt
+
+from app.models import db, User, LeaderboardEntry, Referral, ReferralClosure, ReferralCounter, ReferralRollup, Reward, RewardOutbox
+from app.services.auth_service import register_user
+from app.services.import_service import import_users
+from app.services.leaderboard_service import rebuild_leaderboard
+from app.services.referral_tree_service import rebuild_referral_tree
+from app.services.reward_service import get_reward_balance
+from app.services.rollup_service import get_referral_timeseries
+
+
+def ndjson(*records):
+    return io.StringIO("\n".join(json.dumps(record) for record in records) + "\n")
+
+
+def test_import_links_forward_references(app, client):
+    """Test NDJSON import with pre-hashed passwords and referrers later in the file."""
+    client.post("/api/register", json={
+        "username": "existing",
+        "email": "existing@example.com",
+        "password": "Password123"
+    })
+    with app.app_context():
+        existing = User.query.filter_by(username="existing").first()
+        existing_code = existing.referral_code
+        # History a full rollup rebuild would wipe, since no referral row backs it
+        db.session.add(ReferralRollup(referrer_id=existing.id, granularity="month",
+                                      bucket_start=datetime(2020, 1, 1).date(), count=5))
+        db.session.commit()
+
+    prehashed = bcrypt.hashpw(b"Password123", bcrypt.gensalt(4)).decode()
+    source = ndjson(
+        {"username": "alice", "email": "alice@example.com", "password": "Password123",
+         "referral_code": "ALICE001", "referred_by": "BOB00001"},
+        {"username": "carol", "email": "carol@example.com", "password_hash": prehashed,
+         "referred_by": existing_code},
+        {"username": "x", "email": "not-an-email", "password": "weak"},
+        {"username": "bob", "email": "bob@example.com", "password": "Password123",
+         "referral_code": "BOB00001"},
+    )
+
+    with app.app_context():
+        result = import_users(source, chunk_size=2)
+
+        assert result.rows == 4
+        assert result.users_created == 3
+        assert result.referrals_created == 2
+        assert result.skipped == 1 and result.errors[0]["line"] == 3
+
+        alice = User.query.filter_by(username="alice").first()
+        bob = User.query.filter_by(username="bob").first()
+        carol = User.query.filter_by(username="carol").first()
+        assert alice.referred_by_id == bob.id
+        assert carol.referred_by.username == "existing"
+        assert carol.verify_password("Password123")
+        assert Referral.query.count() == 2
+        assert Reward.query.count() == 2
+
+        # Counted in today's rollups as they were linked, next to the signup-time rows
+        today = datetime.utcnow().date()
+        for user_id, count in ((bob.id, 1), (carol.referred_by_id, 1), (ReferralRollup.PLATFORM, 2)):
+            assert get_referral_timeseries(user_id, "day", today, today)[0]["count"] == count
+        assert ReferralRollup.query.filter_by(granularity="month").one().count == 5
+
+
+
+def test_imported_referrals_are_rewarded_by_the_configured_rules(app):
+    """Test that imported referrals go through the outbox, with REWARD_RULES and the configured amounts."""
+    app.config.update(REWARD_RULES="flat,upline", REFERRAL_REWARD_AMOUNT=7.0, REWARD_UPLINE_AMOUNTS="2")
+    source = ndjson(
+        {"username": "cleo", "email": "cleo@example.com", "password": "Password123",
+         "referral_code": "CLEO0001", "referred_by": "BEN00001"},
+        {"username": "ben", "email": "ben@example.com", "password": "Password123",
+         "referral_code": "BEN00001", "referred_by": "ANN00001"},
+        {"username": "ann", "email": "ann@example.com", "password": "Password123",
+         "referral_code": "ANN00001"},
+    )
+
+    with app.app_context():
+        assert import_users(source, chunk_size=1).referrals_created == 2
+
+        balances = {user.username: get_reward_balance(user.id)["balance"] for user in User.query}
+        assert balances == {"ann": 9.0, "ben": 7.0, "cleo": 0.0}
+        assert RewardOutbox.query.count() == 0
+
+
+def test_import_cli_reads_csv(app, tmp_path):
+    """Test the flask import-users command with a CSV file."""
+    path = tmp_path / "users.csv"
+    path.write_text(
+        "username,email,password,referral_code,referred_by\n"
+        "dave,dave@example.com,Password123,DAVE0001,\n"
+        "erin,erin@example.com,Password123,,DAVE0001\n"
+        "dave,dave2@example.com,Password123,,\n"
+    )
+
+    result = app.test_cli_runner().invoke(args=["import-users", str(path)])
+
+    assert result.exit_code == 0, result.output
+    assert "Imported 2 users and 1 referrals from 3 rows" in result.output
+    assert "rows/sec" in result.output
+    with app.app_context():
+        assert User.query.filter_by(username="erin").first().referred_by.username == "dave"
+
+
+def test_admin_import_requires_admin(app, client):
+    """Test that only ADMIN_EMAILS users can call the import endpoint."""
+    client.post("/api/register", json={
+        "username": "admin",
+        "email": "admin@example.com",
+        "password": "Password123"
+    })
+    token = client.post("/api/login", json={
+        "username_or_email": "admin",
+        "password": "Password123"
+    }).get_json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    body = '{"username": "frank", "email": "frank@example.com", "password": "Password123"}\n'
+
+    response = client.post("/api/admin/import-users", data=body, headers=headers)
+    assert response.status_code == 403
+
+    app.config["ADMIN_EMAILS"] = ["admin@example.com"]
+    response = client.post("/api/admin/import-users?format=ndjson", data=body, headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()["result"]["users_created"] == 1
+
+
+def test_import_updates_derived_tables_without_rebuilding_them(app):
+    """Test that an import maintains counters, tree and leaderboard per chunk and leaves other users alone."""
+    with app.app_context():
+        outsider = register_user("outsider", "outsider@example.com", "Password123")
+        outsider_id, outsider_code = outsider.id, outsider.referral_code
+        # Drift a full reconcile would undo
+        ReferralCounter.query.filter_by(user_id=outsider_id).update({"reward_amount": 99.0})
+        db.session.commit()
+
+        source = ndjson(
+            {"username": "dana", "email": "dana@example.com", "password": "Password123", "referred_by": "ELI00001"},
+            {"username": "eli", "email": "eli@example.com", "password": "Password123",
+             "referral_code": "ELI00001", "referred_by": outsider_code},
+            {"username": "fay", "email": "fay@example.com", "password": "Password123", "referred_by": "ELI00001"},
+        )
+        assert import_users(source, chunk_size=1).referrals_created == 3
+
+        def snapshot():
+            return (
+                set(db.session.query(ReferralCounter.user_id, ReferralCounter.total_referrals,
+                                     ReferralCounter.successful_referrals)),
+                set(db.session.query(ReferralClosure.ancestor_id, ReferralClosure.descendant_id, ReferralClosure.depth)),
+                set(db.session.query(LeaderboardEntry.window, LeaderboardEntry.user_id, LeaderboardEntry.score)),
+            )
+
+        incremental = snapshot()
+        assert len(incremental[1]) == 5  # eli under outsider; dana and fay under eli and, two deep, outsider
+        assert db.session.get(ReferralCounter, outsider_id).reward_amount == 109.0
+        ordinals = {}
+        for referrer_id, ordinal in db.session.query(Referral.referrer_id, Referral.ordinal):
+            ordinals.setdefault(referrer_id, []).append(ordinal)
+        assert sorted(sorted(o) for o in ordinals.values()) == [[1], [1, 2]]
+
+        rebuild_referral_tree()
+        rebuild_leaderboard()
+        assert snapshot() == incremental
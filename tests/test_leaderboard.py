@@ -0,0 +1,66 @@
+from app.models import db, LeaderboardEntry
+from app.services.auth_service import register_user
+from app.services.leaderboard_service import TopN, leaderboard, rebuild_leaderboard
+
+
+def seed_referrals(app):
+    """alpha refers two users, beta refers one"""
+    with app.app_context():
+        alpha = register_user("alpha", "alpha@example.com", "Password123")
+        beta = register_user("beta", "beta@example.com", "Password123")
+        register_user("a1", "a1@example.com", "Password123", alpha.referral_code)
+        register_user("a2", "a2@example.com", "Password123", alpha.referral_code)
+        register_user("b1", "b1@example.com", "Password123", beta.referral_code)
+
+
+def leaders(client, window="all"):
+    data = client.get(f"/api/leaderboard?window={window}").get_json()
+    return [(entry["rank"], entry["username"], entry["score"]) for entry in data["leaders"]]
+
+
+def test_leaderboard_updates_incrementally(app, client):
+    """Test that new referrals reach the board and its snapshot table."""
+    seed_referrals(app)
+
+    assert leaders(client) == [(1, "alpha", 2), (2, "beta", 1)]
+    assert leaders(client, "7d") == [(1, "alpha", 2), (2, "beta", 1)]
+
+    # A cold worker rebuilds its in-memory board from the snapshot rows
+    with app.app_context():
+        assert LeaderboardEntry.query.filter_by(window="all").count() == 2
+    leaderboard.invalidate()
+    assert leaders(client) == [(1, "alpha", 2), (2, "beta", 1)]
+
+    token = client.post("/api/login", json={
+        "username_or_email": "beta",
+        "password": "Password123"
+    }).get_json()["access_token"]
+    response = client.get("/api/leaderboard", headers={"Authorization": f"Bearer {token}"})
+    assert response.get_json()["me"] == {"rank": 2, "score": 1}
+
+    assert client.get("/api/leaderboard?window=1y").status_code == 400
+
+
+def test_rebuild_leaderboard_from_referrals(app, client):
+    """Test the offline batch rebuild of counts and snapshots."""
+    seed_referrals(app)
+    with app.app_context():
+        LeaderboardEntry.query.delete()
+        db.session.commit()
+
+        assert rebuild_leaderboard() == 6
+
+    assert leaders(client, "30d") == [(1, "alpha", 2), (2, "beta", 1)]
+
+
+def test_top_n_keeps_only_the_best_scores():
+    """Test that TopN evicts the lowest score and ranks ties together."""
+    board = TopN(2)
+    board.update(1, 5, "one")
+    board.update(2, 3, "two")
+    board.update(3, 4, "three")
+    assert [(e["user_id"], e["score"]) for e in board.entries(10)] == [(1, 5), (3, 4)]
+    assert not board.qualifies(2, 3)
+
+    board.update(3, 5)
+    assert [e["rank"] for e in board.entries(10)] == [1, 1]
@@ -0,0 +1,136 @@
+import json
+import logging
+import multiprocessing
+import os
+import re
+
+from app.models import db, User
+from app.services.auth_service import register_user
+from app.services.metrics import metrics
+
+
+def sample(text, series):
+    """The value of one exposition line, e.g. 'http_requests_total{...}'"""
+    match = re.search(rf"^{re.escape(series)} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def test_metrics_report_requests_sql_and_hot_spots(app, client):
+    """Test that /metrics exposes route latency, SQL per request, bcrypt timings and subsystem gauges."""
+    client.post("/api/register", json={
+        "username": "measured",
+        "email": "measured@example.com",
+        "password": "Password123"
+    })
+    client.post("/api/login", json={"username_or_email": "measured", "password": "Password123"})
+
+    # Scrapes are exempt from the 50/hour default limit
+    for _ in range(55):
+        response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    text = response.get_data(as_text=True)
+
+    assert sample(text, 'http_requests_total{method="POST",route="/api/register",status="201"}') == 1
+    assert sample(text, 'http_request_duration_seconds_count{method="POST",route="/api/login"}') == 1
+    assert sample(text, 'http_request_sql_queries_sum{route="/api/register"}') > 0
+    assert sample(text, 'http_request_sql_queries_bucket{route="/metrics",le="+Inf"}') == 54
+    assert sample(text, 'password_hash_seconds_count{operation="hash"}') == 1
+    assert sample(text, 'password_hash_seconds_count{operation="verify"}') == 1
+    assert sample(text, 'rate_limit_check_seconds_count') == 57
+    assert sample(text, 'sql_queries_total') > 0
+    assert sample(text, f'app_email_queue_pending{{pid="{os.getpid()}"}}') == 0
+
+
+def test_metrics_token_is_required_when_set(app, client):
+    """Test that METRICS_TOKEN guards the endpoint."""
+    app.config["METRICS_TOKEN"] = "scrape-secret"
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"}).status_code == 200
+
+
+def test_n_plus_one_detector_logs_repeated_statements(app, client, caplog):
+    """Test that a request lazy-loading one row per item is flagged."""
+    app.config["SQL_N_PLUS_ONE_THRESHOLD"] = 3
+    with app.app_context():
+        referrer = register_user("fanout", "fanout@example.com", "Password123")
+        for i in range(5):
+            register_user(f"fan{i}", f"fan{i}@example.com", "Password123", referrer.referral_code)
+
+    @app.route("/n-plus-one")
+    def n_plus_one():
+        db.session.expire_all()
+        referrals = User.query.filter_by(username="fanout").one().referrals_made
+        return {"names": [referral.referred_user.username for referral in referrals]}
+
+    with caplog.at_level(logging.WARNING, logger="app.services.metrics"):
+        assert client.get("/n-plus-one").status_code == 200
+        assert client.get("/api/leaderboard").status_code == 200
+
+    warnings = [record.getMessage() for record in caplog.records]
+    assert len(warnings) == 1
+    assert warnings[0].startswith("Possible N+1 in GET /n-plus-one: 5 runs of SELECT")
+    assert sample(client.get("/metrics").get_data(as_text=True), 'sql_n_plus_one_total{route="/n-plus-one"}') == 1
+
+
+def _worker_requests(app, count):
+    client = app.test_client()
+    for _ in range(count):
+        client.get("/no-such-page")
+    with app.app_context():
+        metrics.render()  # Writes this worker's snapshot
+
+
+def test_metrics_sum_across_workers(app, client, tmp_path):
+    """Test that a scrape of one worker includes the counters of the others."""
+    app.config["METRICS_DIR"] = str(tmp_path)
+    metrics.directory = str(tmp_path)
+
+    worker = multiprocessing.get_context("fork").Process(target=_worker_requests, args=(app, 3))
+    worker.start()
+    worker.join(10)
+    assert worker.exitcode == 0
+
+    client.get("/no-such-page")
+    client.get("/no-such-page")
+    text = client.get("/metrics").get_data(as_text=True)
+    assert sample(text, 'http_requests_total{method="GET",route="unmatched",status="404"}') == 5
+    # The exited worker's snapshot was folded into the retired totals
+    assert sorted(path.name.split("-")[1] for path in tmp_path.glob("metrics-*.json")) == [str(os.getpid()), "retired.json"]
+
+
+def test_reused_pid_keeps_the_exited_workers_totals(app, client, tmp_path):
+    """Test that a worker reusing an exited worker's pid neither overwrites nor drops its counters."""
+    app.config["METRICS_DIR"] = str(tmp_path)
+    metrics.directory = str(tmp_path)
+    client.get("/no-such-page")
+
+    # An older snapshot under this process's pid, as an exited worker would have left it
+    series = [["http_requests_total", [["method", "GET"], ["route", "unmatched"], ["status", "404"]], 4]]
+    (tmp_path / f"metrics-{os.getpid()}-0ld0ld00.json").write_text(json.dumps(
+        {"pid": os.getpid(), "token": "0ld0ld00", "written_at": 0, "counters": series, "histograms": [], "gauges": []}
+    ))
+
+    for _ in range(2):
+        text = client.get("/metrics").get_data(as_text=True)
+        assert sample(text, 'http_requests_total{method="GET",route="unmatched",status="404"}') == 5
+    assert not (tmp_path / f"metrics-{os.getpid()}-0ld0ld00.json").exists()
+    assert (tmp_path / "metrics-retired.json").exists()
+
+
+def test_gauges_are_reported_per_worker(app, client, tmp_path):
+    """Test that per-process gauges get a pid label rather than being summed across workers."""
+    app.config["METRICS_DIR"] = str(tmp_path)
+    metrics.directory = str(tmp_path)
+    other = os.getppid()  # Any live process stands in for a second worker
+    (tmp_path / f"metrics-{other}-0th3r000.json").write_text(json.dumps(
+        {"pid": other, "token": "0th3r000", "written_at": 1e12, "counters": [], "histograms": [],
+         "gauges": [["app_replicas_healthy", 0.0], ["app_email_queue_pending", 3.0]]}
+    ))
+
+    text = client.get("/metrics").get_data(as_text=True)
+    assert sample(text, f'app_email_queue_pending{{pid="{other}"}}') == 3
+    assert sample(text, f'app_email_queue_pending{{pid="{os.getpid()}"}}') == 0
+    assert sample(text, f'app_replicas_healthy{{pid="{other}"}}') == 0
+    assert sample(text, 'app_email_queue_pending') is None
+
@@ -0,0 +1,93 @@
+import uuid
+from datetime import datetime, timedelta
+
+from app.models import db, PasswordReset
+from app.services import auth_service
+from app.services.auth_service import register_user, initiate_password_reset, reset_password
+from app.services.sweeper import sweeper
+from app.utils.tokens import hash_token
+
+
+def capture_reset_emails(monkeypatch):
+    sent = []
+    monkeypatch.setattr(auth_service, "send_password_reset_email", lambda email, token: sent.append(token))
+    return sent
+
+
+def test_reset_token_is_stored_hashed(app, client, monkeypatch):
+    """Test that only a hash of the emailed reset token reaches the database."""
+    sent = capture_reset_emails(monkeypatch)
+    with app.app_context():
+        register_user("hashed", "hashed@example.com", "Password123")
+    assert client.post("/api/forgot-password", json={"email": "hashed@example.com"}).status_code == 200
+
+    with app.app_context():
+        stored = PasswordReset.query.one()
+        assert stored.token_hash == hash_token(sent[0]) != sent[0]
+        assert stored.expires_at > datetime.utcnow() + timedelta(hours=23)
+
+    assert client.post("/api/reset-password", json={
+        "token": stored.token_hash,
+        "new_password": "NewPassword123"
+    }).status_code == 400
+    assert client.post("/api/reset-password", json={
+        "token": sent[0],
+        "new_password": "NewPassword123"
+    }).status_code == 200
+
+
+def test_live_reset_tokens_are_capped_per_user(app, monkeypatch):
+    """Test that requesting a reset replaces the oldest token beyond the cap and drops expired ones."""
+    sent = capture_reset_emails(monkeypatch)
+    app.config["PASSWORD_RESET_MAX_ACTIVE"] = 2
+    with app.app_context():
+        user = register_user("capped", "capped@example.com", "Password123")
+        db.session.add(PasswordReset(user_id=user.id, token_hash=hash_token("stale"),
+                                     expires_at=datetime.utcnow() - timedelta(minutes=1)))
+        db.session.commit()
+
+        for _ in range(3):
+            assert initiate_password_reset("capped@example.com")
+
+        stored = {row.token_hash for row in PasswordReset.query.filter_by(user_id=user.id)}
+        assert stored == {hash_token(sent[1]), hash_token(sent[2])}
+        assert not reset_password(sent[0], "NewPassword123")
+        assert reset_password(sent[2], "NewPassword123")
+
+
+def test_legacy_plaintext_reset_token_still_works(app):
+    """Test that a reset link issued before tokens were hashed can still be used."""
+    legacy = str(uuid.uuid4())
+    with app.app_context():
+        user = register_user("legacy", "legacy@example.com", "Password123")
+        db.session.add(PasswordReset(user_id=user.id, token_hash=legacy,
+                                     expires_at=datetime.utcnow() + timedelta(hours=1)))
+        db.session.commit()
+
+        assert not reset_password("", "NewPassword123")
+        assert reset_password(legacy, "NewPassword123")
+        assert PasswordReset.query.count() == 0
+
+
+def test_sweeper_purges_expired_tokens_in_batches(app):
+    """Test that a sweep removes every expired reset token, a batch at a time, and keeps live ones."""
+    now = datetime.utcnow()
+    with app.app_context():
+        user = register_user("swept", "swept@example.com", "Password123")
+        db.session.add_all([
+            PasswordReset(user_id=user.id, token_hash=hash_token(f"expired-{i}"),
+                          expires_at=now - timedelta(hours=1))
+            for i in range(7)
+        ])
+        db.session.add(PasswordReset(user_id=user.id, token_hash=hash_token("live"),
+                                     expires_at=now + timedelta(hours=1)))
+        db.session.commit()
+
+        assert auth_service.purge_expired_password_resets(batch_size=3) == 7
+        assert [row.token_hash for row in PasswordReset.query] == [hash_token("live")]
+
+        db.session.add(PasswordReset(user_id=user.id, token_hash=hash_token("expired-again"),
+                                     expires_at=now - timedelta(hours=1)))
+        db.session.commit()
+        assert sweeper.run_once() == {"password_resets": 1, "refresh_tokens": 0}
+        assert sweeper.stats()["purged_password_resets"] == 1
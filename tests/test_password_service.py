@@ -0,0 +1,54 @@
+import threading
+
+from app.models import User
+from app.services.password_service import password_hasher
+
+
+def register_and_get_user(app, client):
+    client.post("/api/register", json={
+        "username": "hashuser",
+        "email": "hash@example.com",
+        "password": "Password123"
+    })
+    with app.app_context():
+        return User.query.filter_by(username="hashuser").first().password
+
+
+def test_login_rehashes_with_new_work_factor(app, client):
+    """Test that a successful login upgrades hashes made with an old cost."""
+    old_hash = register_and_get_user(app, client)
+    assert old_hash.startswith("$2b$04$")
+
+    app.config["BCRYPT_LOG_ROUNDS"] = 5
+    response = client.post("/api/login", json={
+        "username_or_email": "hashuser",
+        "password": "Password123"
+    })
+    assert response.status_code == 200
+
+    with app.app_context():
+        new_hash = User.query.filter_by(username="hashuser").first().password
+    assert new_hash.startswith("$2b$05$")
+
+    response = client.post("/api/login", json={
+        "username_or_email": "hashuser",
+        "password": "Password123"
+    })
+    assert response.status_code == 200
+
+
+def test_full_hashing_pool_returns_503(app, client, monkeypatch):
+    """Test that logins are shed with 503 when no hashing slot is free."""
+    register_and_get_user(app, client)
+
+    exhausted = threading.BoundedSemaphore(1)
+    exhausted.acquire()
+    monkeypatch.setattr(password_hasher, "_slots", exhausted)
+
+    response = client.post("/api/login", json={
+        "username_or_email": "hashuser",
+        "password": "Password123"
+    })
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert response.get_json()["success"] is False
@@ -0,0 +1,106 @@
+import re
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+from app.models import db, PasswordReset
+from app.schema import upgrade_schema
+from app.services import auth_service, referral_service, referral_tree_service, refresh_token_service, reward_service
+from app.services import rollup_service
+from app.utils.tokens import hash_token
+from app.utils.validators import find_taken_fields
+
+FULL_SCAN = re.compile(r'^SCAN (\w+)(?! USING)')
+
+
+@pytest.fixture
+def seeded(app):
+    """A referrer with a few referrals and a pending password reset"""
+    with app.app_context():
+        referrer = auth_service.register_user("planner", "planner@example.com", "Password123")
+        for i in range(3):
+            auth_service.register_user(f"planned{i}", f"planned{i}@example.com", "Password123", referrer.referral_code)
+        db.session.add(PasswordReset(user_id=referrer.id, token_hash=hash_token("plan-token"),
+                                     expires_at=datetime.utcnow() + timedelta(hours=1)))
+        db.session.commit()
+        yield referrer
+
+
+def full_scans(app, action):
+    """Run action and return the tables any of its statements scan in full"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            statements.append((statement, parameters))
+
+    engine = db.engine
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        action()
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    scans = []
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters):
+                match = FULL_SCAN.match(row[-1])
+                if match:
+                    scans.append((match.group(1), statement))
+    return scans
+
+
+@pytest.mark.parametrize("name, action", [
+    ("referrals page", lambda u: referral_service.get_user_referrals(u.id, limit=2)),
+    ("referrals next page", lambda u: referral_service.get_user_referrals(
+        u.id, limit=2, cursor=(datetime.utcnow(), 10))),
+    ("referral stats", lambda u: referral_service.get_referral_stats(u.id)),
+    ("duplicate check", lambda u: find_taken_fields("planner", "someone@example.com")),
+    ("login by email", lambda u: auth_service.authenticate_user("planner@example.com", "Password123")),
+    ("login by username", lambda u: auth_service.authenticate_user("planner", "Password123")),
+    ("referred registration", lambda u: auth_service.register_user(
+        "latecomer", "latecomer@example.com", "Password123", u.referral_code)),
+    ("legacy referral code", lambda u: referral_service.get_user_by_referral_code("0a1b2c3d")),
+    ("password reset", lambda u: auth_service.reset_password("plan-token", "NewPassword123")),
+    ("password reset request", lambda u: auth_service.initiate_password_reset("planner@example.com")),
+    ("password reset purge", lambda u: auth_service.purge_expired_password_resets()),
+    ("refresh sessions", lambda u: refresh_token_service.get_sessions(u.id)),
+    ("refresh token replay", lambda u: refresh_token_service.revoke_refresh_token("unknown")),
+    ("refresh token purge", lambda u: refresh_token_service.purge_expired_refresh_tokens()),
+    ("downline summary", lambda u: referral_tree_service.get_downline_summary(u.id)),
+    ("downline members", lambda u: referral_tree_service.get_downline_members(
+        u.id, limit=2, cursor=(1, 2))),
+    ("subtree attach", lambda u: referral_tree_service.attach_to_referral_tree(999999, u.id)),
+    ("downline by referrer", lambda u: u.referrals),
+    ("rewards by user", lambda u: u.rewards),
+    ("reward balance", lambda u: reward_service.get_reward_balance(u.id)),
+    ("reward outbox batch", lambda u: reward_service.rewards.run_once()),
+    ("tiered reward rule", lambda u: reward_service.tiered_reward(
+        [SimpleNamespace(referral_id=2, referrer_id=u.id, referred_user_id=3)], {"REWARD_TIERS": "1:10"})),
+    ("upline reward rule", lambda u: reward_service.upline_reward(
+        [SimpleNamespace(referral_id=2, referrer_id=u.id, referred_user_id=3)], {"REWARD_UPLINE_AMOUNTS": "2,1"})),
+    ("referral timeseries", lambda u: rollup_service.get_referral_timeseries(
+        u.id, "week", datetime(2026, 1, 5).date(), datetime(2026, 3, 30).date())),
+    ("platform timeseries", lambda u: rollup_service.get_referral_timeseries(
+        0, "day", datetime(2026, 3, 2).date(), datetime(2026, 3, 30).date())),
+    ("rollup compaction", lambda u: rollup_service.compact_referral_rollups()),
+])
+def test_service_queries_use_indexes(app, seeded, name, action):
+    """Test that service-layer queries never fall back to a full table scan."""
+    with app.app_context():
+        user = db.session.merge(seeded)
+        db.session.expire(user)
+        assert full_scans(app, lambda: action(user)) == []
+
+
+def test_upgrade_schema_adds_missing_indexes(app):
+    """Test that upgrade_schema creates indexes missing from an older database."""
+    with app.app_context():
+        db.session.execute(db.text("DROP INDEX ix_referrals_referrer_date_id"))
+        db.session.commit()
+
+        assert upgrade_schema() == ["ix_referrals_referrer_date_id"]
+        assert upgrade_schema() == []
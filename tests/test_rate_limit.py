@@ -0,0 +1,84 @@
+import multiprocessing
+
+import pytest
+from flask_jwt_extended import create_access_token
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+
+from app import create_app
+from app.config import Config
+from app.utils.rate_limit import rate_limit_key, sliding_count, SQLiteStorage
+
+
+def hit_many(url, hits):
+    storage = storage_from_string(url)  # The limiter only keeps a weak reference
+    limiter = FixedWindowRateLimiter(storage)
+    item = parse("15 per hour")
+    return sum(limiter.hit(item, "shared") for _ in range(hits))
+
+
+def test_sliding_count_weights_the_previous_window():
+    """Test the sliding-window estimate at the start, middle and end of a window."""
+    assert sliding_count(2, 10, 60, 600) == 12
+    assert sliding_count(2, 10, 60, 630) == 7
+    assert sliding_count(2, 10, 60, 659) == 2
+
+
+def test_sqlite_storage_enforces_limits_across_processes(tmp_path):
+    """Test that forked workers share one budget through the SQLite file."""
+    url = f"sqlite:///{tmp_path / 'limits.db'}"
+    with multiprocessing.get_context("fork").Pool(3) as pool:
+        allowed = pool.starmap(hit_many, [(url, 10)] * 3)
+    assert sum(allowed) == 15
+
+    storage = storage_from_string(url)
+    assert isinstance(storage, SQLiteStorage)
+    assert storage.check()
+    storage.clear(parse("15 per hour").key_for("shared"))
+    assert hit_many(url, 1) == 1
+
+    with pytest.raises(ValueError):
+        storage_from_string("sqlite:///:memory:")
+
+
+def test_resp_storage_enforces_limits(resp_server):
+    """Test the Redis-protocol storage against the stand-in server."""
+    url = resp_server.url.replace("redis://", "resp://")
+    assert hit_many(url, 20) == 15
+
+    storage = storage_from_string(url)
+    limiter = FixedWindowRateLimiter(storage)
+    item = parse("15 per hour")
+    reset, remaining = limiter.get_window_stats(item, "shared")
+    assert remaining == 0 and reset > 0
+
+    limiter.clear(item, "shared")
+    assert limiter.test(item, "shared")
+
+
+def test_limits_are_shared_between_app_instances(tmp_path):
+    """Test that two apps on one SQLite file count auth requests together, like two workers."""
+    class SharedConfig(Config):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+        RATELIMIT_STORAGE_URL = f"sqlite:///{tmp_path / 'limits.db'}"
+
+    clients = [create_app(SharedConfig).test_client() for _ in range(2)]
+    codes = [clients[i % 2].post("/api/forgot-password", json={"email": "nobody@example.com"}).status_code
+             for i in range(6)]
+    assert codes.count(429) == 1 and codes[-1] == 429
+
+
+def test_user_key_uses_the_jwt_identity(app):
+    """Test per-user keys for authenticated requests and per-IP keys otherwise."""
+    with app.app_context():
+        token = create_access_token(identity="42")
+
+    with app.test_request_context("/api/referrals", headers={"Authorization": f"Bearer {token}"}):
+        assert rate_limit_key() == "ip:127.0.0.1"
+        app.config["RATELIMIT_KEY"] = "user"
+        assert rate_limit_key() == "user:42"
+
+    with app.test_request_context("/api/referrals", headers={"Authorization": "Bearer garbage"},
+                                  environ_base={"REMOTE_ADDR": "10.0.0.1"}):
+        assert rate_limit_key() == "ip:10.0.0.1"
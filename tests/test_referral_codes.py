@@ -0,0 +1,82 @@
+from sqlalchemy import inspect
+
+from app.models import db, User
+from app.schema import upgrade_schema
+from app.services.auth_service import register_user
+from app.services.referral_service import get_user_by_referral_code, resolve_referral_codes
+from app.utils.referral_codes import ReferralCodec, is_short_code
+
+
+def test_codec_is_a_permutation():
+    """Test that codes are unique, fixed-length and decode back to their ids."""
+    codec = ReferralCodec("secret")
+    ids = list(range(1, 5001)) + [2 ** 40 - 1]
+    codes = [codec.encode(user_id) for user_id in ids]
+
+    assert len(set(codes)) == len(codes)
+    assert all(is_short_code(code) for code in codes)
+    assert [codec.decode(code) for code in codes] == ids
+    assert ReferralCodec("other").encode(1) != codes[0]
+
+    assert codec.decode("zzzzzzz") is None  # Above 2**40
+    assert codec.decode("abc-123") is None
+    assert codec.decode("0a1b2c3d") is None  # Legacy length
+
+
+def test_generated_codes_resolve_by_primary_key(app, capture_statements):
+    """Test that registration with a generated code fetches the referrer by id."""
+    with app.app_context():
+        referrer = register_user("coder", "coder@example.com", "Password123")
+        code = referrer.referral_code
+        assert is_short_code(code)
+        assert referrer.legacy_referral_code is None
+
+        db.session.expire_all()
+        with capture_statements(app) as statements:
+            assert get_user_by_referral_code(code).username == "coder"
+        assert len(statements) == 1 and "users.id = ?" in statements[0]
+
+        referred = register_user("codee", "codee@example.com", "Password123", code)
+        assert referred.referred_by_id == referrer.id
+
+
+def test_legacy_codes_keep_working(app):
+    """Test that 8-character codes stored before the allocator still resolve."""
+    with app.app_context():
+        legacy = register_user("legacy", "legacy@example.com", "Password123")
+        legacy.legacy_referral_code = "0a1b2c3d"
+        db.session.commit()
+
+        assert legacy.referral_code == "0a1b2c3d"
+        assert get_user_by_referral_code("0a1b2c3d").id == legacy.id
+        assert resolve_referral_codes(["0a1b2c3d", "nope0000", "zzzzzzz"]) == {"0a1b2c3d": legacy.id}
+
+        register_user("follower", "follower@example.com", "Password123", "0a1b2c3d")
+        assert User.query.filter_by(username="follower").one().referred_by_id == legacy.id
+
+
+def test_upgrade_schema_relaxes_legacy_code_column(app):
+    """Test that upgrade_schema rebuilds a users table whose referral_code is NOT NULL."""
+    with app.app_context():
+        register_user("old", "old@example.com", "Password123")
+        db.session.execute(db.text("UPDATE users SET referral_code = 'f00dcafe'"))
+        db.session.execute(db.text("ALTER TABLE users RENAME TO users_v1"))
+        db.session.execute(db.text(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE, "
+            "email VARCHAR(120) NOT NULL UNIQUE, password VARCHAR(128) NOT NULL, "
+            "referral_code VARCHAR(20) NOT NULL UNIQUE, referred_by_id INTEGER REFERENCES users (id), "
+            "created_at DATETIME)"
+        ))
+        db.session.execute(db.text("INSERT INTO users SELECT * FROM users_v1"))
+        db.session.execute(db.text("DROP TABLE users_v1"))
+        db.session.commit()
+
+        upgrade_schema()
+        inspector = inspect(db.engine)
+        columns = {column["name"]: column for column in inspector.get_columns("users")}
+        assert columns["referral_code"]["nullable"]
+        assert "ix_users_referred_by_id" in {index["name"] for index in inspector.get_indexes("users")}
+
+        db.session.expire_all()
+        assert get_user_by_referral_code("f00dcafe").username == "old"
+        assert is_short_code(register_user("new", "new@example.com", "Password123").referral_code)
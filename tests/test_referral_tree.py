@@ -0,0 +1,68 @@
+from app.models import db, ReferralClosure
+from app.services.auth_service import register_user
+from app.services.referral_tree_service import rebuild_referral_tree
+
+
+def build_tree(app):
+    """root <- child1 <- grandchild, root <- child2"""
+    with app.app_context():
+        root = register_user("root", "root@example.com", "Password123")
+        child1 = register_user("child1", "child1@example.com", "Password123", root.referral_code)
+        register_user("child2", "child2@example.com", "Password123", root.referral_code)
+        register_user("grandchild", "grandchild@example.com", "Password123", child1.referral_code)
+
+
+def login(client, username):
+    token = client.post("/api/login", json={
+        "username_or_email": username,
+        "password": "Password123"
+    }).get_json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def closure_rows():
+    return sorted(db.session.query(
+        ReferralClosure.ancestor_id, ReferralClosure.descendant_id, ReferralClosure.depth
+    ).all())
+
+
+def test_downline_counts_per_depth(app, client):
+    """Test direct/indirect downline counts maintained at registration."""
+    build_tree(app)
+
+    response = client.get("/api/downline", headers=login(client, "root"))
+    assert response.status_code == 200
+    assert response.get_json()["downline"] == {
+        "total": 3,
+        "direct": 2,
+        "indirect": 1,
+        "by_depth": [{"depth": 1, "count": 2}, {"depth": 2, "count": 1}]
+    }
+
+
+def test_downline_members_are_paginated(app, client):
+    """Test paging through the subtree ordered by depth."""
+    build_tree(app)
+    headers = login(client, "root")
+
+    first = client.get("/api/downline/members?limit=2", headers=headers).get_json()
+    assert [m["username"] for m in first["members"]] == ["child1", "child2"]
+
+    second = client.get(f"/api/downline/members?limit=2&cursor={first['next_cursor']}", headers=headers).get_json()
+    assert [(m["username"], m["depth"]) for m in second["members"]] == [("grandchild", 2)]
+    assert second["next_cursor"] is None
+
+    only_depth_2 = client.get("/api/downline/members?depth=2", headers=headers).get_json()
+    assert [m["username"] for m in only_depth_2["members"]] == ["grandchild"]
+
+
+def test_rebuild_matches_incremental_tree(app):
+    """Test that the recursive CTE rebuild reproduces the maintained rows."""
+    build_tree(app)
+    with app.app_context():
+        maintained = closure_rows()
+        ReferralClosure.query.delete()
+        db.session.commit()
+
+        assert rebuild_referral_tree() == 4
+        assert closure_rows() == maintained
@@ -84,3 +84,133 @@ def test_referral_count_updates(client):
     
     assert response.status_code == 200
     assert data["stats"]["total_referrals"] == 2
+
+
+def test_referred_registration_is_one_transaction(app, client):
+    """Test that user, referral, reward outbox row and refresh token are written by a single commit, the reward after it."""
+    from sqlalchemy import event
+    from flask_sqlalchemy import SignallingSession
+    from app.models import Referral, Reward, RewardOutbox
+
+    referrer_response = client.post("/api/register", json={
+        "username": "referrer",
+        "email": "referrer@example.com",
+        "password": "Password123"
+    })
+    referrer_code = referrer_response.get_json()["user"]["referral_code"]
+
+    # Group the rows each commit writes
+    commits, written = [], set()
+    on_flush = lambda session, context: written.update(type(obj).__name__ for obj in session.new)
+    on_commit = lambda session: commits.append(set(written)) or written.clear()
+    event.listen(SignallingSession, "after_flush", on_flush)
+    event.listen(SignallingSession, "after_commit", on_commit)
+    try:
+        response = client.post("/api/register", json={
+            "username": "referred",
+            "email": "referred@example.com",
+            "password": "Password123",
+            "referral_code": referrer_code
+        })
+    finally:
+        event.remove(SignallingSession, "after_flush", on_flush)
+        event.remove(SignallingSession, "after_commit", on_commit)
+
+    assert response.status_code == 201
+    registration = [rows for rows in commits if rows & {"User", "Referral", "RefreshToken"}]
+    assert len(registration) == 1
+    assert {"User", "Referral", "RewardOutbox", "RefreshToken"} <= registration[0]
+    assert "Reward" not in registration[0]
+    with app.app_context():
+        referral = Referral.query.one()
+        assert Reward.query.filter_by(referral_id=referral.id).count() == 1
+        assert RewardOutbox.query.count() == 0
+
+
+def test_duplicate_caught_by_constraint_returns_400(client, monkeypatch):
+    """Test that a uniqueness race surfaces as the usual 400 errors."""
+    import app.services.auth_service as auth_service
+
+    client.post("/api/register", json={
+        "username": "racer",
+        "email": "racer@example.com",
+        "password": "Password123"
+    })
+
+    # Both the availability filter and the pre-check miss the existing row, as in a race
+    monkeypatch.setattr(auth_service.availability, "find_taken", lambda username, email: {})
+    response = client.post("/api/register", json={
+        "username": "racer2",
+        "email": "racer@example.com",
+        "password": "Password123"
+    })
+
+    assert response.status_code == 400
+    assert response.get_json()["errors"] == {"email": "Email is already registered"}
+
+
+def test_referral_stats_come_from_counters(app, client):
+    """Test that counters track referrals and rewards and can be rebuilt."""
+    from app.models import ReferralCounter, db
+    from app.services.referral_service import reconcile_referral_counters
+
+    referrer_code = client.post("/api/register", json={
+        "username": "counted",
+        "email": "counted@example.com",
+        "password": "Password123"
+    }).get_json()["user"]["referral_code"]
+    for i in range(2):
+        client.post("/api/register", json={
+            "username": f"friend{i}",
+            "email": f"friend{i}@example.com",
+            "password": "Password123",
+            "referral_code": referrer_code
+        })
+    token = client.post("/api/login", json={
+        "username_or_email": "counted",
+        "password": "Password123"
+    }).get_json()["access_token"]
+
+    expected = {"total_referrals": 2, "successful_referrals": 2, "rewards_earned": 2, "reward_amount": 20.0}
+    response = client.get("/api/referral-stats", headers={"Authorization": f"Bearer {token}"})
+    assert response.get_json()["stats"] == expected
+
+    with app.app_context():
+        ReferralCounter.query.delete()
+        db.session.commit()
+        assert reconcile_referral_counters() == 3
+
+    response = client.get("/api/referral-stats", headers={"Authorization": f"Bearer {token}"})
+    assert response.get_json()["stats"] == expected
+
+
+def test_referrals_are_keyset_paginated(client):
+    """Test paging through /api/referrals with limit and next_cursor."""
+    referrer_code = client.post("/api/register", json={
+        "username": "pager",
+        "email": "pager@example.com",
+        "password": "Password123"
+    }).get_json()["user"]["referral_code"]
+    for i in range(3):
+        client.post("/api/register", json={
+            "username": f"paged{i}",
+            "email": f"paged{i}@example.com",
+            "password": "Password123",
+            "referral_code": referrer_code
+        })
+    token = client.post("/api/login", json={
+        "username_or_email": "pager",
+        "password": "Password123"
+    }).get_json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    first = client.get("/api/referrals?limit=2", headers=headers).get_json()
+    assert [r["referred_user"]["username"] for r in first["referrals"]] == ["paged2", "paged1"]
+    assert first["next_cursor"]
+
+    second = client.get(f"/api/referrals?limit=2&cursor={first['next_cursor']}", headers=headers).get_json()
+    assert [r["referred_user"]["username"] for r in second["referrals"]] == ["paged0"]
+    assert second["next_cursor"] is None
+
+    response = client.get("/api/referrals?cursor=not-a-cursor", headers=headers)
+    assert response.status_code == 400
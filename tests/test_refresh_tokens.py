@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+from app.models import db, RefreshToken
+from app.services.auth_service import register_user
+from app.services.password_service import password_hasher
+from app.services.refresh_token_service import issue_refresh_token, purge_expired_refresh_tokens
+from app.utils.tokens import hash_token
+
+
+def test_refresh_rotates_without_hashing_a_password(app, client, monkeypatch):
+    """Test that /api/refresh mints a new access token and rotates the refresh token."""
+    login = client.post("/api/register", json={
+        "username": "refresher",
+        "email": "refresher@example.com",
+        "password": "Password123",
+        "device_name": "laptop"
+    }).get_json()
+    refresh_token = login["refresh_token"]
+    with app.app_context():
+        stored = RefreshToken.query.one()
+        assert stored.token_hash == hash_token(refresh_token) and len(stored.token_hash) == 64
+
+    def no_bcrypt(*args):
+        raise AssertionError("refresh must not hash passwords")
+    monkeypatch.setattr(password_hasher, "verify", no_bcrypt)
+
+    response = client.post("/api/refresh", json={"refresh_token": refresh_token})
+    assert response.status_code == 200
+    rotated = response.get_json()
+    assert rotated["refresh_token"] != refresh_token
+    headers = {"Authorization": f"Bearer {rotated['access_token']}"}
+    assert client.get("/api/referral-stats", headers=headers).status_code == 200
+
+    # Replaying the rotated-away token is treated as theft and ends the device session
+    assert client.post("/api/refresh", json={"refresh_token": refresh_token}).status_code == 401
+    assert client.post("/api/refresh", json={"refresh_token": rotated["refresh_token"]}).status_code == 401
+
+
+def test_sessions_are_listed_and_revoked_per_device(app, client):
+    """Test per-device revocation and the per-user session cap."""
+    app.config["REFRESH_TOKENS_PER_USER"] = 3
+    with app.app_context():
+        user = register_user("devices", "devices@example.com", "Password123")
+        tokens = [issue_refresh_token(user.id, f"device{i}") for i in range(4)]
+    login = client.post("/api/login", json={
+        "username_or_email": "devices",
+        "password": "Password123",
+        "device_name": "phone"
+    }).get_json()
+    headers = {"Authorization": f"Bearer {login['access_token']}"}
+
+    sessions = client.get("/api/sessions", headers=headers).get_json()["sessions"]
+    assert sorted(s["device_name"] for s in sessions) == ["device2", "device3", "phone"]
+
+    laptop = next(s for s in sessions if s["device_name"] == "device3")
+    assert client.delete(f"/api/sessions/{laptop['id']}", headers=headers).status_code == 200
+    assert client.post("/api/refresh", json={"refresh_token": tokens[3]}).status_code == 401
+    assert client.post("/api/logout", json={"refresh_token": login["refresh_token"]}).status_code == 200
+    with app.app_context():
+        assert [t.device_name for t in RefreshToken.query.all()] == ["device2"]
+
+
+def test_expired_refresh_tokens_are_purged_in_batches(app):
+    """Test the bulk purge of expired refresh tokens."""
+    with app.app_context():
+        user = register_user("purged", "purged@example.com", "Password123")
+        app.config["REFRESH_TOKENS_PER_USER"] = 20
+        for i in range(5):
+            issue_refresh_token(user.id)
+        for token in RefreshToken.query.order_by(RefreshToken.id).limit(4):
+            token.expires_at = datetime.utcnow() - timedelta(days=1)
+        db.session.commit()
+
+        assert purge_expired_refresh_tokens(batch_size=3) == 4
+        assert RefreshToken.query.count() == 1
+
+
+def test_refresh_has_its_own_rate_limit_and_device_names_are_checked(app, client):
+    """Test that refreshes get their looser REFRESH_RATE_LIMIT, not the login limit, and bad device names get a 400."""
+    app.config["REFRESH_RATE_LIMIT"] = "8 per minute"
+    statuses = [client.post("/api/refresh", json={"refresh_token": "unknown"}).status_code for _ in range(10)]
+    assert statuses == [401] * 8 + [429] * 2
+
+    response = client.post("/api/register", json={
+        "username": "gadget", "email": "gadget@example.com", "password": "Password123", "device_name": 42
+    })
+    assert response.status_code == 400
+    assert "device_name" in response.get_json()["errors"]
+    response = client.post("/api/login", json={
+        "username_or_email": "gadget", "password": "Password123", "device_name": ["phone"]
+    })
+    assert response.status_code == 400
@@ -0,0 +1,99 @@
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from app.models import db, ReferralCounter
+from app.services.cache import cache
+from app.services.auth_service import register_user, get_user_profile
+from app.services.referral_service import get_referral_stats
+from app.utils.replicas import replicas
+
+
+@pytest.fixture
+def replicated(file_app, tmp_path):
+    """An app on a primary SQLite file with a copy of it as the replica"""
+    primary = tmp_path / "primary.db"
+    replica = tmp_path / "replica.db"
+    app = file_app(
+        "primary",
+        SQLALCHEMY_REPLICA_URIS=[f"sqlite:///{tmp_path / 'missing' / 'replica.db'}", f"sqlite:///{replica}"],
+        JWT_PROFILE_CLAIMS=False,
+        CACHE_BACKEND="null"
+    )
+    with app.app_context():
+        referrer = register_user("replicated", "replicated@example.com", "Password123")
+        referrer_id, code = referrer.id, referrer.referral_code
+        db.session.remove()
+    # The replica is a snapshot, WAL included; the referral below has not reached it yet
+    with closing(sqlite3.connect(primary)) as source, closing(sqlite3.connect(replica)) as target:
+        source.backup(target)
+    with app.app_context():
+        register_user("lagging", "lagging@example.com", "Password123", code)
+    yield app, referrer_id
+    replicas.dispose()
+
+
+def test_reads_use_a_replica_and_skip_unhealthy_ones(replicated):
+    """Test that marked reads go to a healthy replica, falling back past a broken one."""
+    app, user_id = replicated
+    with app.app_context():
+        # The first replica cannot be opened: that read is retried on the primary
+        assert get_referral_stats(user_id)["total_referrals"] == 1
+        assert replicas.stats()["failures"] == 1
+        db.session.remove()
+
+        assert get_referral_stats(user_id)["total_referrals"] == 0
+        assert get_user_profile(user_id)["username"] == "replicated"
+        assert replicas.stats() == {"replicas": 2, "healthy": 1, "reads": 2, "fallbacks": 1, "failures": 1}
+
+
+def test_requests_read_their_own_writes_from_the_primary(replicated):
+    """Test that a session sticks to the primary for reads once it has written."""
+    app, user_id = replicated
+    with app.app_context():
+        replicas.mark_down(replicas.uris[0])
+        db.session.get(ReferralCounter, user_id).reward_amount += 5
+        db.session.flush()
+        assert get_referral_stats(user_id)["total_referrals"] == 1
+        db.session.commit()
+        assert get_referral_stats(user_id)["reward_amount"] == 15.0
+        assert replicas.stats()["reads"] == 0
+
+
+def test_get_endpoints_read_from_the_replica(replicated):
+    """Test that GET /api/referral-stats is served from the replica."""
+    app, user_id = replicated
+    client = app.test_client()
+    token = client.post("/api/login", json={
+        "username_or_email": "replicated",
+        "password": "Password123"
+    }).get_json()["access_token"]
+    replicas.mark_down(replicas.uris[0])
+
+    response = client.get("/api/referral-stats", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.get_json()["stats"]["total_referrals"] == 0
+
+
+def test_etags_come_from_the_replica_that_served_the_body(replicated):
+    """Test that a lagging replica's body is tagged with its own version and never reused on the primary."""
+    app, user_id = replicated
+    app.config["CACHE_BACKEND"] = "memory"
+    cache.init_app(app)
+    client = app.test_client()
+    token = client.post("/api/login", json={
+        "username_or_email": "replicated",
+        "password": "Password123"
+    }).get_json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    replicas.mark_down(replicas.uris[0])
+
+    stale = client.get("/api/referral-stats", headers=headers)
+    assert stale.get_json()["stats"]["total_referrals"] == 0
+
+    # With the replica gone too, the primary must not confirm or repeat the stale body
+    replicas.mark_down(replicas.uris[1])
+    response = client.get("/api/referral-stats", headers={**headers, "If-None-Match": stale.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.get_json()["stats"]["total_referrals"] == 1
@@ -0,0 +1,120 @@
+import time
+from datetime import datetime
+
+from sqlalchemy import inspect
+
+from app.models import db, Referral, Reward, RewardOutbox
+from app.schema import upgrade_schema
+from app.services import reward_service
+from app.services.auth_service import register_user, create_user_token
+from app.services.reward_service import get_reward_balance, rewards
+
+
+def balance(client, user):
+    headers = {"Authorization": f"Bearer {create_user_token(user)}"}
+    return client.get("/api/rewards", headers=headers).get_json()["rewards"]
+
+
+def test_rewards_are_applied_by_the_worker(file_app):
+    """Test that registration only queues the reward and the worker thread credits the balance."""
+    app = file_app("rewards", REWARD_PROCESSING_MODE="background")
+    client = app.test_client()
+    with app.app_context():
+        referrer = register_user("patron", "patron@example.com", "Password123")
+        register_user("protege", "protege@example.com", "Password123", referrer.referral_code)
+
+        deadline = time.monotonic() + 5
+        while balance(client, referrer)["balance"] != 10.0 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert balance(client, referrer) == {"rewards_earned": 1, "balance": 10.0}
+        assert RewardOutbox.query.count() == 0
+        assert rewards.stats()["granted"] == 1
+        db.session.remove()
+    rewards.stop()
+
+
+def test_replayed_outbox_rows_pay_once(app, client):
+    """Test that a referral taken again, as by a second worker, is not credited twice."""
+    with app.app_context():
+        referrer = register_user("once", "once@example.com", "Password123")
+        register_user("twice", "twice@example.com", "Password123", referrer.referral_code)
+        db.session.add(RewardOutbox(referral_id=Referral.query.one().id))
+        db.session.commit()
+
+        assert rewards.run_until_empty() == 1
+        assert rewards.stats()["duplicates"] == 1
+        assert Reward.query.count() == 1
+        assert get_reward_balance(referrer.id) == {"rewards_earned": 1, "balance": 10.0}
+        assert balance(client, referrer) == {"rewards_earned": 1, "balance": 10.0}
+
+
+def test_tiered_and_upline_rules(app):
+    """Test that tiers follow the referrer's referral count and the upline gets a share per level."""
+    app.config.update(REWARD_RULES="tiered,upline", REWARD_TIERS="1:10,2:15", REWARD_UPLINE_AMOUNTS="2,1")
+    with app.app_context():
+        a = register_user("tier_a", "tier_a@example.com", "Password123")
+        b = register_user("tier_b", "tier_b@example.com", "Password123", a.referral_code)
+        c = register_user("tier_c", "tier_c@example.com", "Password123", b.referral_code)
+        register_user("tier_d", "tier_d@example.com", "Password123", c.referral_code)
+        register_user("tier_e", "tier_e@example.com", "Password123", a.referral_code)
+
+        # a: 10 for b, 15 for e, 2 for c, 1 for d; b: 10 for c, 2 for d; c: 10 for d
+        assert get_reward_balance(a.id) == {"rewards_earned": 4, "balance": 28.0}
+        assert get_reward_balance(b.id) == {"rewards_earned": 2, "balance": 12.0}
+        assert get_reward_balance(c.id) == {"rewards_earned": 1, "balance": 10.0}
+
+
+def test_tiered_rule_uses_the_stored_ordinal(app, monkeypatch):
+    """Test that tiers read the ordinal stored at signup and only count referrals that have none."""
+    app.config.update(REWARD_RULES="tiered", REWARD_TIERS="1:10,3:20", REWARD_PROCESSING_MODE="background")
+    monkeypatch.setattr(rewards, "_ensure_started", lambda: None)
+    with app.app_context():
+        referrer = register_user("ordinal", "ordinal@example.com", "Password123")
+        for name in ("first", "second", "third"):
+            register_user(name, f"{name}@example.com", "Password123", referrer.referral_code)
+        referrals = Referral.query.order_by(Referral.id).all()
+        assert [r.ordinal for r in referrals] == [1, 2, 3]
+
+        # The second pretends to be the fifth; the third predates the column and is counted
+        referrals[1].ordinal = 5
+        referrals[2].ordinal = None
+        db.session.commit()
+
+        rewards.run_until_empty()
+        assert get_reward_balance(referrer.id)["balance"] == 50.0
+
+
+def test_failing_referral_backs_off_without_blocking_the_batch(app, monkeypatch):
+    """Test that a referral a rule cannot handle is deferred while the rest of its batch applies."""
+    # Queue both referrals without starting the worker, so they share one batch
+    app.config["REWARD_PROCESSING_MODE"] = "background"
+    monkeypatch.setattr(rewards, "_ensure_started", lambda: None)
+    flat = reward_service.RULES["flat"]
+    def picky(referrals, config):
+        if any(r.referred_user_id == poison_id for r in referrals):
+            raise RuntimeError("rule failed")
+        return flat(referrals, config)
+    monkeypatch.setitem(reward_service.RULES, "flat", picky)
+
+    with app.app_context():
+        referrer = register_user("batcher", "batcher@example.com", "Password123")
+        poison_id = register_user("poison", "poison@example.com", "Password123", referrer.referral_code).id
+        register_user("fine", "fine@example.com", "Password123", referrer.referral_code)
+
+        assert rewards.run_until_empty() == 1
+        assert get_reward_balance(referrer.id)["balance"] == 10.0
+        deferred = RewardOutbox.query.one()
+        assert deferred.attempts == 1
+        assert deferred.available_at > datetime.utcnow()
+        assert rewards.stats()["failed"] == 1
+
+
+def test_upgrade_schema_adds_idempotency_key(app):
+    """Test that a rewards table from before the outbox gains its key column and unique index."""
+    with app.app_context():
+        db.session.execute(db.text("DROP INDEX ix_rewards_idempotency_key"))
+        db.session.execute(db.text("ALTER TABLE rewards DROP COLUMN idempotency_key"))
+        db.session.commit()
+
+        assert upgrade_schema() == ["ix_rewards_idempotency_key"]
+        assert "idempotency_key" in {column["name"] for column in inspect(db.engine).get_columns("rewards")}
@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import db, Referral, ReferralRollup
+from app.services.auth_service import register_user, create_user_token
+from app.services.leaderboard_service import rebuild_leaderboard
+from app.services.rollup_service import (
+    backfill_referral_rollups, bucket_start, compact_referral_rollups, get_referral_timeseries, record_referral
+)
+
+
+@pytest.fixture
+def referrer(app):
+    """A referrer with two referrals today, and the headers to call the API as them"""
+    with app.app_context():
+        user = register_user("charted", "charted@example.com", "Password123")
+        register_user("charted_a", "charted_a@example.com", "Password123", user.referral_code)
+        register_user("charted_b", "charted_b@example.com", "Password123", user.referral_code)
+        return user.id, {"Authorization": f"Bearer {create_user_token(user)}"}
+
+
+def backdate(days):
+    """Move every referral ``days`` back, spread one day apart, and rebuild the rollups"""
+    today = datetime.utcnow()
+    for i, referral in enumerate(Referral.query.order_by(Referral.id)):
+        referral.date_referred = today - timedelta(days=days + i)
+    db.session.commit()
+    return backfill_referral_rollups()
+
+
+def test_referrals_are_counted_in_daily_buckets(app, client, referrer):
+    """Test that create_referral bumps today's bucket for the referrer and the platform."""
+    user_id, headers = referrer
+    today = datetime.utcnow().date()
+
+    response = client.get("/api/referral-stats/timeseries?granularity=day", headers=headers)
+    assert response.status_code == 200
+    series = response.get_json()["series"]
+    assert len(series) == 30
+    assert series[-1] == {"bucket_start": today.isoformat(), "count": 2}
+    assert sum(bucket["count"] for bucket in series) == 2
+
+    with app.app_context():
+        platform = ReferralRollup.query.filter(ReferralRollup.referrer_id <= ReferralRollup.PLATFORM)
+        assert sum(row.count for row in platform) == 2
+        month = get_referral_timeseries(ReferralRollup.PLATFORM, "month", bucket_start(today, "month"), today)
+        assert month == [{"bucket_start": bucket_start(today, "month").isoformat(), "count": 2}]
+
+
+def test_platform_buckets_are_spread_over_shards(app, referrer):
+    """Test that platform counts land on several shard rows and the series sums them."""
+    user_id, _ = referrer
+    app.config["ROLLUP_PLATFORM_SHARDS"] = 4
+    today = datetime.utcnow().date()
+    with app.app_context():
+        ReferralRollup.query.filter(ReferralRollup.referrer_id <= ReferralRollup.PLATFORM).delete()
+        for _ in range(40):
+            record_referral(user_id)
+        db.session.commit()
+
+        shards = {row.referrer_id for row in ReferralRollup.query.filter(ReferralRollup.referrer_id <= 0)}
+        assert 1 < len(shards) and shards <= {0, -1, -2, -3}
+        assert get_referral_timeseries(ReferralRollup.PLATFORM, "day", today, today)[0]["count"] == 40
+        assert get_referral_timeseries(user_id, "day", today, today)[0]["count"] == 42
+
+
+@pytest.mark.parametrize("query, message", [
+    ("granularity=hour", "granularity must be one of"),
+    ("from=yesterday", "YYYY-MM-DD"),
+    ("from=2026-02-01&to=2026-01-01&granularity=month", "must not be after"),
+    ("from=1900-01-01&granularity=week", "at most"),
+    ("from=2000-01-01&to=2000-01-31", "use week or month"),
+])
+def test_timeseries_rejects_bad_ranges(client, referrer, query, message):
+    """Test that malformed, inverted, oversized and compacted daily ranges get a 400."""
+    _, headers = referrer
+    response = client.get(f"/api/referral-stats/timeseries?{query}", headers=headers)
+    assert response.status_code == 400
+    assert message in response.get_json()["message"]
+
+
+def test_compaction_folds_old_days_without_changing_the_series(app, referrer):
+    """Test that days past the retention become week and month buckets and every series sums the same."""
+    user_id, _ = referrer
+    with app.app_context():
+        backdate(200)
+        first = datetime.utcnow().date() - timedelta(days=210)
+        last = datetime.utcnow().date()
+        before = {g: get_referral_timeseries(user_id, g, bucket_start(first, g), bucket_start(last, g))
+                  for g in ("week", "month")}
+
+        # Backfill already folded them; put them back as days to compact
+        ReferralRollup.query.delete()
+        for referral in Referral.query:
+            for owner in (user_id, ReferralRollup.PLATFORM):
+                db.session.add(ReferralRollup(referrer_id=owner, granularity="day",
+                                              bucket_start=referral.date_referred.date(), count=1))
+        db.session.commit()
+
+        assert compact_referral_rollups(batch_size=1) == 4
+        assert compact_referral_rollups() == 0
+        assert ReferralRollup.query.filter_by(granularity="day").count() == 0
+        assert ReferralRollup.query.filter_by(referrer_id=user_id, granularity="week").count() in (1, 2)
+        for g, series in before.items():
+            assert get_referral_timeseries(user_id, g, bucket_start(first, g), bucket_start(last, g)) == series
+            assert sum(bucket["count"] for bucket in series) == 2
+
+
+def test_backfill_rebuilds_rollups_from_referrals(app, client, referrer):
+    """Test that the backfill keeps recent days daily and the leaderboard still reads them."""
+    user_id, headers = referrer
+    with app.app_context():
+        ReferralRollup.query.delete()
+        db.session.commit()
+        assert backdate(3) == 4
+
+    response = client.get("/api/referral-stats/timeseries?granularity=day", headers=headers)
+    assert [bucket["count"] for bucket in response.get_json()["series"][-5:]] == [1, 1, 0, 0, 0]
+
+    with app.app_context():
+        rebuild_leaderboard()
+    leaders = client.get("/api/leaderboard?window=7d").get_json()["leaders"]
+    assert [(entry["username"], entry["score"]) for entry in leaders] == [("charted", 2)]
+
+
+def test_platform_series_is_for_admins(app, client, referrer):
+    """Test that the platform-wide series answers only to ADMIN_EMAILS."""
+    _, headers = referrer
+    assert client.get("/api/admin/referral-stats/timeseries", headers=headers).status_code == 403
+
+    app.config["ADMIN_EMAILS"] = ["charted@example.com"]
+    response = client.get("/api/admin/referral-stats/timeseries?granularity=week", headers=headers)
+    assert response.status_code == 200
+    assert sum(bucket["count"] for bucket in response.get_json()["series"]) == 2
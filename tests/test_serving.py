@@ -0,0 +1,48 @@
+import json
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import make_server
+
+from app.models import db
+from app.routes import referrals
+from app.services.auth_service import register_user, create_user_token
+
+
+def test_one_process_serves_many_in_flight_requests(file_app, monkeypatch):
+    """Test that a threaded worker overlaps requests that wait on I/O instead of queueing them."""
+    app = file_app("serving", RATELIMIT_ENABLED=False, WEB_THREADS=100)
+    with app.app_context():
+        user = register_user("inflight", "inflight@example.com", "Password123")
+        token = create_user_token(user)
+        db.session.remove()
+
+    get_referral_stats = referrals.get_referral_stats
+    def slow_stats(user_id):
+        # A slow query: the request's pooled connection is checked out for the whole wait
+        db.session.execute(db.text("SELECT 1"))
+        time.sleep(0.5)
+        return get_referral_stats(user_id)
+    monkeypatch.setattr(referrals, "get_referral_stats", slow_stats)
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def fetch(_):
+        request = urllib.request.Request(f"http://127.0.0.1:{server.server_port}/api/referral-stats",
+                                         headers={"Authorization": f"Bearer {token}"})
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return json.loads(response.read())["stats"]["total_referrals"]
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(100) as pool:
+            results = list(pool.map(fetch, range(100)))
+        elapsed = time.perf_counter() - started
+    finally:
+        server.shutdown()
+
+    assert results == [0] * 100
+    assert elapsed < 2.5  # Serially these would take 50 seconds, and 15 connections at a time 3.5
@@ -0,0 +1,35 @@
+import pytest
+from sqlalchemy.engine import make_url
+
+from app.models import db
+from app.utils.sqlite import sqlite_profile
+
+
+def pragmas_for(file_app, profile):
+    app = file_app(profile, SQLITE_PROFILE=profile)
+    with app.app_context():
+        with db.engine.connect() as conn:
+            values = {name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+                      for name in ("journal_mode", "synchronous", "busy_timeout", "temp_store")}
+        values["pool"] = type(db.engine.pool).__name__
+    return values
+
+
+def test_tuned_profile_sets_pragmas_on_file_databases(file_app):
+    """Test that the tuned profile enables WAL, a busy timeout and pooled connections."""
+    assert pragmas_for(file_app, "tuned") == {
+        "journal_mode": "wal", "synchronous": 1, "busy_timeout": 5000, "temp_store": 2, "pool": "QueuePool"
+    }
+    assert pragmas_for(file_app, "default") == {
+        "journal_mode": "delete", "synchronous": 2, "busy_timeout": 5000, "temp_store": 0, "pool": "NullPool"
+    }
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("sqlite:///:memory:", ({}, {"busy_timeout", "synchronous", "mmap_size", "cache_size", "temp_store"})),
+    ("postgresql://db.internal/vomychat", ({}, None)),
+])
+def test_profile_only_applies_to_sqlite(url, expected):
+    """Test that in-memory SQLite skips WAL and other databases are left alone."""
+    options, pragmas = sqlite_profile({"SQLITE_PROFILE": "tuned"}, make_url(url))
+    assert (options, set(pragmas) if pragmas is not None else None) == expected
@@ -0,0 +1,80 @@
+import multiprocessing
+
+import pytest
+from sqlalchemy import inspect
+
+from app import create_app
+from app.models import db, SchemaVersion
+from app.schema import schema_fingerprint
+
+
+@pytest.fixture
+def boot(file_config, capture_statements):
+    """Boot an app on startup.db, returning the SQL create_app ran and the app"""
+    def run(config=None):
+        with capture_statements(all_threads=True) as statements:
+            app = create_app(config or file_config("startup"))
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        statements = [s.strip() for s in statements]
+        return [s for s in statements if not s.startswith("PRAGMA")], app
+    return run
+
+
+def test_up_to_date_database_boots_with_one_query(boot):
+    """Test that a second boot checks the stored fingerprint and runs no DDL."""
+    first, app = boot()
+    assert any(s.startswith("CREATE TABLE") for s in first)
+    with app.app_context():
+        assert db.session.query(SchemaVersion.version).scalar() == schema_fingerprint()
+        db.session.remove()
+
+    second, _ = boot()
+    assert len(second) == 1
+    assert "schema_version" in second[0]
+
+
+def test_changed_models_are_upgraded_at_boot(boot):
+    """Test that a stale fingerprint makes the next boot create missing indexes and restamp."""
+    _, app = boot()
+    with app.app_context():
+        db.session.execute(db.text("DROP INDEX ix_users_referred_by_id"))
+        db.session.execute(db.text("UPDATE schema_version SET version = 'stale'"))
+        db.session.commit()
+        db.session.remove()
+
+    statements, app = boot()
+    assert any(s.startswith("CREATE INDEX ix_users_referred_by_id") for s in statements)
+    with app.app_context():
+        assert "ix_users_referred_by_id" in {index["name"] for index in inspect(db.engine).get_indexes("users")}
+        assert db.session.query(SchemaVersion.version).all() == [(schema_fingerprint(),)]
+        db.session.remove()
+
+
+def test_bootstrap_can_be_left_to_deploys(boot, file_config, tmp_path):
+    """Test that SCHEMA_BOOTSTRAP=off boots without touching the database."""
+    statements, _ = boot(file_config("startup", SCHEMA_BOOTSTRAP="off"))
+    assert statements == []
+    assert not (tmp_path / "startup.db").exists()
+
+
+def _boot(config, barrier):
+    barrier.wait(10)
+    create_app(config)
+
+
+def test_concurrent_boots_upgrade_a_fresh_database_once(boot, file_config):
+    """Test that workers booting together on an empty database all start, one of them creating the schema."""
+    config = file_config("startup")
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(6)
+    workers = [context.Process(target=_boot, args=(config, barrier)) for _ in range(6)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+    assert [worker.exitcode for worker in workers] == [0] * 6
+
+    statements, _ = boot(config)
+    assert len(statements) == 1
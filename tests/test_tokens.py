@@ -0,0 +1,103 @@
+from flask_jwt_extended import decode_token
+
+from app.models import db
+from app.services import auth_service
+from app.services.auth_service import register_user
+from app.services.token_service import token_versions
+
+
+def test_register_and_login_tokens_match(app, client):
+    """Test that both endpoints issue string identities with the same claims."""
+    registered = client.post("/api/register", json={
+        "username": "claims",
+        "email": "claims@example.com",
+        "password": "Password123"
+    }).get_json()["access_token"]
+    logged_in = client.post("/api/login", json={
+        "username_or_email": "claims",
+        "password": "Password123"
+    }).get_json()["access_token"]
+
+    with app.app_context():
+        for token in (registered, logged_in):
+            claims = decode_token(token)
+            assert isinstance(claims["sub"], str)
+            assert claims["ver"] == 0
+            assert claims["profile"]["username"] == "claims"
+            assert claims["profile"]["email"] == "claims@example.com"
+
+
+def test_me_is_served_from_claims_until_they_go_stale(app, client, capture_statements):
+    """Test that /api/me skips the database while the token stamp is current."""
+    token = client.post("/api/register", json={
+        "username": "stamped",
+        "email": "stamped@example.com",
+        "password": "Password123"
+    }).get_json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    with capture_statements(app) as statements:
+        response = client.get("/api/me", headers=headers)
+    assert response.get_json()["user"]["username"] == "stamped"
+    assert statements == []
+
+    # A profile change makes the claims stale; the token stays valid and the profile comes from the database
+    with app.app_context():
+        token_versions.bump(response.get_json()["user"]["id"])
+        db.session.commit()
+    with capture_statements(app) as statements:
+        response = client.get("/api/me", headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()["user"]["email"] == "stamped@example.com"
+    assert any("FROM users" in statement for statement in statements)
+
+
+def test_password_reset_revokes_existing_tokens(app, client, monkeypatch):
+    """Test that tokens issued before a password reset are rejected."""
+    with app.app_context():
+        register_user("revoked", "revoked@example.com", "Password123")
+    token = client.post("/api/login", json={
+        "username_or_email": "revoked",
+        "password": "Password123"
+    }).get_json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/api/referral-stats", headers=headers).status_code == 200
+
+    sent = []
+    monkeypatch.setattr(auth_service, "send_password_reset_email", lambda email, token: sent.append(token))
+    client.post("/api/forgot-password", json={"email": "revoked@example.com"})
+    reset_token = sent[0]
+    assert client.post("/api/reset-password", json={
+        "token": reset_token,
+        "new_password": "NewPassword123"
+    }).status_code == 200
+
+    response = client.get("/api/referral-stats", headers=headers)
+    assert response.status_code == 401
+
+    fresh = client.post("/api/login", json={
+        "username_or_email": "revoked",
+        "password": "NewPassword123"
+    }).get_json()["access_token"]
+    assert client.get("/api/referral-stats", headers={"Authorization": f"Bearer {fresh}"}).status_code == 200
+
+
+def test_login_after_a_reset_elsewhere_is_stamped_from_the_database(app, client):
+    """Test that a token minted while this worker still caches the old stamp is not revoked later."""
+    with app.app_context():
+        user_id = register_user("elsewhere", "elsewhere@example.com", "Password123").id
+    login = {"username_or_email": "elsewhere", "password": "Password123"}
+    token = client.post("/api/login", json=login).get_json()["access_token"]
+    assert client.get("/api/referral-stats", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+
+    # Another worker resets the password: this worker's cached stamp is now out of date
+    with app.app_context():
+        db.session.execute(db.text("INSERT INTO user_versions (user_id, version, min_version) VALUES (:id, 1, 1)"),
+                           {"id": user_id})
+        db.session.commit()
+
+    fresh = client.post("/api/login", json=login).get_json()["access_token"]
+    with app.app_context():
+        assert decode_token(fresh)["ver"] == 1
+    token_versions.forget(user_id)  # As when the cached entry expires
+    assert client.get("/api/referral-stats", headers={"Authorization": f"Bearer {fresh}"}).status_code == 200